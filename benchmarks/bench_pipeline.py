@@ -0,0 +1,128 @@
+"""
+Times the pipeline stages (reference load, fund ingestion, price reconciliation, attribution) on synthetic
+workspaces of increasing size and checks them against recorded baselines.
+
+Each scale is a number of funds; months, instruments and holdings per fund-month are fixed for the run. The
+timings of every run are appended to the results file. The first run of a configuration (or --rebaseline)
+records its baseline; later runs fail with exit status 1 when a stage is slower than its baseline by more
+than --threshold (relative) and --min-delta seconds (absolute, to ignore noise on tiny stages).
+
+    python -m benchmarks.bench_pipeline --scales 10 100 1000 --threshold 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import main as pipeline
+from benchmarks.synthetic_data import generate
+from src.db_manager import DBManager
+from config import LOGGER, DB_NAME, STREAMING_INGEST, FUND_POSITIONS, PRICE_RECONCILIATION
+
+STAGES = (
+    ('reference', pipeline.load_reference_data),
+    ('ingest', lambda db: pipeline.ingest_fund_data(db, STREAMING_INGEST)),
+    ('reconciliation', pipeline.reconcile_prices),
+    ('attribution', pipeline.attribute_performance),
+)
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'bench_pipeline.json')
+
+
+def run_scale(funds, months, instruments, holdings, keep=False):
+    """Generates a workspace for funds and runs the stages in it. Returns {stage: seconds} and row counts."""
+    workspace = tempfile.mkdtemp(prefix=f'bench-{funds}-')
+    cwd = os.getcwd()
+    try:
+        info = generate(workspace, funds, months, instruments, holdings)
+        os.chdir(workspace)
+        db = DBManager(db_path=DB_NAME)
+        db.connect(connector="sqlite3")
+        try:
+            timings = {}
+            for name, func in STAGES:
+                start = time.perf_counter()
+                func(db)
+                timings[name] = round(time.perf_counter() - start, 4)
+            positions = db.conn.execute(f"SELECT COUNT(*) FROM {FUND_POSITIONS};").fetchone()[0]
+            reconciled = db.conn.execute(f"SELECT COUNT(*) FROM {PRICE_RECONCILIATION};").fetchone()[0]
+        finally:
+            db.disconnect()
+    finally:
+        os.chdir(cwd)
+        if keep:
+            print(f"Workspace kept at {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return timings, {'files': len(info['files']), 'positions': positions, 'reconciled': reconciled}
+
+
+def check_regressions(timings, baseline, threshold, min_delta):
+    """Returns a message per stage slower than baseline by more than threshold (relative) and min_delta seconds."""
+    regressions = []
+    for stage, seconds in timings.items():
+        base = baseline.get(stage)
+        if base is not None and seconds > base * (1 + threshold) and seconds - base > min_delta:
+            regressions.append(f"{stage}: {seconds:.3f}s vs baseline {base:.3f}s (+{seconds / base - 1:.0%})")
+    return regressions
+
+
+def load_results(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'baselines': {}, 'runs': []}
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100], help="numbers of funds")
+    parser.add_argument('--months', type=int, default=13)
+    parser.add_argument('--instruments', type=int, default=2000)
+    parser.add_argument('--holdings', type=int, default=150, help="positions per fund report")
+    parser.add_argument('--results', default=DEFAULT_RESULTS)
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative slowdown per stage")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="slowdowns below this many seconds are ignored")
+    parser.add_argument('--rebaseline', action='store_true', help="record this run as the new baseline")
+    parser.add_argument('--keep', action='store_true', help="keep the generated workspaces")
+    parser.add_argument('--verbose', action='store_true', help="keep the pipeline's INFO logging")
+    args = parser.parse_args()
+    if not args.verbose:
+        LOGGER.setLevel(logging.WARNING)
+
+    results = load_results(args.results)
+    failures = []
+    print(f"{'funds':>6} {'positions':>10} " + ' '.join(f"{name:>15}" for name, _ in STAGES))
+    for funds in args.scales:
+        key = f"funds={funds},months={args.months},instruments={args.instruments},holdings={args.holdings}"
+        timings, counts = run_scale(funds, args.months, args.instruments, args.holdings, args.keep)
+        print(f"{funds:>6} {counts['positions']:>10,} " + ' '.join(f"{timings[name]:>14.3f}s" for name, _ in STAGES))
+
+        results['runs'].append({
+            'key': key, 'recorded_at': datetime.now().isoformat(timespec='seconds'), 'timings': timings, **counts,
+        })
+        if args.rebaseline or key not in results['baselines']:
+            results['baselines'][key] = timings
+            continue
+        failures += [f"[{key}] {message}" for message in
+                     check_regressions(timings, results['baselines'][key], args.threshold, args.min_delta)]
+
+    save_results(results, args.results)
+    print(f"Results recorded in {args.results}")
+    if failures:
+        raise SystemExit("Performance regressions:\n  " + '\n  '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmarks the last-available-price lookups of PriceReconciler on synthetic in-memory frames.
+
+Compares the concat + sort + ffill implementation ('pandas') against the as-of engine ('asof'), a binary search
+with np.searchsorted over sorted (instrument_id, day) keys, at multiples of today's ~22k-row reconciliation
+(10 funds x 13 months x ~170 positions). The reference history is held fixed, as it is in production, while the
+number of fund positions scales. Both engines run at every scale unless --skip-pandas-above is given.
+
+    python -m benchmarks.bench_reconciliation --scales 10 100 1000
+    python -m benchmarks.bench_reconciliation --scales 10 100 1000 --skip-pandas-above 100
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.price_reconciliation import PriceReconciler
+
+BASE_FUNDS = 10
+MONTHS = 13
+POSITIONS_PER_FUND_MONTH = 170
+UNIVERSE = 5000
+PRICE_DATES_PER_MONTH = 4
+
+
+def make_frames(scale, seed=0):
+    """
+    Returns (fund_instruments, master_prices_df) frames for BASE_FUNDS * scale funds, standardized as
+    PriceReconciler._load_frames leaves them: integer instrument_id keys and categorical string columns.
+    """
+    rng = np.random.default_rng(seed)
+    identifiers = np.array([f"ID{i:06d}" for i in range(UNIVERSE)])
+    month_ends = pd.date_range('2022-08-31', periods=MONTHS, freq='ME')
+
+    # Reference history: a few price dates per month per instrument, some instruments missing the EOM date itself
+    price_dates = pd.date_range(month_ends[0] - pd.Timedelta(days=27), month_ends[-1],
+                                periods=MONTHS * PRICE_DATES_PER_MONTH)
+    price_dates = price_dates.normalize().union(month_ends)
+    master = pd.DataFrame({
+        'instrument_id': np.repeat(np.arange(UNIVERSE, dtype=np.int64), len(price_dates)),
+        'identifier': np.repeat(identifiers, len(price_dates)),
+        'eom_date': np.tile(price_dates.values, UNIVERSE),
+    })
+    master = master[rng.random(len(master)) > 0.1]
+    master['master_price'] = rng.uniform(10, 500, len(master)).round(2)
+    master['financial_type_ref'] = 'EQUITY'
+
+    n_funds = BASE_FUNDS * scale
+    n_rows = n_funds * MONTHS * POSITIONS_PER_FUND_MONTH
+    funds = np.array([f"Fund{i:05d}" for i in range(n_funds)])
+    instrument_ids = rng.integers(0, UNIVERSE, n_rows)
+    positions = pd.DataFrame({
+        'eom_date': np.tile(np.repeat(month_ends.values, POSITIONS_PER_FUND_MONTH), n_funds),
+        'financial_type': 'Equities',
+        'identifier': pd.Categorical.from_codes(instrument_ids, identifiers),
+        'instrument_id': instrument_ids,
+        'fund_name': pd.Categorical.from_codes(np.repeat(np.arange(n_funds), MONTHS * POSITIONS_PER_FUND_MONTH), funds),
+        'reported_price': rng.uniform(10, 500, n_rows).round(2),
+    })
+    # Match PriceReconciler._load_frames, which standardizes dates to nanosecond resolution
+    positions['eom_date'] = positions['eom_date'].astype('datetime64[ns]')
+    master['eom_date'] = master['eom_date'].astype('datetime64[ns]')
+    return positions, master.reset_index(drop=True)
+
+
+def time_engine(func, positions, master, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(positions.copy(), master.copy())
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-pandas-above', type=int, default=None,
+                        help="skip the ffill engine above this scale (it needs several copies of the data); "
+                             "by default it runs at every scale")
+    args = parser.parse_args()
+
+    print(f"{'scale':>6} {'positions':>11} {'pandas (s)':>11} {'asof (s)':>10} {'speedup':>8}")
+    for scale in args.scales:
+        positions, master = make_frames(scale)
+        asof_time, asof_df = time_engine(PriceReconciler._asof_lookup, positions, master, args.repeat)
+        if args.skip_pandas_above is None or scale <= args.skip_pandas_above:
+            pandas_time, pandas_df = time_engine(PriceReconciler._lap_ffill, positions, master, args.repeat)
+            pd.testing.assert_frame_equal(pandas_df, asof_df, check_like=True)
+            pandas_col, speedup = f"{pandas_time:11.3f}", f"{pandas_time / asof_time:7.1f}x"
+        else:
+            pandas_col, speedup = f"{'skipped':>11}", f"{'-':>8}"
+        print(f"{scale:>6} {len(positions):>11,} {pandas_col} {asof_time:10.3f} {speedup}")
+
+
+if __name__ == '__main__':
+    main()
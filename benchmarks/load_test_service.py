@@ -0,0 +1,122 @@
+"""
+Load test of the query service: fires a mix of /breaks and /attribution requests from concurrent clients and
+reports p50/p99 latency and requests per second, with the response cache disabled and enabled.
+
+By default the pipeline is first run on a synthetic workspace (see benchmarks.synthetic_data); --db serves an
+existing database instead.
+
+    python -m benchmarks.load_test_service --funds 50 --requests 2000 --concurrency 8
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import numpy as np
+
+import main as pipeline
+from benchmarks.synthetic_data import generate
+from src.query_service import QueryService
+from config import LOGGER, DB_NAME, PRICE_RECONCILIATION
+
+
+def build_database(funds, months, instruments, holdings):
+    """Runs the pipeline on a synthetic workspace; returns (workspace, database path)."""
+    workspace = tempfile.mkdtemp(prefix='load-test-')
+    generate(workspace, funds, months, instruments, holdings)
+    cwd = os.getcwd()
+    os.chdir(workspace)
+    try:
+        pipeline.run_pipeline()
+    finally:
+        os.chdir(cwd)
+    return workspace, os.path.join(workspace, DB_NAME)
+
+
+def request_mix(db_path, count, seed=0):
+    """Request paths spread over the funds, dates and instruments found in the database."""
+    conn = sqlite3.connect(db_path)
+    partitions = conn.execute(f"SELECT DISTINCT fund_name, eom_date FROM {PRICE_RECONCILIATION};").fetchall()
+    identifiers = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT identifier FROM {PRICE_RECONCILIATION} WHERE price_difference <> 0 LIMIT 200;")]
+    conn.close()
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        fund, date = rng.choice(partitions)
+        kind = rng.random()
+        if kind < 0.4:
+            params = {'fund': fund}
+        elif kind < 0.7:
+            params = {'fund': fund, 'date': date}
+        elif kind < 0.85 and identifiers:
+            params = {'identifier': rng.choice(identifiers)}
+        elif kind < 0.95:
+            params = {'date': date, 'threshold': rng.choice([0, 0.5, 1])}
+        else:
+            paths.append(f"/attribution?{urlencode({'date': date})}")
+            continue
+        paths.append(f"/breaks?{urlencode(params)}")
+    return paths
+
+
+def run_load(service, paths, concurrency):
+    """Requests every path with concurrency clients; returns (latencies in seconds, wall seconds)."""
+    host, port = service.address
+
+    def fetch(path):
+        start = time.perf_counter()
+        with urlopen(f"http://{host}:{port}{path}", timeout=30) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        latencies = list(clients.map(fetch, paths))
+    return np.array(latencies), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help="serve this database instead of building a synthetic one")
+    parser.add_argument('--funds', type=int, default=50)
+    parser.add_argument('--months', type=int, default=13)
+    parser.add_argument('--instruments', type=int, default=2000)
+    parser.add_argument('--holdings', type=int, default=150)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--verbose', action='store_true', help="keep the pipeline's INFO logging")
+    args = parser.parse_args()
+    if not args.verbose:
+        LOGGER.setLevel(logging.WARNING)
+
+    workspace = None
+    db_path = args.db
+    if db_path is None:
+        workspace, db_path = build_database(args.funds, args.months, args.instruments, args.holdings)
+    try:
+        paths = request_mix(db_path, args.requests)
+        print(f"{'cache':>8} {'requests':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>9}")
+        for label, cache_size in (('off', 0), ('on', 256)):
+            service = QueryService(db_path, port=0, cache_size=cache_size)
+            service.start()
+            try:
+                latencies, wall = run_load(service, paths, args.concurrency)
+            finally:
+                service.close()
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f"{label:>8} {len(latencies):>9} {p50:>9.2f} {p99:>9.2f} {len(latencies) / wall:>9.0f}")
+    finally:
+        if workspace is not None:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
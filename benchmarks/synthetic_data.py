@@ -0,0 +1,172 @@
+"""
+Generates a synthetic pipeline workspace: fund report CSVs for funds x months, named in every filename style
+DataValidator._extract_fund_info handles, and a matching master reference dump over a universe of instruments.
+
+The workspace follows the relative layout of config.py (external-funds/, sql/, db/, output/), so the pipeline
+runs in it unchanged:
+
+    python -m benchmarks.synthetic_data /tmp/workspace --funds 100 --months 13 --instruments 2000
+    cd /tmp/workspace && python /path/to/main.py
+"""
+import argparse
+import os
+import shutil
+import string
+
+import numpy as np
+import pandas as pd
+
+from config import EXTERNAL_FUNDS_DATA_DIR, MASTER_SQL_FILE, DB_NAME, OUTPUT_DIR, EQUITY_PRICES, BOND_PRICES
+
+# Filename styles handled by DataValidator._extract_fund_info, assigned to funds in turn
+FILENAME_STYLES = (
+    '{fund}.{iso}.csv',
+    'rpt-{fund}.{iso}.csv',
+    '{fund}.{mdy} - details.csv',
+    'TT_monthly_{fund}.{ymd}.csv',
+)
+CSV_HEADER = 'FINANCIAL TYPE,SYMBOL,SECURITY NAME,ISIN,PRICE,QUANTITY,REALISED P/L,MARKET VALUE,SEDOL'
+FIRST_MONTH_END = '2022-12-31'
+BOND_SHARE = 0.3
+# Share of instrument-months without a reference price on the EOM date itself (the last available price applies)
+MISSING_EOM_RATE = 0.05
+# Share of positions reported at a price that differs from the reference price
+BREAK_RATE = 0.02
+INSERT_BATCH = 1000
+
+
+def _letters(index, width=3):
+    """Letters-only code for index, so generated names never contain digits the date parser could pick up."""
+    chars = []
+    for _ in range(width):
+        index, rem = divmod(index, 26)
+        chars.append(string.ascii_lowercase[rem])
+    return ''.join(reversed(chars)).capitalize()
+
+
+def fund_names(funds):
+    return [f"Synth{_letters(i)}" for i in range(funds)]
+
+
+def _instrument_universe(instruments, rng):
+    is_bond = rng.random(instruments) < BOND_SHARE
+    identifiers = np.array([
+        f"XS{i:010d}" if bond else f"EQ{_letters(i, 4).upper()}" for i, bond in enumerate(is_bond)
+    ])
+    return identifiers, is_bond
+
+
+def _write_master_dump(path, identifiers, is_bond, month_ends, eom_prices, rng):
+    """
+    Writes the reference dump: a mid-month and an EOM price per instrument and month, with the EOM row moved
+    three days earlier for MISSING_EOM_RATE of them, so the last available price on each EOM date is always
+    eom_prices. Equity dates alternate between the two DATETIME formats of the real dump.
+    """
+    missing = rng.random(eom_prices.shape) < MISSING_EOM_RATE
+    mid_prices = (eom_prices * rng.uniform(0.97, 1.03, eom_prices.shape)).round(2)
+
+    def fmt(date, equity, toggle):
+        if equity and toggle:
+            return date.strftime('%m/%d/%Y')
+        return date.strftime('%Y-%m-%d 00:00:00') if equity else date.strftime('%Y-%m-%d')
+
+    rows = {EQUITY_PRICES: [], BOND_PRICES: []}
+    for m, month_end in enumerate(month_ends):
+        mid_month = month_end.replace(day=15)
+        eom_row_date = month_end - pd.Timedelta(days=3)
+        for i, identifier in enumerate(identifiers):
+            table = BOND_PRICES if is_bond[i] else EQUITY_PRICES
+            equity = not is_bond[i]
+            rows[table].append((fmt(mid_month, equity, (i + m) % 2), identifier, mid_prices[i, m]))
+            rows[table].append((fmt(eom_row_date if missing[i, m] else month_end, equity, (i + m) % 2),
+                                identifier, eom_prices[i, m]))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(f"DROP TABLE IF EXISTS {EQUITY_PRICES};\nDROP TABLE IF EXISTS {BOND_PRICES};\n")
+        f.write(f"CREATE TABLE {EQUITY_PRICES} (DATETIME TEXT, SYMBOL TEXT, PRICE REAL);\n")
+        f.write(f"CREATE TABLE {BOND_PRICES} (DATETIME TEXT, ISIN TEXT, PRICE REAL);\n")
+        for table, table_rows in rows.items():
+            for start in range(0, len(table_rows), INSERT_BATCH):
+                values = ',\n'.join(f"('{d}', '{ident}', {price})" for d, ident, price in table_rows[start:start + INSERT_BATCH])
+                f.write(f"INSERT INTO {table} VALUES\n{values};\n")
+
+
+def generate(workspace, funds=10, months=13, instruments=500, holdings=None, seed=0):
+    """
+    Writes a runnable workspace under workspace for funds x months fund reports, each holding `holdings`
+    (default min(instruments, 150)) of `instruments` reference instruments plus a cash line, and copies the
+    repository's DDL scripts next to the generated master dump. Returns a dict with the generated 'files'
+    and the expected 'positions' (security rows) and 'breaks' (rows whose reported price differs from the
+    last available reference price).
+    """
+    rng = np.random.default_rng(seed)
+    holdings = min(instruments, holdings or 150)
+    identifiers, is_bond = _instrument_universe(instruments, rng)
+    month_ends = pd.date_range(FIRST_MONTH_END, periods=months, freq='ME')
+
+    # Random-walk EOM reference prices: bonds around par, equities anywhere between 10 and 500
+    start = np.where(is_bond, rng.uniform(90, 110, instruments), rng.uniform(10, 500, instruments))
+    eom_prices = (start[:, None] * np.cumprod(rng.normal(1, 0.03, (instruments, months)), axis=1)).round(2)
+
+    sql_dir = os.path.join(workspace, os.path.dirname(MASTER_SQL_FILE))
+    os.makedirs(sql_dir, exist_ok=True)
+    repo_sql_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), os.path.dirname(MASTER_SQL_FILE))
+    for name in os.listdir(repo_sql_dir):
+        if name.endswith('.sql') and name != os.path.basename(MASTER_SQL_FILE):
+            shutil.copy(os.path.join(repo_sql_dir, name), sql_dir)
+    _write_master_dump(os.path.join(workspace, MASTER_SQL_FILE), identifiers, is_bond, month_ends, eom_prices, rng)
+
+    funds_dir = os.path.join(workspace, EXTERNAL_FUNDS_DATA_DIR)
+    for path in (funds_dir, os.path.join(workspace, os.path.dirname(DB_NAME)), os.path.join(workspace, OUTPUT_DIR)):
+        os.makedirs(path, exist_ok=True)
+
+    files, positions, breaks = [], 0, 0
+    for f, fund in enumerate(fund_names(funds)):
+        style = FILENAME_STYLES[f % len(FILENAME_STYLES)]
+        for m, month_end in enumerate(month_ends):
+            held = rng.choice(instruments, holdings, replace=False)
+            prices = eom_prices[held, m]
+            broken = rng.random(holdings) < BREAK_RATE
+            prices = np.where(broken, (prices * 1.005 + 0.01).round(2), prices)
+            quantity = rng.integers(10, 10000, holdings)
+            pnl = rng.normal(0, 500, holdings).round(2)
+            lines = [CSV_HEADER]
+            for i, price, qty, p_l in zip(held, prices, quantity, pnl):
+                identifier = identifiers[i]
+                if is_bond[i]:
+                    lines.append(f"Government Bond,{identifier},{identifier} Bond,{identifier},{price},{qty},{p_l},"
+                                 f"{round(price * qty / 100, 2)},")
+                else:
+                    # Some funds prefix their symbols; the validator strips it
+                    symbol = f"X_{identifier}" if f % 3 == 0 else identifier
+                    lines.append(f"Equities,{symbol},{identifier} Inc,,{price},{qty},{p_l},{round(price * qty, 2)},")
+            lines.append(f"CASH,USDCURR,US Dollar,,,,0,{rng.integers(1000, 100000)},")
+
+            name = style.format(fund=fund, iso=month_end.strftime('%Y-%m-%d'), mdy=month_end.strftime('%m-%d-%Y'),
+                                ymd=month_end.strftime('%Y%m%d'))
+            with open(os.path.join(funds_dir, name), 'w') as out:
+                out.write('\n'.join(lines) + '\n')
+            files.append(name)
+            positions += holdings
+            breaks += int(broken.sum())
+
+    return {'workspace': workspace, 'files': files, 'positions': positions, 'breaks': breaks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('workspace')
+    parser.add_argument('--funds', type=int, default=10)
+    parser.add_argument('--months', type=int, default=13)
+    parser.add_argument('--instruments', type=int, default=500)
+    parser.add_argument('--holdings', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    info = generate(args.workspace, args.funds, args.months, args.instruments, args.holdings, args.seed)
+    print(f"Wrote {len(info['files'])} fund reports with {info['positions']:,} positions "
+          f"({info['breaks']:,} price breaks) to {args.workspace}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,21 +5,123 @@ import os
 DB_NAME = 'db/investment_strategy.db'
 LOG_FILE = 'pipeline.log'
 OUTPUT_DIR = 'output'
+# Pooled connections (DBManager(pool_size=...)): seconds a connection waits on a locked database, and seconds
+# a thread waits for a free pooled connection
+DB_BUSY_TIMEOUT = 30
+DB_POOL_TIMEOUT = 60
+# Async facade (AsyncDBManager): threads running queries, and rows fetched per batch when streaming
+ASYNC_DB_WORKERS = 4
+ASYNC_STREAM_BATCH = 1000
+# Rows per fetchmany batch of DBManager.iter_batches
+FETCH_BATCH_SIZE = 10000
+# Prepared statements kept per connection (sqlite3 cached_statements); parameterized queries reuse them
+STATEMENT_CACHE_SIZE = 256
 
 # SQL
 MASTER_SQL_FILE = 'sql/master-reference-sql.sql'
 FUND_POSITION_FILE = 'sql/create_fund_position_table.sql'
+DIMENSION_TABLES_FILE = 'sql/create_dimension_tables.sql'
+RECONCILIATION_TABLES_FILE = 'sql/create_reconciliation_tables.sql'
+RECON_STATE_FILE = 'sql/create_recon_state_tables.sql'
+REFERENCE_STATE_FILE = 'sql/create_reference_state_table.sql'
+FILE_MANIFEST_FILE = 'sql/create_file_manifest_table.sql'
 # DB TABLES 
 EQUITY_PRICES = 'equity_prices'
 BOND_PRICES = 'bond_prices'
 FUND_POSITIONS = 'fund_positions'
+PROCESSED_FILES = 'processed_files'
+DIM_FUND = 'dim_fund'
+DIM_INSTRUMENT = 'dim_instrument'
+PRICE_RECONCILIATION = 'price_reconciliation'
+RECON_DIRTY_PARTITIONS = 'recon_dirty_partitions'
+RECON_BREAKS = 'recon_breaks'
+RECON_STATE = 'recon_state'
+FUND_MONTH_SUMMARY = 'fund_month_summary'
+MASTER_PRICE_DIGEST = 'master_price_digest'
+REFERENCE_STATE = 'reference_state'
+# Master price tables and their identifier column
+MASTER_PRICE_TABLES = ((EQUITY_PRICES, 'SYMBOL'), (BOND_PRICES, 'ISIN'))
+
+# Snapshots of the loaded master reference tables, keyed by the dump's content hash
+REFERENCE_CACHE_ENABLED = True
+REFERENCE_CACHE_DIR = 'db/reference_cache'
 
 # INPUT FILEPATH FOR EXTERNAL FUNDS DATA
 EXTERNAL_FUNDS_DATA_DIR = 'external-funds'
 
+# Worker processes for fund CSV preprocessing (1 = serial)
+PREPROCESS_WORKERS = 1
+
+# Pipeline stage runner: checkpoint of completed stages and threads for independent stages
+PIPELINE_CHECKPOINT = 'db/pipeline_checkpoint.json'
+PIPELINE_MAX_WORKERS = 2
+
+# Watch mode: seconds between directory polls, and how long a file's size/mtime must be stable before it is loaded
+WATCH_POLL_SECONDS = 5
+WATCH_SETTLE_SECONDS = 10
+
+# Streaming ingestion: read fund CSVs in chunks and write them as they are validated
+STREAMING_INGEST = False
+CSV_CHUNKSIZE = 50000
+
+# Bulk loader: executemany batch size and PRAGMA settings applied for the duration of a load
+BULK_LOAD_BATCH_SIZE = 10000
+BULK_LOAD_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -200000, 'temp_store': 'MEMORY'}
+
+# Sharded storage: None keeps everything in DB_NAME; 'fund' or 'year' splits fund_positions and the tables derived
+# from it (summary, reconciliation results and their bookkeeping) into one SQLite file per fund or per EOM year
+# under SHARD_DIR. The reference data (master prices, dimensions, file manifest) stays in DB_NAME and is attached
+# to every shard. Shards are ingested and reconciled by up to SHARD_WORKERS processes in parallel.
+# Changing SHARD_BY on an existing database needs a fresh DB_NAME: the manifest already lists the loaded files.
+SHARD_BY = None
+SHARD_DIR = 'db/shards'
+SHARD_WORKERS = os.cpu_count() or 1
+
+# Price reconciliation engine: 'pandas' (in-memory forward fill), 'asof' (binary search) or 'sql' (lookup inside SQLite)
+RECON_ENGINE = 'pandas'
+
+# Multi-period performance analytics: trailing return windows (months), funds ranked per month and the annual
+# risk-free rate of the Sharpe ratio
+ANALYTICS_WINDOWS = (3, 6, 12)
+ANALYTICS_TOP_K = 3
+ANALYTICS_RISK_FREE_RATE = 0.0
+
+# Break classification: a reconciled price is a tolerance break when |reported - master| > abs + rel * |master|,
+# with the tolerances of its financial_type, or of 'default' for the types not listed
+RECON_TOLERANCES = {
+    'default': {'abs': 0.0001, 'rel': 0.0},
+}
+
 # OUTPUT FILE NAMES
-PRICE_RECON_OUTPUT = os.path.join(OUTPUT_DIR,"price_reconciliation.csv")
-BEST_PERFORMING_OUTPUT = os.path.join(OUTPUT_DIR,"best_performing_funds.csv")
+# Output layer: 'csv' or 'parquet' (needs pyarrow), optional 'gzip' compression. Files are written to OUTPUT_DIR
+# as <name>.<extension>. The 'single' layout streams all reconciliation results, partition by partition, into
+# one file (output/price_reconciliation.csv); the opt-in 'partitioned' layout writes them per fund and EOM date under
+# output/price_reconciliation/ and only rewrites the partitions refreshed by the run.
+OUTPUT_FORMAT = 'csv'
+OUTPUT_COMPRESSION = None
+RECON_OUTPUT_LAYOUT = 'single'
+PRICE_RECON_OUTPUT_NAME = 'price_reconciliation'
+BEST_PERFORMING_OUTPUT_NAME = 'best_performing_funds'
+FUND_METRICS_OUTPUT_NAME = 'fund_performance_metrics'
+FUND_RETURNS_OUTPUT_NAME = 'fund_monthly_returns'
+FUND_RANKINGS_OUTPUT_NAME = 'fund_rankings'
+POSITION_CONTRIBUTION_OUTPUT_NAME = 'position_contributions'
+# Rows read per chunk when streaming persisted results
+RESULTS_CHUNKSIZE = 50000
+
+# Query service (python main.py --serve): address, pooled read-only connections, cached responses and the
+# maximum number of break rows returned per request. It reads DB_NAME only, so it is not available with SHARD_BY.
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8050
+SERVICE_POOL_SIZE = 4
+SERVICE_CACHE_SIZE = 256
+SERVICE_MAX_ROWS = 10000
+
+# Run metrics: per-stage and per-function wall/CPU time, rows and throughput written as JSON per run to
+# METRICS_DIR; peak memory comes from tracemalloc, which slows the run down and can be switched off.
+METRICS_ENABLED = True
+METRICS_TRACE_MEMORY = True
+METRICS_DIR = os.path.join(OUTPUT_DIR, 'metrics')
 
 
 # LOGGING CONFIG
@@ -1,9 +1,18 @@
 import os
+import argparse
 from src.db_manager import DBManager
 from src.data_validation import DataValidator
 from src.data_ingestion import DataIngestor
+from src.file_manifest import FileManifest
 from src.price_reconciliation import PriceReconciler
 from src.performance_report import PerformanceCalculator
+from src.output_writer import OutputWriter
+from src.report_publisher import ReportPublisher
+from src.fund_watcher import FundWatcher
+from src.pipeline_dag import Stage, StageRunner
+from src.metrics import METRICS
+from src.query_service import QueryService
+from src.shard_manager import ShardManager
 
 # Import Logger
 from config import LOGGER 
@@ -14,71 +23,200 @@ from config import FUND_POSITIONS
 # Import SQL Files
 from config import MASTER_SQL_FILE, FUND_POSITION_FILE
 # Import External Funds Data Filepath
-from config import EXTERNAL_FUNDS_DATA_DIR
+from config import EXTERNAL_FUNDS_DATA_DIR, PREPROCESS_WORKERS
+# Import Streaming Ingestion Settings
+from config import STREAMING_INGEST, CSV_CHUNKSIZE
 # Import OUTPUT Directory & Files
-from config import OUTPUT_DIR, PRICE_RECON_OUTPUT, BEST_PERFORMING_OUTPUT
-
-
-def run_pipeline():
-    
-    
-    LOGGER.info("--BEGIN INVESTMENT ANALYSIS PIPELINE--")
-
-    # try: 
-         
-    # 1. Setup Database Connection
-    LOGGER.info("\n\n\nStep 1: Setup Database Connection\n\n")
-    db = DBManager(db_path=DB_NAME)
-    db.connect(connector="sqlite3")
-
-    # 2. Ingest Reference Data
-    LOGGER.info("\n\n\nStep 2: Ingest Master Reference Data.\n\nc")
+from config import OUTPUT_DIR, PRICE_RECON_OUTPUT_NAME, BEST_PERFORMING_OUTPUT_NAME
+from config import FUND_METRICS_OUTPUT_NAME, FUND_RETURNS_OUTPUT_NAME, FUND_RANKINGS_OUTPUT_NAME
+from config import POSITION_CONTRIBUTION_OUTPUT_NAME
+# Import Performance Analytics Settings
+from config import ANALYTICS_WINDOWS, ANALYTICS_TOP_K, ANALYTICS_RISK_FREE_RATE
+# Import Output Settings
+from config import OUTPUT_FORMAT, OUTPUT_COMPRESSION, RECON_OUTPUT_LAYOUT
+# Import Sharded Storage Settings
+from config import SHARD_BY
+# Import Reconciliation Engine & Break Tolerances
+from config import RECON_ENGINE, RECON_TOLERANCES
+# Import Watch Mode Settings
+from config import WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS
+# Import Run Metrics Settings
+from config import METRICS_ENABLED, METRICS_TRACE_MEMORY, METRICS_DIR
+# Import Query Service Settings
+from config import SERVICE_PORT
+
+
+def load_reference_data(db):
+    """Stage: ingest the master reference data."""
+    LOGGER.info("\n\n\nStep 2: Ingest Master Reference Data.\n\n")
+    DataIngestor(db_manager=db).ingest_master_data(MASTER_SQL_FILE)
+
+
+def ingest_fund_data(db, streaming=STREAMING_INGEST):
+    """
+    Stage: preprocess and ingest fund files that are new or changed since the last run, and drop the partitions
+    of files removed since.
+    """
     ingestor = DataIngestor(db_manager=db)
-    ingestor.ingest_master_data(MASTER_SQL_FILE)
-
-    # 3. Preprocess Fund Data
-    LOGGER.info("\n\n\nStep 3. Preprocess Fund Data.\n\n")
     validator = DataValidator(db_manager=db)
-    preprocessed_fund_df = validator.batch_preprocessing_csv(EXTERNAL_FUNDS_DATA_DIR,FUND_POSITION_FILE)
-    LOGGER.info(f"Total preprocessed fund data shape: {preprocessed_fund_df.shape}")
-
-    # 4. Ingest Fund Data
-    LOGGER.info("\n\n\nStep 4: Ingest processed Fund Data.\n\n")
-    ingestor = DataIngestor(db_manager=db)
-    ingestor.ingest_dataframe(preprocessed_fund_df,FUND_POSITIONS) 
-
-
-    # 5. Price Reconciliation
+    manifest = FileManifest(db_manager=db)
+
+    if SHARD_BY:
+        # 3-4. Preprocess new/changed fund files and load them into their shards, one worker process per shard
+        LOGGER.info("\n\n\nStep 3-4: Preprocess and Ingest Fund Data into Shards.\n\n")
+        # The reference DB only holds the manifest; position tables are created in the shards
+        pending_files = manifest.pending_files(EXTERNAL_FUNDS_DATA_DIR)
+        manifest.record(ShardManager(db.db_path, shard_by=SHARD_BY).ingest_files(pending_files))
+    elif streaming:
+        # 3-4. Stream new/changed fund files chunk by chunk straight into the database
+        LOGGER.info("\n\n\nStep 3-4: Stream and Ingest Fund Data.\n\n")
+        db.execute_script(FUND_POSITION_FILE)
+        pending_files = manifest.pending_files(EXTERNAL_FUNDS_DATA_DIR)
+        processed_files = ingestor.ingest_stream(
+            validator.stream_preprocessing_csv(pending_files, chunksize=CSV_CHUNKSIZE), FUND_POSITIONS
+        )
+        manifest.record(processed_files)
+    else:
+        # 3. Preprocess Fund Data (only files that are new or changed since the last run)
+        LOGGER.info("\n\n\nStep 3. Preprocess Fund Data.\n\n")
+        preprocessed_fund_df, processed_files = validator.incremental_preprocessing_csv(
+            EXTERNAL_FUNDS_DATA_DIR, FUND_POSITION_FILE, manifest, workers=PREPROCESS_WORKERS
+        )
+        LOGGER.info(f"Total preprocessed fund data shape: {preprocessed_fund_df.shape}")
+
+        # 4. Ingest Fund Data (replace the partitions of changed files, append new ones)
+        LOGGER.info("\n\n\nStep 4: Ingest processed Fund Data.\n\n")
+        if processed_files:
+            partitions = [(f['fund_name'], f['eom_date']) for f in processed_files]
+            ingestor.replace_partitions(preprocessed_fund_df, FUND_POSITIONS, partitions)
+            manifest.record(processed_files)
+        else:
+            LOGGER.info("No new or changed fund files to ingest.")
+
+    # Files deleted or renamed since the last run: drop the partitions no remaining file holds
+    removed_files, stale_partitions = manifest.removed_files(EXTERNAL_FUNDS_DATA_DIR)
+    if stale_partitions:
+        store = ShardManager(db.db_path, shard_by=SHARD_BY) if SHARD_BY else ingestor
+        store.drop_partitions(stale_partitions)
+    manifest.forget(removed_files)
+
+
+def reconcile_prices(db):
+    """Stage: incremental price reconciliation and its output."""
     LOGGER.info("\n\n\nStep 5: Perform Price Reconciliation.\n\n")
-    reconciler = PriceReconciler(db_manager=db)
-    final_reconciliation_df = reconciler.run_reconciliation()
-    final_reconciliation_df.to_csv(PRICE_RECON_OUTPUT)
-    
-
-    # 6. Performance Attribution (Rate of Return Calculation)
+    # Only partitions whose positions or master prices changed are reconciled; results persist in the database
+    # With sharded storage every shard is reconciled in parallel and the results are read back shard by shard
+    reconciler = ShardManager(db.db_path, shard_by=SHARD_BY) if SHARD_BY else PriceReconciler(db_manager=db)
+    reconciler.run_incremental()
+    writer = OutputWriter(OUTPUT_DIR, fmt=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION)
+    ReportPublisher(writer, layout=RECON_OUTPUT_LAYOUT).publish_reconciliation(reconciler)
+
+
+def attribute_performance(db):
+    """
+    Stage: performance attribution (rate of return), multi-period fund analytics, position-level contributions
+    and their output.
+    """
     LOGGER.info("\n\n\nStep 6: Perform Performance Attribution (Rate of Return Calculation).\n\n")
-    calculator = PerformanceCalculator(db_manager=db)
-    best_performer_df = calculator.run_attribution()
-    if not best_performer_df.empty:
-        calculator.save_output(best_performer_df, BEST_PERFORMING_OUTPUT)
-    else:
-        LOGGER.warning("No best performer data to save.")
+    # The fund-month summaries are read once, merged across shards with sharded storage, and feed every report
+    source = ShardManager(db.db_path, shard_by=SHARD_BY) if SHARD_BY else PerformanceCalculator(db_manager=db)
+    writer = OutputWriter(OUTPUT_DIR, fmt=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION)
+    ReportPublisher(writer).publish_attribution(source)
+
+
+def build_stages(streaming=STREAMING_INGEST):
+    """
+    The pipeline DAG. Reconciliation and attribution both only need the ingested positions, so they run
+    concurrently; attribution only reads the database and gets a read-only connection. Each stage reruns when
+    its inputs, settings or upstream stages changed.
+    """
+    extension = OutputWriter(OUTPUT_DIR, fmt=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION).extension
+    recon_output = os.path.join(OUTPUT_DIR, PRICE_RECON_OUTPUT_NAME)
+    if RECON_OUTPUT_LAYOUT != 'partitioned':
+        recon_output = f"{recon_output}.{extension}"
+    output_settings = {'format': OUTPUT_FORMAT, 'compression': OUTPUT_COMPRESSION}
+    return [
+        Stage('reference', load_reference_data, inputs=[MASTER_SQL_FILE]),
+        Stage('ingest', lambda db: ingest_fund_data(db, streaming), inputs=[EXTERNAL_FUNDS_DATA_DIR],
+              depends_on=['reference'], params={'streaming': streaming, 'shard_by': SHARD_BY}),
+        Stage('reconciliation', reconcile_prices, outputs=[recon_output], depends_on=['reference', 'ingest'],
+              params={'engine': RECON_ENGINE, 'tolerances': RECON_TOLERANCES, 'layout': RECON_OUTPUT_LAYOUT,
+                      **output_settings}),
+        Stage('attribution', attribute_performance,
+              outputs=[os.path.join(OUTPUT_DIR, f"{name}.{extension}") for name in (
+                  BEST_PERFORMING_OUTPUT_NAME, FUND_METRICS_OUTPUT_NAME, FUND_RETURNS_OUTPUT_NAME,
+                  FUND_RANKINGS_OUTPUT_NAME, POSITION_CONTRIBUTION_OUTPUT_NAME)],
+              depends_on=['ingest'], readonly=True,
+              params={'windows': ANALYTICS_WINDOWS, 'top_k': ANALYTICS_TOP_K,
+                      'risk_free_rate': ANALYTICS_RISK_FREE_RATE, **output_settings}),
+    ]
+
+
+def run_pipeline(streaming=STREAMING_INGEST, force=False, profile=False):
 
-    # 7. Check if connection is still open and close database connection
-    db.disconnect()
-    LOGGER.info("Database connection closed after master data ingestion.")
+    LOGGER.info("--BEGIN INVESTMENT ANALYSIS PIPELINE--")
 
+    # Stage and hot-path timings, rows and memory go to a JSON file per run; profile=True adds cProfile stats
+    if METRICS_ENABLED or profile:
+        METRICS.start_run(trace_memory=METRICS_TRACE_MEMORY, profile=profile)
+    try:
+        # Each stage borrows its own pooled connection to DB_NAME; completed stages are checkpointed so that a failed
+        # run resumes where it stopped, and stages whose inputs are unchanged are skipped.
+        StageRunner(build_stages(streaming), db_path=DB_NAME).run(force=force)
+    finally:
+        if METRICS.active:
+            METRICS.finish_run(METRICS_DIR)
 
+    LOGGER.info("--- Pipeline Completed Successfully ---")
 
-    # except Exception as e:
-    #     LOGGER.critical(f"Pipeline failed due to a critical error: {e}")
+def run_watch(poll_interval=WATCH_POLL_SECONDS, settle_seconds=WATCH_SETTLE_SECONDS):
+    """
+    Runs the pipeline once, then keeps ingesting and reconciling fund files as they land, into the shards with
+    sharded storage. Reconciliation results are written in RECON_OUTPUT_LAYOUT; the partitioned layout only
+    rewrites the refreshed fund-months.
+    """
+    run_pipeline()
 
+    db = DBManager(db_path=DB_NAME)
+    db.connect(connector="sqlite3")
+    DataIngestor(db_manager=db).ingest_master_data(MASTER_SQL_FILE)
+    writer = OutputWriter(OUTPUT_DIR, fmt=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION)
+    shards = ShardManager(db.db_path, shard_by=SHARD_BY) if SHARD_BY else None
+    watcher = FundWatcher(db, EXTERNAL_FUNDS_DATA_DIR, poll_interval=poll_interval, settle_seconds=settle_seconds,
+                          writer=writer, shards=shards)
+    watcher.run()
+    db.disconnect()
 
+def run_service(port=SERVICE_PORT):
+    """
+    Serves reconciliation breaks and attribution results from DB_NAME over HTTP until interrupted.
+    Not available with SHARD_BY: the results live in the shards, which the service does not query.
+    """
+    if SHARD_BY:
+        raise ValueError(f"The query service reads a single database and cannot serve sharded storage "
+                         f"(SHARD_BY={SHARD_BY!r}); unset SHARD_BY to use --serve.")
+    QueryService(DB_NAME, port=port).serve_forever()
 
-    LOGGER.info("--- Pipeline Completed Successfully ---")
 
 if __name__=="__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Investment analysis pipeline")
+    parser.add_argument('--watch', action='store_true',
+                        help=f"keep running and ingest new fund files as they land in '{EXTERNAL_FUNDS_DATA_DIR}'")
+    parser.add_argument('--poll-interval', type=float, default=WATCH_POLL_SECONDS,
+                        help="seconds between directory polls in watch mode")
+    parser.add_argument('--force', action='store_true', help="run every stage even if its inputs are unchanged")
+    parser.add_argument('--serve', action='store_true',
+                        help="serve reconciliation breaks and attribution results over HTTP instead of running")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help="port of the query service")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"also write cProfile stats of the run to '{METRICS_DIR}'")
+    args = parser.parse_args()
+    if args.serve:
+        run_service(port=args.port)
+    elif args.watch:
+        run_watch(poll_interval=args.poll_interval)
+    else:
+        run_pipeline(force=args.force, profile=args.profile)
 
 
 
@@ -0,0 +1,14 @@
+-- Dimension tables assigning integer surrogate keys to funds and instruments
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS dim_fund (
+    fund_id INTEGER PRIMARY KEY,
+    fund_name TEXT NOT NULL UNIQUE
+);
+
+-- identifier is COALESCE(symbol, isin) for fund positions, SYMBOL / ISIN for master prices
+CREATE TABLE IF NOT EXISTS dim_instrument (
+    instrument_id INTEGER PRIMARY KEY,
+    identifier TEXT NOT NULL UNIQUE
+);
+COMMIT;
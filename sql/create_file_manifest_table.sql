@@ -0,0 +1,16 @@
+-- Manifest of ingested fund report files; lives next to the reference data, also with sharded storage
+BEGIN TRANSACTION;
+
+-- Records which files have already been loaded so reruns only pick up new or changed drops
+CREATE TABLE IF NOT EXISTS processed_files (
+    file_path TEXT PRIMARY KEY,
+    file_size INTEGER NOT NULL,
+    file_mtime REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    fund_name TEXT NOT NULL,
+    eom_date TEXT NOT NULL,
+    row_count INTEGER,
+    processed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_processed_files_partition ON processed_files (fund_name, eom_date);
+COMMIT;
@@ -1,7 +1,8 @@
 -- Fund Positions for data loading
 BEGIN TRANSACTION;
 
-DROP TABLE IF EXISTS fund_positions; -- Should remove in production set up as this is dangerous. Track files that's been processed instead of dropping to remove duplicates..
+-- Partitions (fund_name, eom_date) are replaced in place by the ingestor; the processed_files manifest
+-- (create_file_manifest_table.sql) records which files have already been loaded.
 CREATE TABLE IF NOT EXISTS fund_positions (
     fund_name TEXT NOT NULL,
     eom_date TEXT NOT NULL,
@@ -14,7 +15,25 @@ CREATE TABLE IF NOT EXISTS fund_positions (
     quantity REAL,
     realised_p_l REAL,
     market_value REAL,
+    fund_id INTEGER,       -- dim_fund surrogate key
+    instrument_id INTEGER, -- dim_instrument surrogate key
     PRIMARY KEY (fund_name, eom_date, symbol)
 );
-COMMIT;
 
+-- Per (fund_name, eom_date) aggregates of fund_positions, recomputed by the ingestor for every partition it writes
+CREATE TABLE IF NOT EXISTS fund_month_summary (
+    fund_name TEXT NOT NULL,
+    eom_date TEXT NOT NULL,
+    fund_mv_end REAL,
+    realized_p_l REAL,
+    position_count INTEGER NOT NULL,
+    PRIMARY KEY (fund_name, eom_date)
+);
+
+-- Partitions written since the last reconciliation run; filled by the ingestor in the load transaction
+CREATE TABLE IF NOT EXISTS recon_dirty_partitions (
+    fund_name TEXT NOT NULL,
+    eom_date TEXT NOT NULL,
+    PRIMARY KEY (fund_name, eom_date)
+);
+COMMIT;
@@ -0,0 +1,20 @@
+-- Change signals of the reconciliation inputs as of the last reconciliation run. They describe the reference data,
+-- so with sharded storage they are kept once in the reference database rather than in every shard
+BEGIN TRANSACTION;
+
+-- Checksum of the master prices per instrument and month as of the last reconciliation run;
+-- a month whose checksum changed invalidates every partition holding the instrument from that month on
+CREATE TABLE IF NOT EXISTS master_price_digest (
+    source_table TEXT NOT NULL,
+    instrument_id INTEGER NOT NULL,
+    price_month TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (source_table, instrument_id, price_month)
+);
+-- Change signals by name: 'master_prices' holds the content hash of the master reference dump the
+-- master_price_digest was computed from, 'tolerances' the fingerprint of the break tolerances (BreakTracker)
+CREATE TABLE IF NOT EXISTS recon_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+COMMIT;
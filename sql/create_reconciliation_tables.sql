@@ -0,0 +1,37 @@
+-- Persisted price reconciliation results and the state used to recompute them incrementally
+BEGIN TRANSACTION;
+
+-- One row per distinct reported position price, replaced per (fund_name, eom_date) partition
+CREATE TABLE IF NOT EXISTS price_reconciliation (
+    fund_name TEXT NOT NULL,
+    eom_date TEXT NOT NULL,
+    financial_type TEXT,
+    identifier TEXT,
+    reported_price REAL,
+    master_price_filled REAL,
+    master_price_date TEXT,
+    price_difference REAL
+);
+CREATE INDEX IF NOT EXISTS idx_price_reconciliation_partition ON price_reconciliation (fund_name, eom_date);
+-- Lookups by instrument
+CREATE INDEX IF NOT EXISTS idx_price_reconciliation_identifier ON price_reconciliation (identifier, eom_date);
+
+-- Break classification per reconciled instrument, replaced per partition with price_reconciliation. break_category
+-- is the most severe of the instrument's rows: exact, lap_used (within tolerance of an earlier master price),
+-- tolerance_break or missing_reference; break_age counts the consecutive fund-months up to eom_date in which the
+-- instrument has been broken (tolerance_break or missing_reference), 0 when it is not
+CREATE TABLE IF NOT EXISTS recon_breaks (
+    fund_name TEXT NOT NULL,
+    eom_date TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    financial_type TEXT,
+    break_category TEXT NOT NULL,
+    price_difference REAL,
+    tolerance REAL,
+    break_age INTEGER NOT NULL,
+    PRIMARY KEY (fund_name, eom_date, identifier)
+);
+-- Partial index over the open breaks only (a small share of the rows), as served by the query service's /breaks
+CREATE INDEX IF NOT EXISTS idx_recon_breaks_open ON recon_breaks (fund_name, eom_date, identifier)
+    WHERE break_category IN ('tolerance_break', 'missing_reference');
+COMMIT;
@@ -0,0 +1,9 @@
+-- Content hash of the master reference dump currently loaded in this database
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS reference_state (
+    source_path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    loaded_at TEXT NOT NULL
+);
+COMMIT;
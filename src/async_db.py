@@ -0,0 +1,116 @@
+# async_db.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from src.db_manager import DBManager
+from config import LOGGER, ASYNC_DB_WORKERS, ASYNC_STREAM_BATCH
+
+
+class AsyncDBManager:
+    """
+    Asyncio facade over a pooled DBManager. Every query runs on a bounded thread pool with its own pooled
+    connection, so the event loop never blocks and up to max_workers queries (reads on read-only connections)
+    run at the same time. Cancelling the awaiting task interrupts the running SQLite statement, and the
+    connection goes back to the pool rolled back.
+    """
+    def __init__(self, db_manager: DBManager, max_workers=ASYNC_DB_WORKERS):
+        if not db_manager.pool_size:
+            raise ValueError("AsyncDBManager needs a DBManager created with a pool_size.")
+        self.db_manager = db_manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='async-db')
+        LOGGER.info(f"AsyncDBManager initialized (max_workers={max_workers}).")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def execute(self, query, params=(), readonly=False):
+        """Runs query; returns its rows as a list of tuples, or the number of rows changed by a write."""
+        def work(conn):
+            cursor = conn.execute(query, params)
+            return cursor.fetchall() if cursor.description else cursor.rowcount
+        return await self._run(work, readonly)
+
+    async def fetch_df(self, query, params=None):
+        """Runs a read query and returns its result as a DataFrame."""
+        return await self._run(lambda conn: pd.read_sql(query, conn, params=params), readonly=True)
+
+    async def stream(self, query, params=(), batch_size=ASYNC_STREAM_BATCH):
+        """
+        Async iterator over the rows of a read query, fetched batch_size rows at a time on the thread pool.
+        At most two batches are buffered ahead of the consumer; leaving the loop early stops the query.
+        """
+        loop = asyncio.get_running_loop()
+        batches = asyncio.Queue(maxsize=2)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            if not stop.is_set():
+                asyncio.run_coroutine_threadsafe(batches.put(item), loop).result()
+
+        def work(conn):
+            try:
+                cursor = conn.execute(query, params)
+                while not stop.is_set():
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    put(rows)
+            except Exception as e:
+                put(e)
+            put(done)
+
+        future = asyncio.ensure_future(self._run(work, readonly=True, stop=stop))
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is done:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                for row in batch:
+                    yield row
+        finally:
+            stop.set()
+            # Unblock a producer waiting on a full queue
+            while not batches.empty():
+                batches.get_nowait()
+            if not future.done():
+                future.cancel()
+            await asyncio.gather(future, return_exceptions=True)
+
+    async def _run(self, func, readonly=False, stop=None):
+        """Runs func(conn) on the thread pool with a pooled connection; cancellation interrupts the query."""
+        loop = asyncio.get_running_loop()
+        state = {'conn': None, 'cancelled': False}
+        lock = threading.Lock()
+
+        def work():
+            with self.db_manager.connection(readonly) as conn:
+                with lock:
+                    if state['cancelled']:
+                        raise asyncio.CancelledError()
+                    state['conn'] = conn
+                try:
+                    return func(conn)
+                finally:
+                    with lock:
+                        state['conn'] = None
+
+        try:
+            return await loop.run_in_executor(self._executor, work)
+        except asyncio.CancelledError:
+            with lock:
+                state['cancelled'] = True
+                if stop is not None:
+                    stop.set()
+                if state['conn'] is not None:
+                    state['conn'].interrupt()
+            raise
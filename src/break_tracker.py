@@ -0,0 +1,172 @@
+# break_tracker.py
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from src.metrics import instrument
+from config import LOGGER, RECON_BREAKS, FUND_MONTH_SUMMARY, RECON_TOLERANCES
+
+# Break categories in increasing order of severity
+CATEGORIES = ['exact', 'lap_used', 'tolerance_break', 'missing_reference']
+# Categories that count as an open break for aging
+BROKEN_CATEGORIES = ['tolerance_break', 'missing_reference']
+BREAK_COLUMNS = ['fund_name', 'eom_date', 'identifier', 'financial_type', 'break_category', 'price_difference',
+                 'tolerance', 'break_age']
+
+
+class BreakTracker:
+    """
+    Classifies reconciled prices against absolute and relative tolerances per financial_type and keeps, per fund and
+    instrument, the number of consecutive fund-months it has been broken (recon_breaks).
+
+    Aging is incremental: the ages of a reconciled batch continue from the stored age at each fund's previous EOM
+    date, so history is not rescanned. Stored later months of a fund are only re-aged when an earlier month is
+    reconciled again (a resubmitted file or changed master prices).
+
+    fingerprint identifies the tolerances, so that stored classifications made with other tolerances can be
+    recognized (PriceReconciler reclassifies every partition when it changes).
+    """
+    def __init__(self, tolerances=RECON_TOLERANCES):
+        self.fingerprint = hashlib.sha256(json.dumps(tolerances, sort_keys=True).encode()).hexdigest()
+        default = tolerances.get('default', {})
+        self.default_abs = default.get('abs', 0.0)
+        self.default_rel = default.get('rel', 0.0)
+        self.tolerances = {ft: tol for ft, tol in tolerances.items() if ft != 'default'}
+
+    def tolerance(self, result_df):
+        """Allowed |price_difference| of every row: abs + rel * |master price| of its financial_type."""
+        financial_type = result_df['financial_type'].astype(object)
+        abs_tol = financial_type.map({ft: tol.get('abs', self.default_abs) for ft, tol in self.tolerances.items()})
+        rel_tol = financial_type.map({ft: tol.get('rel', self.default_rel) for ft, tol in self.tolerances.items()})
+        master = result_df['master_price_filled'].astype(float).abs()
+        return (abs_tol.fillna(self.default_abs).astype(float)
+                + rel_tol.fillna(self.default_rel).astype(float) * master.fillna(0.0)).to_numpy()
+
+    def classify(self, result_df, tolerance=None):
+        """Break category of every reconciliation row, as an ordered categorical aligned with result_df."""
+        if tolerance is None:
+            tolerance = self.tolerance(result_df)
+        master = result_df['master_price_filled'].astype(float).to_numpy()
+        difference = (result_df['reported_price'].astype(float) - result_df['master_price_filled'].astype(float)).abs()
+        lap_used = (pd.to_datetime(result_df['master_price_date']) < pd.to_datetime(result_df['eom_date'])).to_numpy()
+        codes = np.select(
+            [np.isnan(master), difference.to_numpy() > tolerance, lap_used],
+            [3, 2, 1], default=0,
+        )
+        return pd.Series(pd.Categorical.from_codes(codes, categories=CATEGORIES, ordered=True),
+                         index=result_df.index, name='break_category')
+
+    @instrument(rows_in=lambda self, conn, result_df, *args, **kwargs: len(result_df))
+    def store(self, conn, result_df, batch_table, history=None):
+        """
+        Replaces the recon_breaks rows of the partitions in batch_table with the classification of result_df (the
+        reconciled rows of those partitions) and brings the break ages of the affected funds up to date. Runs on
+        the caller's transaction.
+
+        history names an attached schema holding the funds' earlier months (fund_month_summary and recon_breaks,
+        e.g. the previous year's shard); its rows seed the ages like stored ones but are never updated.
+        """
+        summary, breaks = FUND_MONTH_SUMMARY, RECON_BREAKS
+        if history is not None:
+            summary = (f"(SELECT fund_name, eom_date FROM main.{FUND_MONTH_SUMMARY} "
+                       f"UNION ALL SELECT fund_name, eom_date FROM {history}.{FUND_MONTH_SUMMARY})")
+            columns = "fund_name, eom_date, identifier, break_category, break_age"
+            breaks = (f"(SELECT {columns} FROM main.{RECON_BREAKS} "
+                      f"UNION ALL SELECT {columns} FROM {history}.{RECON_BREAKS})")
+        batch = self._instrument_breaks(result_df)
+        conn.execute(f"""
+        DELETE FROM {RECON_BREAKS}
+        WHERE (fund_name, eom_date) IN (SELECT fund_name, eom_date FROM {batch_table});
+        """)
+        if batch.empty:
+            return batch
+
+        # Fund-months of the affected funds with their previous EOM date, from the month before the batch on
+        start = batch.groupby('fund_name', observed=True)['eom_date'].min()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS aging_funds (fund_name TEXT PRIMARY KEY, start_eom TEXT);")
+        conn.execute("DELETE FROM temp.aging_funds;")
+        conn.executemany("INSERT INTO temp.aging_funds VALUES (?, ?);", start.items())
+        months = pd.read_sql(f"""
+        SELECT s.fund_name, s.eom_date,
+               LAG(s.eom_date) OVER (PARTITION BY s.fund_name ORDER BY s.eom_date) AS prev_eom
+        FROM {summary} s JOIN temp.aging_funds a ON a.fund_name = s.fund_name;
+        """, conn)
+        seed_eom = months.merge(start.rename('start_eom').reset_index(), on='fund_name')
+        seed_eom = seed_eom[seed_eom['eom_date'] == seed_eom['start_eom']].set_index('fund_name')['prev_eom']
+        conn.executemany("UPDATE temp.aging_funds SET start_eom = ? WHERE fund_name = ?;",
+                         [(eom, fund) for fund, eom in seed_eom.dropna().items()])
+
+        # Stored rows of those funds from the seed month on; the batch partitions were deleted above
+        stored = pd.read_sql(f"""
+        SELECT b.fund_name, b.eom_date, b.identifier, b.break_category, b.break_age
+        FROM {breaks} b JOIN temp.aging_funds a ON a.fund_name = b.fund_name AND b.eom_date >= a.start_eom;
+        """, conn)
+        stored['is_batch'] = False
+        frame = pd.concat([stored, batch.assign(is_batch=True)], ignore_index=True)
+        frame['fund_name'] = frame['fund_name'].astype(str)
+        frame['break_category'] = frame['break_category'].astype(str)
+        frame = frame.merge(months[['fund_name', 'eom_date', 'prev_eom']], on=['fund_name', 'eom_date'], how='left')
+        frame['is_seed'] = ~frame['is_batch'] & (frame['eom_date'] < frame['fund_name'].map(start).astype(str))
+        frame['stored_age'] = frame['break_age']
+        frame = frame.sort_values(['fund_name', 'identifier', 'eom_date'], ignore_index=True)
+        frame['break_age'] = self._age(frame)
+
+        batch_rows = frame[frame['is_batch']]
+        conn.executemany(
+            f"INSERT INTO {RECON_BREAKS} ({', '.join(BREAK_COLUMNS)}) VALUES ({', '.join('?' for _ in BREAK_COLUMNS)});",
+            batch_rows[BREAK_COLUMNS].astype(object).where(batch_rows[BREAK_COLUMNS].notna(), None)
+            .itertuples(index=False, name=None)
+        )
+        later = frame[~frame['is_batch'] & ~frame['is_seed'] & (frame['break_age'] != frame['stored_age'])]
+        if not later.empty:
+            conn.executemany(
+                f"UPDATE {RECON_BREAKS} SET break_age = ? WHERE fund_name = ? AND eom_date = ? AND identifier = ?;",
+                later[['break_age', 'fund_name', 'eom_date', 'identifier']].astype(object).itertuples(index=False, name=None)
+            )
+            LOGGER.info(f"Re-aged {len(later)} later break rows after reconciling earlier months again.")
+        counts = batch_rows['break_category'].value_counts()
+        LOGGER.info(f"Break categories of the reconciled instruments: {counts.to_dict()}; "
+                    f"{(batch_rows['break_age'] > 1).sum()} breaks open for more than one month.")
+        return batch_rows[BREAK_COLUMNS].reset_index(drop=True)
+
+    def _instrument_breaks(self, result_df):
+        """One row per (fund_name, eom_date, identifier) with its most severe category and largest difference."""
+        if result_df.empty:
+            return pd.DataFrame(columns=BREAK_COLUMNS[:-1])
+        tolerance = self.tolerance(result_df)
+        rows = pd.DataFrame({
+            'fund_name': result_df['fund_name'].astype(str).to_numpy(),
+            'eom_date': pd.to_datetime(result_df['eom_date']).dt.strftime('%Y-%m-%d').to_numpy(),
+            'identifier': result_df['identifier'].astype(object).fillna('').astype(str).to_numpy(),
+            'financial_type': result_df['financial_type'].astype(object).to_numpy(),
+            'category_code': self.classify(result_df, tolerance).cat.codes.to_numpy(),
+            'price_difference': result_df['price_difference'].astype(float).to_numpy(),
+            'abs_difference': result_df['price_difference'].astype(float).abs().to_numpy(),
+            'tolerance': tolerance,
+        })
+        # The most severe row of each instrument, then its largest difference
+        rows = rows.sort_values(['category_code', 'abs_difference'], ascending=False, kind='stable')
+        rows = rows.drop_duplicates(['fund_name', 'eom_date', 'identifier'])
+        rows['break_category'] = np.array(CATEGORIES)[rows['category_code']]
+        return rows[BREAK_COLUMNS[:-1]].reset_index(drop=True)
+
+    @staticmethod
+    def _age(frame):
+        """
+        Consecutive broken fund-months per row of frame, sorted by (fund_name, identifier, eom_date): a row extends
+        the previous row's run when that row is the same instrument at the fund's previous EOM date and was broken.
+        Seed rows (the month before the batch) keep their stored age and start the runs they belong to.
+        """
+        broken = frame['break_category'].isin(BROKEN_CATEGORIES).to_numpy()
+        same_instrument = ((frame['fund_name'] == frame['fund_name'].shift())
+                           & (frame['identifier'] == frame['identifier'].shift())).to_numpy()
+        consecutive = (frame['eom_date'].shift() == frame['prev_eom']).to_numpy()
+        linked = same_instrument & consecutive & np.roll(broken, 1)
+        linked[0] = False
+
+        run = np.cumsum(~linked)
+        is_seed = frame['is_seed'].to_numpy()
+        base = np.where(is_seed, frame['stored_age'].fillna(0).to_numpy(), broken.astype(int))
+        run_base = pd.Series(base).groupby(run).transform('first').to_numpy()
+        position = pd.Series(run).groupby(run).cumcount().to_numpy()
+        return np.where(broken, run_base + position, 0).astype(int)
@@ -2,28 +2,386 @@
 import pandas as pd
 import re
 import os
+import time
 from src.db_manager import DBManager
 from src.data_validation import DataValidator
-from config import LOGGER, FUND_POSITIONS
+from src.dimensions import DimensionManager
+from src.file_manifest import FileManifest
+from src.reference_cache import ReferenceCache
+from src.metrics import instrument
+from config import (LOGGER, FUND_POSITIONS, BULK_LOAD_BATCH_SIZE, BULK_LOAD_PRAGMAS, MASTER_PRICE_TABLES,
+                    RECON_DIRTY_PARTITIONS, FUND_MONTH_SUMMARY, REFERENCE_CACHE_ENABLED, REFERENCE_CACHE_DIR)
 
 class DataIngestor:
    
     def __init__(self, db_manager: DBManager):
         self.db_manager = db_manager
+        self.dimensions = DimensionManager(db_manager)
+        self._schema_ready = False
         LOGGER.info("DataIngestor initialized.")
 
-    def ingest_master_data(self, sql_script_path):
-        self.db_manager.execute_script(sql_script_path)
+    def ingest_master_data(self, sql_script_path, use_cache=REFERENCE_CACHE_ENABLED, cache_dir=REFERENCE_CACHE_DIR):
+        """
+        Loads the master reference dump. With use_cache the dump is skipped entirely when the database already
+        holds the reference data of a dump with the same content hash; otherwise the loaded and normalized
+        tables come from a snapshot in cache_dir keyed by that hash (ReferenceCache), built once per distinct dump.
+        """
+        if not use_cache:
+            self.db_manager.execute_script(sql_script_path)
+            self.prepare_master_prices()
+            # The tables no longer match any recorded dump
+            ReferenceCache(self.db_manager, cache_dir).clear()
+            LOGGER.info("Master Reference Data Ingested.")
+            return True
+
+        cache = ReferenceCache(self.db_manager, cache_dir)
+        content_hash = FileManifest.content_hash(sql_script_path)
+        if cache.is_current(content_hash):
+            LOGGER.info(f"Master Reference Data unchanged (sha256 {content_hash[:12]}); skipping load.")
+            return True
+        snapshot_path = cache.snapshot_path(content_hash)
+        if not os.path.exists(snapshot_path):
+            cache.build_snapshot(sql_script_path, snapshot_path, self.normalize_master_prices)
+        cache.restore(snapshot_path)
+        self.prepare_master_prices()
+        cache.record(content_hash, sql_script_path)
         LOGGER.info("Master Reference Data Ingested.")
         return True
+
+    def prepare_master_prices(self):
+        """
+        Post-load step for the master price tables.
+
+        Normalizes the price tables (see normalize_master_prices), stamps the dim_instrument surrogate key,
+        builds the covering (instrument_id, price_date, PRICE) indexes and runs ANALYZE, so reconciliation
+        never has to reparse or scan the reference history.
+        """
+        self._ensure_schema()
+        raw_dates = self.normalize_master_prices(self.db_manager.conn)
+        self.dimensions.sync_master_instruments()
+        self.db_manager.conn.execute("ANALYZE;")
+        LOGGER.info(f"Normalized {raw_dates} distinct master price dates and indexed {len(MASTER_PRICE_TABLES)} price tables.")
+
+    @staticmethod
+    def normalize_master_prices(conn):
+        """
+        Trims the identifier columns, adds an ISO 'price_date' column parsed once from the mixed-format
+        DATETIME strings (only their distinct values are parsed) and builds covering (identifier, price_date,
+        PRICE) indexes. Rows that already carry a price_date are left untouched. Works on any connection
+        holding the master tables, so reference snapshots are stored normalized. Returns the number of
+        distinct dates parsed.
+        """
+        for table, id_col in MASTER_PRICE_TABLES:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if 'price_date' not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN price_date TEXT;")
+
+        raw_dates = pd.read_sql(' UNION '.join(
+            f"SELECT DISTINCT DATETIME AS raw FROM {table} WHERE price_date IS NULL AND DATETIME IS NOT NULL"
+            for table, _ in MASTER_PRICE_TABLES
+        ), conn)
+        raw_dates['iso'] = pd.to_datetime(raw_dates['raw'], format='mixed').dt.strftime('%Y-%m-%d')
+
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS temp.master_date_map;")
+            conn.execute("CREATE TEMP TABLE master_date_map (raw TEXT PRIMARY KEY, iso TEXT);")
+            conn.executemany("INSERT INTO temp.master_date_map VALUES (?, ?);",
+                             raw_dates[['raw', 'iso']].itertuples(index=False, name=None))
+            for table, id_col in MASTER_PRICE_TABLES:
+                conn.execute(f"""
+                UPDATE {table}
+                SET price_date = (SELECT iso FROM temp.master_date_map WHERE raw = {table}.DATETIME),
+                    {id_col} = TRIM({id_col})
+                WHERE price_date IS NULL;
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{id_col.lower()}_date "
+                             f"ON {table} ({id_col}, price_date, PRICE);")
+            conn.execute("DROP TABLE temp.master_date_map;")
+        return len(raw_dates)
                                        
 
-    def ingest_dataframe(self, df, table_name):
+    def ingest_dataframe(self, df, table_name, mode='append'):
+        """
+        Writes df into table_name.
+
+        mode='append' appends with DataFrame.to_sql; mode='upsert' uses the bulk loader, which merges on the
+        table's primary key so resubmitted rows update the existing ones instead of failing.
+        """
+        if mode == 'upsert':
+            return self.bulk_upsert_dataframe(df, table_name)
         try:
             conn = self.db_manager.conn
+            df = self._with_surrogate_keys(conn, df, table_name)
             df.to_sql(table_name, conn, if_exists='append', index=False)
+            with conn:
+                self._track_partitions(conn, table_name, self._partitions_of(df))
             LOGGER.info(f"Successfully inserted {len(df)} rows into '{table_name}'.")
             return True
         except Exception as e:
             LOGGER.error(f"Failed to insert data into '{table_name}': {e}")
             raise
+
+    @instrument(rows_in=lambda self, df, *args, **kwargs: len(df))
+    def bulk_upsert_dataframe(self, df, table_name, key_columns=None, batch_size=BULK_LOAD_BATCH_SIZE):
+        """
+        Bulk loads df into a staging table with executemany batches, then merges it into table_name with
+        INSERT ... ON CONFLICT(key_columns) DO UPDATE. key_columns defaults to the table's primary key.
+        Load PRAGMAs (WAL journal, relaxed synchronous, larger cache) apply for the duration of the load only.
+        """
+        start = time.perf_counter()
+        self._ensure_schema(table_name)
+        try:
+            with self.db_manager.pragmas(**BULK_LOAD_PRAGMAS) as conn:
+                with conn:
+                    df = self._with_surrogate_keys(conn, df, table_name)
+                    rows = self._merge_rows(conn, df, table_name, key_columns, batch_size)
+                    self._track_partitions(conn, table_name, self._partitions_of(df))
+        except Exception as e:
+            LOGGER.error(f"Failed to upsert data into '{table_name}': {e}")
+            raise
+        self._log_throughput('Upserted', rows, table_name, start)
+        return True
+
+    @instrument(rows_in=lambda self, df, *args, **kwargs: len(df))
+    def replace_partitions(self, df, table_name, partitions):
+        """
+        Replaces the (fund_name, eom_date) partitions of table_name with the rows in df, in one transaction.
+
+        Partitions listed without rows in df are simply cleared, so a resubmitted file that no longer
+        yields rows does not leave stale positions behind. Rows are written through the bulk loader.
+        """
+        partitions = sorted(set(partitions))
+        start = time.perf_counter()
+        self._ensure_schema(table_name)
+        try:
+            with self.db_manager.pragmas(**BULK_LOAD_PRAGMAS) as conn:
+                with conn:
+                    conn.executemany(
+                        f"DELETE FROM {table_name} WHERE fund_name = ? AND eom_date = ?;", partitions
+                    )
+                    df = self._with_surrogate_keys(conn, df, table_name)
+                    inserted = self._merge_rows(conn, df, table_name)
+                    self._track_partitions(conn, table_name, partitions)
+        except Exception as e:
+            LOGGER.error(f"Failed to replace partitions in '{table_name}': {e}")
+            raise
+        LOGGER.info(f"Replaced {len(partitions)} partitions in '{table_name}'.")
+        self._log_throughput('Loaded', inserted, table_name, start)
+        return True
+
+    def drop_partitions(self, partitions, table_name=FUND_POSITIONS):
+        """
+        Removes the (fund_name, eom_date) partitions of table_name, e.g. those of fund files deleted since they
+        were loaded (FileManifest.removed_files). Their summaries are removed and they are queued for
+        reconciliation as with replace_partitions, which clears their results.
+        """
+        if not partitions:
+            return False
+        return self.replace_partitions(pd.DataFrame(), table_name, partitions)
+
+    def _ensure_schema(self, table_name=FUND_POSITIONS):
+        """
+        Creates the dimension tables and backfills fund_month_summary once per ingestor, before any load
+        transaction is opened.
+        """
+        if table_name == FUND_POSITIONS and not self._schema_ready:
+            self.dimensions.ensure_tables()
+            self._backfill_summary()
+            self._schema_ready = True
+
+    def _backfill_summary(self):
+        """Builds fund_month_summary from all positions when it is empty but positions exist (e.g. after an upgrade)."""
+        conn = self.db_manager.conn
+        if not conn.execute(f"PRAGMA table_info({FUND_MONTH_SUMMARY})").fetchall():
+            return
+        if conn.execute(f"SELECT 1 FROM {FUND_MONTH_SUMMARY} LIMIT 1;").fetchone():
+            return
+        with conn:
+            rows = conn.execute(f"""
+            INSERT INTO {FUND_MONTH_SUMMARY} (fund_name, eom_date, fund_mv_end, realized_p_l, position_count)
+            SELECT fund_name, eom_date, SUM(market_value), SUM(realised_p_l), COUNT(*)
+            FROM {FUND_POSITIONS}
+            GROUP BY fund_name, eom_date;
+            """).rowcount
+        if rows:
+            LOGGER.info(f"Backfilled {rows} fund-months into '{FUND_MONTH_SUMMARY}'.")
+
+    def _with_surrogate_keys(self, conn, df, table_name):
+        """
+        Adds fund_id / instrument_id to rows bound for fund_positions; other tables, and rows whose keys were
+        already assigned against the shared dimensions (sharded ingestion), are left as they are.
+        """
+        if table_name != FUND_POSITIONS or {'fund_id', 'instrument_id'} <= set(df.columns):
+            return df
+        self._ensure_schema(table_name)
+        return self.dimensions.annotate_positions(df, conn)
+
+    @staticmethod
+    def _partitions_of(df):
+        if df.empty or not {'fund_name', 'eom_date'} <= set(df.columns):
+            return []
+        return list(df[['fund_name', 'eom_date']].drop_duplicates().itertuples(index=False, name=None))
+
+    @staticmethod
+    def _track_partitions(conn, table_name, partitions):
+        """
+        Bookkeeping for fund_positions partitions written on the open transaction: their fund_month_summary
+        rows are recomputed and they are queued for the next incremental reconciliation. The temp table is
+        emptied rather than dropped, so per-file calls cause no schema change that would invalidate the
+        connection's prepared statements.
+        """
+        if table_name != FUND_POSITIONS or not partitions:
+            return
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS written_partitions (fund_name TEXT, eom_date TEXT, PRIMARY KEY (fund_name, eom_date));")
+        conn.execute("DELETE FROM temp.written_partitions;")
+        conn.executemany("INSERT OR IGNORE INTO temp.written_partitions VALUES (?, ?);", partitions)
+        conn.execute(f"""
+        DELETE FROM {FUND_MONTH_SUMMARY}
+        WHERE (fund_name, eom_date) IN (SELECT fund_name, eom_date FROM temp.written_partitions);
+        """)
+        conn.execute(f"""
+        INSERT INTO {FUND_MONTH_SUMMARY} (fund_name, eom_date, fund_mv_end, realized_p_l, position_count)
+        SELECT p.fund_name, p.eom_date, SUM(p.market_value), SUM(p.realised_p_l), COUNT(*)
+        FROM temp.written_partitions w
+        JOIN {FUND_POSITIONS} p ON p.fund_name = w.fund_name AND p.eom_date = w.eom_date
+        GROUP BY p.fund_name, p.eom_date;
+        """)
+        conn.execute(f"""
+        INSERT OR IGNORE INTO {RECON_DIRTY_PARTITIONS} (fund_name, eom_date)
+        SELECT fund_name, eom_date FROM temp.written_partitions;
+        """)
+
+    @staticmethod
+    def _log_throughput(action, rows, table_name, start):
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed > 0 else float('nan')
+        LOGGER.info(f"{action} {rows} rows into '{table_name}' in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+
+    @staticmethod
+    def _primary_key(conn, table_name):
+        columns = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+        return [name for _, name, _, _, _, pk in sorted(columns, key=lambda c: c[5]) if pk]
+
+    def _merge_rows(self, conn, df, table_name, key_columns=None, batch_size=BULK_LOAD_BATCH_SIZE):
+        """Stages df and merges it into table_name on an open transaction. Returns the number of rows staged."""
+        if df.empty:
+            return 0
+        key_columns = list(key_columns or self._primary_key(conn, table_name))
+        if not key_columns:
+            raise ValueError(f"Table '{table_name}' has no primary key to merge on.")
+
+        duplicates = df.duplicated(subset=[c for c in key_columns if c in df.columns]).sum()
+        if duplicates:
+            LOGGER.warning(f"{duplicates} rows share a key {tuple(key_columns)} with an earlier row; the last one wins.")
+
+        staging_table = f"stage_{table_name}"
+        conn.execute(f"DROP TABLE IF EXISTS temp.{staging_table};")
+        conn.execute(f"CREATE TEMP TABLE {staging_table} AS SELECT * FROM {table_name} WHERE 0;")
+        for offset in range(0, len(df), batch_size):
+            self._insert_rows(conn, df.iloc[offset:offset + batch_size], f"temp.{staging_table}")
+
+        columns = ', '.join(df.columns)
+        updates = ', '.join(f"{c} = excluded.{c}" for c in df.columns if c not in key_columns)
+        conflict_action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        # "WHERE true" disambiguates the ON CONFLICT clause from a join constraint in INSERT ... SELECT
+        conn.execute(f"""
+        INSERT INTO {table_name} ({columns})
+        SELECT {columns} FROM temp.{staging_table} WHERE true
+        ON CONFLICT ({', '.join(key_columns)}) {conflict_action};
+        """)
+        conn.execute(f"DROP TABLE temp.{staging_table};")
+        return len(df)
+
+    @instrument(rows_out=lambda ingested: sum(entry['row_count'] for entry in ingested))
+    def ingest_stream(self, file_streams, table_name, log_every=100000):
+        """
+        Writes streamed fund files into table_name inside a single transaction.
+
+        Rows are merged on the table's primary key like the batch loader, so a file repeating a key loads the
+        same rows in both modes. file_streams yields (entry, chunks) as produced by DataValidator.stream_preprocessing_csv. Each file's
+        partition is replaced under its own savepoint, so a file that fails halfway is rolled back and skipped
+        while the rest of the stream is still committed. Only one chunk is held in memory at a time.
+        Returns the entries that were ingested, with row_count filled in.
+        """
+        conn = self.db_manager.conn
+        ingested = []
+        total_rows = 0
+        next_report = log_every
+        start = time.perf_counter()
+        self._ensure_schema(table_name)
+        key_columns = self._primary_key(conn, table_name)
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                for entry, chunks in file_streams:
+                    conn.execute("SAVEPOINT stream_file")
+                    try:
+                        conn.execute(
+                            f"DELETE FROM {table_name} WHERE fund_name = ? AND eom_date = ?;",
+                            (entry['fund_name'], entry['eom_date'])
+                        )
+                        # Rows are merged on the primary key as in replace_partitions: a repeated key keeps its last row
+                        rows = sum(
+                            self._insert_rows(conn, self._with_surrogate_keys(conn, chunk, table_name), table_name,
+                                              key_columns)
+                            for chunk in chunks
+                        )
+                        self._track_partitions(conn, table_name, [(entry['fund_name'], entry['eom_date'])])
+                        self._warn_duplicates(conn, table_name, entry, rows)
+                        conn.execute("RELEASE stream_file")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO stream_file")
+                        conn.execute("RELEASE stream_file")
+                        LOGGER.error(f"Fatal error processing file {entry['file_name']}: {e}")
+                        continue
+
+                    entry['row_count'] = rows
+                    ingested.append(entry)
+                    total_rows += rows
+                    if total_rows >= next_report:
+                        elapsed = time.perf_counter() - start
+                        LOGGER.info(f"Streamed {total_rows} rows into '{table_name}' ({total_rows / elapsed:,.0f} rows/s).")
+                        next_report += log_every
+        except Exception as e:
+            LOGGER.error(f"Failed to stream data into '{table_name}': {e}")
+            raise
+
+        elapsed = time.perf_counter() - start
+        rate = total_rows / elapsed if elapsed > 0 else float('nan')
+        LOGGER.info(f"Streamed {total_rows} rows from {len(ingested)} files into '{table_name}' "
+                    f"in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+        return ingested
+
+    @staticmethod
+    def _warn_duplicates(conn, table_name, entry, rows):
+        """Warns when fewer rows than streamed ended up in a fund_positions partition (repeated keys)."""
+        if table_name != FUND_POSITIONS:
+            return
+        stored = conn.execute(
+            f"SELECT position_count FROM {FUND_MONTH_SUMMARY} WHERE fund_name = ? AND eom_date = ?;",
+            (entry['fund_name'], entry['eom_date'])
+        ).fetchone()
+        duplicates = rows - (stored[0] if stored else 0)
+        if duplicates > 0:
+            LOGGER.warning(f"{duplicates} rows of {entry['file_name']} share a key with an earlier row; the last one wins.")
+
+    @staticmethod
+    def _insert_rows(conn, df, table_name, key_columns=None):
+        """
+        Inserts df into table_name on an open transaction; NaN values are written as NULL. With key_columns a
+        row whose key already exists updates it (INSERT ... ON CONFLICT DO UPDATE).
+        """
+        if df.empty:
+            return 0
+        columns = list(df.columns)
+        placeholders = ', '.join('?' for _ in columns)
+        conflict_clause = ""
+        if key_columns:
+            updates = ', '.join(f"{c} = excluded.{c}" for c in columns if c not in key_columns)
+            conflict_action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            conflict_clause = f" ON CONFLICT ({', '.join(key_columns)}) {conflict_action}"
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        conn.executemany(
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}){conflict_clause};", rows
+        )
+        return len(df)
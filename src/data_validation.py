@@ -2,10 +2,12 @@
 
 import pandas as pd
 from src.db_manager import DBManager
-from config import LOGGER
+from src.metrics import instrument
+from config import LOGGER, CSV_CHUNKSIZE
 
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 class DataValidator:
     """Validates and preprocesses fund data before loading into the database."""
@@ -14,22 +16,25 @@ class DataValidator:
         LOGGER.info("DataValidator initialized.")
 
     def _preprocess_dataframe(self, df, fund_name, eom_date):
-        """Standardizes columns and performs basic data quality checks."""
+        """
+        Standardizes columns and performs basic data quality checks.
+
+        The columns kept are those of the file's header, whatever the values of df, and every other step works
+        row by row, so a file preprocessed whole or chunk by chunk (stream_preprocessing_csv) gives the same rows.
+        """
         
         # Standardize column names (make lowercase and replace non-alphanumeric with '_')
         df.columns = df.columns.str.lower().str.replace(r'[^a-z0-9]+', '_', regex=True).str.strip('_')
 
-        # Drop columns that are entirely null or not needed for core analysis
-        df = df.dropna(axis=1, how='all')
-
         # Add identifying columns
         df['fund_name'] = fund_name
         df['eom_date'] = eom_date
         
-        # Clean symbol/security name prefixes (e.g., 'X_', 'SEC-', 'FIN-')
+        # Clean symbol/security name prefixes (e.g., 'X_', 'SEC-', 'FIN-'); blank cells stay NULL
         for col in ['security_name', 'symbol']:
             if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(r'(X_|SEC-|FIN-)', '', regex=True).str.strip()
+                cleaned = df[col].astype(str).str.replace(r'(X_|SEC-|FIN-)', '', regex=True).str.strip()
+                df[col] = cleaned.where(df[col].notna(), None)
 
         # Data Quality Check: Missing Market Value
         missing_mv = df['market_value'].isnull().sum()
@@ -47,7 +52,7 @@ class DataValidator:
         df['realised_p_l'] = df['realised_p_l'].fillna(0.0)
         df['quantity'] = df['quantity'].fillna(0.0)
 
-        # Select only required columns for the fund_positions table
+        # Select only required columns for the fund_positions table; blank header columns load as NULL
         required_cols = [
             'fund_name', 'eom_date', 'financial_type', 'symbol', 'security_name', 
             'sedol', 'isin', 'price', 'quantity', 'realised_p_l', 'market_value'
@@ -163,34 +168,125 @@ class DataValidator:
             raise
   
 
-    def batch_preprocessing_csv(self, fund_data_filepath, fund_table_script_path):
-        """Ingests all fund report CSV files."""
+    @instrument(rows_out=lambda result: len(result[2]))
+    def preprocess_file(self, file_path):
+        """Reads and preprocesses a single fund report CSV. Returns (fund_name, eom_date, preprocessed_df)."""
+        fund_name, eom_date = self._extract_fund_info(os.path.basename(file_path))
+        df = pd.read_csv(file_path)
+        return fund_name, eom_date, self._preprocess_dataframe(df, fund_name, eom_date)
+
+    def _preprocess_files(self, file_paths, workers=1):
+        """
+        Preprocesses file_paths serially, or over a process pool when workers > 1.
+
+        Yields (file_path, result, error) in the order of file_paths, where result is
+        (fund_name, eom_date, preprocessed_df) and error is the message of a failed file.
+        """
+        if workers > 1 and len(file_paths) > 1:
+            chunksize = max(1, len(file_paths) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_preprocess_worker) as pool:
+                for fp, (result, error) in zip(file_paths, pool.map(_preprocess_file_task, file_paths, chunksize=chunksize)):
+                    yield fp, result, error
+            return
+
+        for fp in file_paths:
+            try:
+                yield fp, self.preprocess_file(fp), None
+            except Exception as e:
+                yield fp, None, str(e)
+
+    @instrument(rows_out=lambda result: len(result[0]))
+    def incremental_preprocessing_csv(self, fund_data_filepath, fund_table_script_path, manifest, workers=1):
+        """
+        Preprocesses only the fund report CSVs that the manifest reports as new or changed.
+
+        Returns the combined DataFrame and the manifest entries of the files that were processed,
+        each annotated with its fund_name, eom_date and row_count.
+        """
+        # Create fund_positions and manifest tables if not exists
+        self.db_manager.execute_script(fund_table_script_path)
+
+        pending = manifest.pending_files(fund_data_filepath)
+        frames = []
+        processed = []
+        for entry, (_, result, error) in zip(pending, self._preprocess_files([e['file_path'] for e in pending], workers)):
+            if error is not None:
+                LOGGER.error(f"Fatal error processing file {entry['file_name']}: {error}")
+                # Continue to next file
+                continue
+            fund_name, eom_date, preprocessed_df = result
+            entry.update(fund_name=fund_name, eom_date=eom_date, row_count=len(preprocessed_df))
+            frames.append(preprocessed_df)
+            processed.append(entry)
+
+        final_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return final_df, processed
+
+    def stream_preprocessing_csv(self, file_entries, chunksize=CSV_CHUNKSIZE):
+        """
+        Streams fund report CSVs without materializing them.
+
+        Yields (entry, chunks) per file, with fund_name and eom_date filled into the entry, where chunks lazily
+        reads the file with read_csv(chunksize=...) and yields preprocessed DataFrames of at most chunksize rows.
+        Files whose name cannot be parsed are logged and skipped.
+        """
+        for entry in file_entries:
+            try:
+                fund_name, eom_date = self._extract_fund_info(entry['file_name'])
+            except Exception as e:
+                LOGGER.error(f"Fatal error processing file {entry['file_name']}: {e}")
+                continue
+            entry.update(fund_name=fund_name, eom_date=eom_date)
+            yield entry, self._iter_file_chunks(entry['file_path'], fund_name, eom_date, chunksize)
+
+    def _iter_file_chunks(self, file_path, fund_name, eom_date, chunksize):
+        for chunk in pd.read_csv(file_path, chunksize=chunksize):
+            yield self._preprocess_dataframe(chunk, fund_name, eom_date)
+
+    @instrument(rows_out=len)
+    def batch_preprocessing_csv(self, fund_data_filepath, fund_table_script_path, workers=1):
+        """
+        Ingests all fund report CSV files.
 
-        final_df = pd.DataFrame()
+        Files are processed in sorted filename order and combined with a single concat, so the serial
+        and process-pool (workers > 1) paths return identical frames.
+        """
 
         # Create fund_positions table if not exists
         self.db_manager.execute_script(fund_table_script_path)
-        
-        for file_name in os.listdir(fund_data_filepath):
+
+        file_paths = []
+        for file_name in sorted(os.listdir(fund_data_filepath)):
 
             if not file_name.lower().endswith('.csv'):
                 LOGGER.info(f"Skipping non-CSV file: {file_name}")
                 continue
 
-            fp = os.path.join(fund_data_filepath,file_name)
-
-            try:
-                fund_name, eom_date = self._extract_fund_info(file_name)
+            file_paths.append(os.path.join(fund_data_filepath,file_name))
 
-                # LOGGER.info(f"Processing file: {file_name} (Fund: {fund_name}, Date: {eom_date})")
-                
-                df = pd.read_csv(fp)
-                preprocessed_df = self._preprocess_dataframe(df, fund_name, eom_date)
-                final_df = pd.concat([final_df, preprocessed_df], ignore_index=True)
-                            
-            except Exception as e:
-                LOGGER.error(f"Fatal error processing file {file_name}: {e}")
+        frames = []
+        for fp, result, error in self._preprocess_files(file_paths, workers):
+            if error is not None:
+                LOGGER.error(f"Fatal error processing file {os.path.basename(fp)}: {error}")
                 # Continue to next file
-        
-        return final_df
-    
+                continue
+            frames.append(result[2])
+
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# Process-pool workers hold their own validator; it never touches the database.
+_WORKER_VALIDATOR = None
+
+
+def _init_preprocess_worker():
+    global _WORKER_VALIDATOR
+    _WORKER_VALIDATOR = DataValidator(db_manager=None)
+
+
+def _preprocess_file_task(file_path):
+    """Process-pool task for DataValidator._preprocess_files. Returns (result, error)."""
+    try:
+        return _WORKER_VALIDATOR.preprocess_file(file_path), None
+    except Exception as e:
+        return None, str(e)
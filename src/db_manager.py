@@ -1,23 +1,55 @@
 import os
 import sqlite3
-from config import DB_NAME, LOGGER, FUND_POSITIONS
+import threading
+from itertools import count, islice
+from contextlib import contextmanager
+from urllib.request import pathname2url
+import numpy as np
+import pandas as pd
+from config import (DB_NAME, LOGGER, FUND_POSITIONS, DB_BUSY_TIMEOUT, DB_POOL_TIMEOUT, FETCH_BATCH_SIZE,
+                    STATEMENT_CACHE_SIZE, BULK_LOAD_BATCH_SIZE)
+from src.metrics import instrument
 
 class DBManager:
+    """
+    Owns the database connections. self.conn is the single connection opened by connect(). With pool_size set,
+    connection() and session() additionally hand out pooled connections, up to pool_size read-write and
+    pool_size read-only ones, so concurrent threads never share a connection. The pooled database runs in WAL
+    mode, where readers do not block the writer.
+    """
 
-    def __init__(self, db_path = None, sql_script_path = None):
+    def __init__(self, db_path = None, sql_script_path = None, pool_size = None):
+        if pool_size and (not db_path or db_path == ':memory:' or db_path.startswith('file::memory:')):
+            raise ValueError("A connection pool needs a database file; in-memory databases are per connection.")
         self.conn = None
         self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool_lock = threading.Lock()
+        self._idle = {False: [], True: []}
+        self._slots = {readonly: threading.BoundedSemaphore(pool_size) for readonly in (False, True)} if pool_size else None
+        self._wal_enabled = False
+        self._closed = False
+        self._savepoints = count()
+
+    def __enter__(self):
+        if self.conn is None:
+            self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disconnect()
     
     def disconnect(self):
         if self.conn:
             self.conn.close()
             self.conn = None
             print("Connection Closed.")
+        self.close_pool()
 
     def connect(self,connector="sqlite3"):
         if connector == "sqlite3":
             try:
-                self.conn = sqlite3.connect(self.db_path)
+                self.conn = sqlite3.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
                 if self.conn:
                     print(f"Connected to database: {self.db_path}")
             except sqlite3.Error as e:
@@ -27,6 +59,7 @@ class DBManager:
             #     if self.conn:
             #         self.disconnect()
     
+    @instrument()
     def execute_script(self, sql_script_path=None):
         try:
             with open(sql_script_path, 'r') as f:
@@ -39,12 +72,23 @@ class DBManager:
         LOGGER.info(f"Successfully executed SQL script: {sql_script_path}")
         # print(f"Successfully executed SQL script: {sql_script_path}")
 
+    def attach(self, db_path, alias):
+        """
+        Attaches the database file db_path to self.conn as schema alias. Unqualified table names resolve to
+        self.db_path first and then to the attached databases, so queries reach tables that only exist there
+        (e.g. the shared reference data of a shard, see ShardManager) without qualification.
+        """
+        if not alias.isidentifier():
+            raise ValueError(f"Invalid schema alias '{alias}'.")
+        self.conn.execute(f"ATTACH DATABASE ? AS {alias};", (db_path,))
     
-    def execute_sql_string(self,query):
+    @instrument(rows_out=lambda result: len(result) if isinstance(result, list) else result)
+    def execute_sql_string(self,query,params=()):
+        """Runs query and returns the rowcount of a write or all rows as dicts; stream large results with iter_batches."""
         if self.conn:
             cursor = self.conn.cursor()
             try:
-                cursor.execute(query)
+                cursor.execute(query, params)
                 if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
                     self.conn.commit()
                     return cursor.rowcount
@@ -62,3 +106,182 @@ class DBManager:
             return None
         
 
+    def execute(self, query, params=()):
+        """
+        Runs a parameterized query (? or :name placeholders) and returns the cursor. Values are bound, never
+        formatted into the SQL, so repeated calls reuse the connection's prepared statement.
+        """
+        return self.conn.execute(query, params)
+
+    def executemany(self, query, rows, batch_size=BULK_LOAD_BATCH_SIZE):
+        """
+        Runs a parameterized write once per parameter tuple in rows (any iterable), batch_size rows at a time,
+        all inside one transaction. Returns the number of rows changed.
+        """
+        rows = iter(rows)
+        changed = 0
+        with self.transaction() as conn:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                changed += conn.executemany(query, batch).rowcount
+        return changed
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        Runs the enclosed block in an explicit transaction on self.conn and yields the connection: BEGIN ... COMMIT,
+        or a SAVEPOINT when a transaction is already open, so write helpers nest. Rolls back on error.
+        immediate=True takes the write lock up front (BEGIN IMMEDIATE), so a block that reads before it writes
+        waits for other writers instead of failing when the database is shared between processes.
+        """
+        conn = self.conn
+        if conn.in_transaction:
+            savepoint = f"tx_{next(self._savepoints)}"
+            conn.execute(f"SAVEPOINT {savepoint};")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f"ROLLBACK TO {savepoint};")
+                conn.execute(f"RELEASE {savepoint};")
+                raise
+            conn.execute(f"RELEASE {savepoint};")
+            return
+
+        conn.execute("BEGIN IMMEDIATE;" if immediate else "BEGIN;")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    BATCH_FORMATS = ('tuples', 'numpy', 'dataframe')
+
+    def iter_batches(self, query, params=(), batch_size=FETCH_BATCH_SIZE, fmt='tuples'):
+        """
+        Streams the result of query in batches of at most batch_size rows fetched with cursor.fetchmany, so
+        large results are processed in constant memory and without a dict per row. fmt selects the batch shape:
+        'tuples' (list of row tuples), 'numpy' ({column: ndarray}, column-oriented) or 'dataframe'.
+        """
+        if fmt not in self.BATCH_FORMATS:
+            raise ValueError(f"Unknown batch format '{fmt}'. Expected one of {self.BATCH_FORMATS}.")
+        cursor = self.conn.execute(query, params)
+        columns = [description[0] for description in cursor.description or ()]
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                if fmt == 'tuples':
+                    yield rows
+                elif fmt == 'dataframe':
+                    yield pd.DataFrame.from_records(rows, columns=columns)
+                else:
+                    yield {
+                        column: np.array(values, dtype=object if any(v is None for v in values) else None)
+                        for column, values in zip(columns, zip(*rows))
+                    }
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def connection(self, readonly=False):
+        """
+        Borrows a pooled connection for the calling thread and returns it to the pool on exit, committing on
+        success and rolling back on error. readonly=True gives a mode=ro connection that rejects writes.
+        Blocks for up to DB_POOL_TIMEOUT seconds while all pool_size connections of that kind are in use.
+        """
+        if not self.pool_size:
+            raise RuntimeError("DBManager was created without a pool_size; use self.conn.")
+        slots = self._slots[readonly]
+        if not slots.acquire(timeout=DB_POOL_TIMEOUT):
+            raise TimeoutError(f"No {'read-only ' if readonly else ''}connection to {self.db_path} freed up "
+                               f"within {DB_POOL_TIMEOUT}s (pool_size={self.pool_size}).")
+        try:
+            self._ensure_wal()
+            with self._pool_lock:
+                conn = self._idle[readonly].pop() if self._idle[readonly] else None
+            if conn is None:
+                conn = self.open_connection(readonly)
+            try:
+                yield conn
+            except BaseException:
+                self._release(conn, readonly, commit=False)
+                raise
+            self._release(conn, readonly, commit=True)
+        finally:
+            slots.release()
+
+    @contextmanager
+    def session(self, readonly=False):
+        """
+        Yields a DBManager bound to a pooled connection, for components that take a db_manager (DataIngestor,
+        PriceReconciler, ...). The connection goes back to the pool on exit; do not disconnect the session.
+        """
+        with self.connection(readonly) as conn:
+            session = DBManager(db_path=self.db_path)
+            session.conn = conn
+            yield session
+
+    def close_pool(self):
+        """Closes the idle pooled connections; connections still borrowed are closed when they are returned."""
+        with self._pool_lock:
+            idle = self._idle[False] + self._idle[True]
+            self._idle = {False: [], True: []}
+            self._closed = True
+            self._wal_enabled = False
+        for conn in idle:
+            conn.close()
+
+    def _ensure_wal(self):
+        with self._pool_lock:
+            if self._wal_enabled:
+                return
+            self._closed = False
+            conn = self.open_connection(readonly=False)
+            mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            self._idle[False].append(conn)
+            self._wal_enabled = True
+        LOGGER.info(f"Connection pool for {self.db_path} opened (pool_size={self.pool_size}, journal_mode={mode}).")
+
+    def open_connection(self, readonly=False):
+        """Opens a new connection to db_path, outside the pool, usable from any thread; the caller closes it."""
+        if readonly:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            return sqlite3.connect(uri, uri=True, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        return sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+
+    def _release(self, conn, readonly, commit):
+        try:
+            if conn.in_transaction and commit:
+                conn.commit()
+            elif conn.in_transaction:
+                conn.rollback()
+        except sqlite3.ProgrammingError:
+            # Closed while borrowed; it is simply not returned
+            return
+        with self._pool_lock:
+            if not self._closed:
+                self._idle[readonly].append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def pragmas(self, **settings):
+        """
+        Temporarily applies PRAGMA settings (e.g. journal_mode='wal', synchronous=1) and restores the
+        previous values on exit. Must be entered outside of a transaction for journal_mode to take effect.
+        Settings apply to the main database only, never to attached ones (e.g. the reference data of a shard).
+        """
+        previous = {name: self.conn.execute(f"PRAGMA main.{name}").fetchone()[0] for name in settings}
+        try:
+            for name, value in settings.items():
+                self.conn.execute(f"PRAGMA main.{name} = {value}")
+            yield self.conn
+        finally:
+            for name, value in previous.items():
+                self.conn.execute(f"PRAGMA main.{name} = {value}")
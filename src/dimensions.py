@@ -0,0 +1,132 @@
+# dimensions.py
+import pandas as pd
+from src.db_manager import DBManager
+from config import (LOGGER, FUND_POSITIONS, DIM_FUND, DIM_INSTRUMENT, DIMENSION_TABLES_FILE,
+                    MASTER_PRICE_TABLES)
+
+
+def compact_frame(df, columns, label):
+    """
+    Converts repeated string columns of df to categorical dtype in place and logs the memory saved.
+    Returns df for chaining.
+    """
+    columns = [col for col in columns if col in df.columns and df[col].dtype == object]
+    if not columns or df.empty:
+        return df
+    before = df.memory_usage(deep=True).sum()
+    for col in columns:
+        df[col] = df[col].astype('category')
+    after = df.memory_usage(deep=True).sum()
+    LOGGER.info(f"{label} frame memory: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB "
+                f"({before / max(after, 1):.1f}x smaller) with categorical {columns}.")
+    return df
+
+
+class DimensionManager:
+    """Maintains the fund and instrument dimension tables and assigns their integer surrogate keys."""
+
+    # Bound on IN (...) parameters per lookup query
+    LOOKUP_BATCH = 900
+
+    def __init__(self, db_manager: DBManager):
+        self.db_manager = db_manager
+        LOGGER.info("DimensionManager initialized.")
+
+    def ensure_tables(self):
+        """
+        Creates the dimension tables and migrates fund_positions to carry the surrogate keys: the columns are
+        added if missing and any rows written without keys (e.g. before the migration) are backfilled.
+        Dimension tables already visible through an attached database (the reference data of a shard) are
+        used as they are rather than shadowed by local copies.
+        """
+        conn = self.db_manager.conn
+        if not all(conn.execute(f"PRAGMA table_info({table})").fetchall() for table in (DIM_FUND, DIM_INSTRUMENT)):
+            self.db_manager.execute_script(DIMENSION_TABLES_FILE)
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({FUND_POSITIONS})")]
+        if not columns:
+            return
+        with conn:
+            if 'instrument_id' not in columns:
+                conn.execute(f"ALTER TABLE {FUND_POSITIONS} ADD COLUMN fund_id INTEGER;")
+                conn.execute(f"ALTER TABLE {FUND_POSITIONS} ADD COLUMN instrument_id INTEGER;")
+            # Finds the partitions holding an instrument whose master prices changed
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{FUND_POSITIONS}_instrument_date "
+                         f"ON {FUND_POSITIONS} (instrument_id, eom_date);")
+            missing = conn.execute(
+                f"SELECT COUNT(*) FROM {FUND_POSITIONS} WHERE fund_id IS NULL OR instrument_id IS NULL;"
+            ).fetchone()[0]
+            if not missing:
+                return
+            identifier = "TRIM(COALESCE(symbol, isin, ''))"
+            conn.execute(f"""
+            INSERT OR IGNORE INTO {DIM_FUND} (fund_name)
+            SELECT DISTINCT fund_name FROM {FUND_POSITIONS} WHERE fund_id IS NULL;
+            """)
+            conn.execute(f"""
+            INSERT OR IGNORE INTO {DIM_INSTRUMENT} (identifier)
+            SELECT DISTINCT {identifier} FROM {FUND_POSITIONS} WHERE instrument_id IS NULL;
+            """)
+            conn.execute(f"""
+            UPDATE {FUND_POSITIONS} SET
+                fund_id = (SELECT d.fund_id FROM {DIM_FUND} d WHERE d.fund_name = {FUND_POSITIONS}.fund_name),
+                instrument_id = (SELECT d.instrument_id FROM {DIM_INSTRUMENT} d WHERE d.identifier = {identifier})
+            WHERE fund_id IS NULL OR instrument_id IS NULL;
+            """)
+        LOGGER.info(f"Backfilled surrogate keys for {missing} rows of '{FUND_POSITIONS}'.")
+
+    def _ids(self, conn, table, key_col, id_col, values):
+        """Returns {value: id} for values, inserting the ones not yet in table. Runs on the caller's transaction."""
+        values = list(values)
+        conn.executemany(f"INSERT OR IGNORE INTO {table} ({key_col}) VALUES (?);", ((v,) for v in values))
+        ids = {}
+        for offset in range(0, len(values), self.LOOKUP_BATCH):
+            batch = values[offset:offset + self.LOOKUP_BATCH]
+            placeholders = ', '.join('?' for _ in batch)
+            ids.update(conn.execute(
+                f"SELECT {key_col}, {id_col} FROM {table} WHERE {key_col} IN ({placeholders});", batch
+            ).fetchall())
+        return ids
+
+    def annotate_positions(self, df, conn=None):
+        """
+        Returns df with fund_id and instrument_id columns, registering unseen funds and instruments.
+
+        The instrument identifier is COALESCE(symbol, isin), as used by the price reconciliation. Nothing is
+        committed here: pass the connection of an open transaction so new keys roll back with a failed load.
+        """
+        conn = conn or self.db_manager.conn
+        if df.empty:
+            return df.assign(fund_id=pd.Series(dtype='int64'), instrument_id=pd.Series(dtype='int64'))
+
+        identifier = df['symbol'] if 'symbol' in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if 'isin' in df.columns:
+            identifier = identifier.fillna(df['isin'])
+        identifier = identifier.fillna('').astype(str).str.strip()
+
+        fund_ids = self._ids(conn, DIM_FUND, 'fund_name', 'fund_id', df['fund_name'].unique())
+        instrument_ids = self._ids(conn, DIM_INSTRUMENT, 'identifier', 'instrument_id', identifier.unique())
+        return df.assign(
+            fund_id=df['fund_name'].map(fund_ids).astype('int64'),
+            instrument_id=identifier.map(instrument_ids).astype('int64'),
+        )
+
+    def sync_master_instruments(self):
+        """Registers master price identifiers in dim_instrument and stamps instrument_id on the price tables."""
+        conn = self.db_manager.conn
+        for table, id_col in MASTER_PRICE_TABLES:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if 'instrument_id' not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN instrument_id INTEGER;")
+        with conn:
+            for table, id_col in MASTER_PRICE_TABLES:
+                conn.execute(f"""
+                INSERT OR IGNORE INTO {DIM_INSTRUMENT} (identifier)
+                SELECT DISTINCT {id_col} FROM {table} WHERE instrument_id IS NULL AND {id_col} IS NOT NULL;
+                """)
+                conn.execute(f"""
+                UPDATE {table}
+                SET instrument_id = (SELECT instrument_id FROM {DIM_INSTRUMENT} d WHERE d.identifier = {table}.{id_col})
+                WHERE instrument_id IS NULL;
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_instrument_date "
+                             f"ON {table} (instrument_id, price_date, PRICE);")
@@ -0,0 +1,177 @@
+# file_manifest.py
+import hashlib
+import os
+from datetime import datetime
+from src.db_manager import DBManager
+from src.data_validation import DataValidator
+from config import LOGGER, PROCESSED_FILES, FILE_MANIFEST_FILE
+
+
+class FileManifest:
+    """
+    Tracks which fund report files have been ingested so that reruns only process new or changed files.
+
+    Every (fund_name, eom_date) partition is held by one file: a second file for a partition is rejected, and
+    the partitions of files deleted or renamed since they were recorded are reported by removed_files so they
+    can be dropped.
+    """
+    def __init__(self, db_manager: DBManager):
+        self.db_manager = db_manager
+        # Only parses file names into (fund_name, eom_date); never touches the database
+        self.validator = DataValidator(db_manager=None)
+        self._table_ready = False
+        LOGGER.info("FileManifest initialized.")
+
+    @staticmethod
+    def content_hash(file_path, chunk_size=1024 * 1024):
+        """Returns the SHA-256 hex digest of a file, read in chunks."""
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def load(self):
+        """Returns the recorded manifest as {file_path: row}."""
+        self._ensure_table()
+        rows = self.db_manager.execute_sql_string(f"""
+        SELECT file_path, file_size, file_mtime, content_hash, fund_name, eom_date
+        FROM {PROCESSED_FILES};
+        """)
+        return {row['file_path']: row for row in rows or []}
+
+    def pending_files(self, fund_data_filepath):
+        """
+        Lists the CSV files in fund_data_filepath that are new or whose content changed since they were recorded.
+
+        Size and mtime are compared first; the file is only hashed when either differs, so an unchanged
+        archive costs one stat() per file.
+
+        A file whose (fund_name, eom_date) partition is held by another file of the directory is rejected rather
+        than loaded over it: the file recorded for the partition keeps it, otherwise the first by name. Rejected
+        files are logged and not recorded, so they are looked at again once the other file is gone.
+        """
+        recorded = self.load()
+        pending = []
+        unchanged = 0
+        file_names = self._csv_files(fund_data_filepath)
+        owners = self._partition_owners(fund_data_filepath, file_names, recorded)
+
+        for file_name in file_names:
+            fp = os.path.join(fund_data_filepath, file_name)
+            partition = self._partition(file_name)
+            if partition is not None and owners[partition] != fp:
+                LOGGER.error(f"Rejected {file_name}: partition {partition} is already held by "
+                             f"{os.path.basename(owners[partition])}; remove one of the two files.")
+                continue
+            stat = os.stat(fp)
+            entry = {
+                'file_name': file_name,
+                'file_path': fp,
+                'file_size': stat.st_size,
+                'file_mtime': stat.st_mtime,
+            }
+
+            previous = recorded.get(fp)
+            if previous and previous['file_size'] == entry['file_size'] and previous['file_mtime'] == entry['file_mtime']:
+                unchanged += 1
+                continue
+
+            entry['content_hash'] = self.content_hash(fp)
+            if previous and previous['content_hash'] == entry['content_hash']:
+                # Touched but identical content: refresh the stat fields so the next run skips hashing.
+                self._refresh_stat(entry)
+                unchanged += 1
+                continue
+
+            entry['status'] = 'changed' if previous else 'new'
+            pending.append(entry)
+
+        LOGGER.info(f"Manifest scan of '{fund_data_filepath}': {len(pending)} new/changed, {unchanged} unchanged.")
+        return pending
+
+    def removed_files(self, fund_data_filepath):
+        """
+        Returns the recorded entries of the files that are no longer in fund_data_filepath (deleted, or renamed,
+        which is a deletion plus a new file), and the (fund_name, eom_date) partitions that only they held. No
+        file left in the directory maps to those partitions, so their positions are stale and should be dropped;
+        call forget with the entries once they are.
+        """
+        recorded = self.load()
+        file_names = self._csv_files(fund_data_filepath)
+        present = {os.path.join(fund_data_filepath, file_name) for file_name in file_names}
+        removed = [row for path, row in recorded.items()
+                   if os.path.normpath(os.path.dirname(path)) == os.path.normpath(fund_data_filepath)
+                   and path not in present]
+        held = {self._partition(file_name) for file_name in file_names}
+        stale = sorted({(row['fund_name'], row['eom_date']) for row in removed} - held)
+        if removed:
+            LOGGER.info(f"Manifest scan of '{fund_data_filepath}': {len(removed)} files removed, "
+                        f"{len(stale)} partitions left without a file.")
+        return removed, stale
+
+    def forget(self, entries):
+        """Removes the entries (e.g. of removed_files) from the manifest."""
+        if not entries:
+            return 0
+        self._ensure_table()
+        self.db_manager.executemany(f"DELETE FROM {PROCESSED_FILES} WHERE file_path = ?;",
+                                    [(e['file_path'],) for e in entries])
+        LOGGER.info(f"Removed {len(entries)} files from '{PROCESSED_FILES}'.")
+        return len(entries)
+
+    @staticmethod
+    def _csv_files(fund_data_filepath):
+        return sorted(name for name in os.listdir(fund_data_filepath) if name.lower().endswith('.csv'))
+
+    def _partition(self, file_name):
+        """(fund_name, eom_date) of a fund file name, or None when it cannot be parsed (the load reports it)."""
+        try:
+            return self.validator._extract_fund_info(file_name)
+        except Exception:
+            return None
+
+    def _partition_owners(self, fund_data_filepath, file_names, recorded):
+        """Maps each partition to the file holding it: its recorded file if still present, else the first by name."""
+        owners = {}
+        paths = [os.path.join(fund_data_filepath, file_name) for file_name in file_names]
+        for fp in paths:
+            if fp in recorded:
+                owners.setdefault((recorded[fp]['fund_name'], recorded[fp]['eom_date']), fp)
+        for file_name, fp in zip(file_names, paths):
+            partition = self._partition(file_name)
+            if partition is not None:
+                owners.setdefault(partition, fp)
+        return owners
+
+    def _ensure_table(self):
+        """Creates the processed_files table once per manifest, in the database it was given (the reference DB)."""
+        if not self._table_ready:
+            self.db_manager.execute_script(FILE_MANIFEST_FILE)
+            self._table_ready = True
+
+    def _refresh_stat(self, entry):
+        with self.db_manager.transaction():
+            self.db_manager.execute(
+                f"UPDATE {PROCESSED_FILES} SET file_size = ?, file_mtime = ? WHERE file_path = ?",
+                (entry['file_size'], entry['file_mtime'], entry['file_path'])
+            )
+
+    def record(self, entries):
+        """Upserts processed file entries (with fund_name, eom_date and row_count filled in) into the manifest."""
+        if not entries:
+            return 0
+        self._ensure_table()
+        processed_at = datetime.now().isoformat(timespec='seconds')
+        rows = [
+            (e['file_path'], e['file_size'], e['file_mtime'], e['content_hash'],
+             e['fund_name'], e['eom_date'], e.get('row_count'), processed_at)
+            for e in entries
+        ]
+        self.db_manager.executemany(f"""
+        INSERT OR REPLACE INTO {PROCESSED_FILES}
+            (file_path, file_size, file_mtime, content_hash, fund_name, eom_date, row_count, processed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+        """, rows)
+        LOGGER.info(f"Recorded {len(rows)} files in '{PROCESSED_FILES}'.")
+        return len(rows)
@@ -0,0 +1,163 @@
+# fund_watcher.py
+import os
+import time
+from src.db_manager import DBManager
+from src.data_validation import DataValidator
+from src.data_ingestion import DataIngestor
+from src.file_manifest import FileManifest
+from src.price_reconciliation import PriceReconciler
+from src.performance_report import PerformanceCalculator
+from src.report_publisher import ReportPublisher
+from config import (LOGGER, FUND_POSITIONS, FUND_POSITION_FILE, EXTERNAL_FUNDS_DATA_DIR, WATCH_POLL_SECONDS,
+                    WATCH_SETTLE_SECONDS, RECON_OUTPUT_LAYOUT)
+
+
+class FundWatcher:
+    """
+    Watches the fund drop directory and pushes each new or changed report through validation, partition
+    replacement, incremental reconciliation and attribution as soon as it has finished landing.
+
+    The directory is polled with os.scandir, which works the same on every platform and network share.
+    A file is considered complete once its size and mtime have not changed for settle_seconds.
+
+    With a ShardManager (shards) the files are loaded, reconciled and attributed through it, and db_manager is the
+    reference database holding the manifest.
+    """
+    def __init__(self, db_manager: DBManager, watch_dir=EXTERNAL_FUNDS_DATA_DIR, poll_interval=WATCH_POLL_SECONDS,
+                 settle_seconds=WATCH_SETTLE_SECONDS, writer=None, layout=RECON_OUTPUT_LAYOUT, shards=None):
+        self.db_manager = db_manager
+        self.watch_dir = watch_dir
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        # Refreshes the same reports as a pipeline run
+        self.publisher = ReportPublisher(writer, layout=layout) if writer is not None else None
+        self.shards = shards
+        self.validator = DataValidator(db_manager)
+        self.ingestor = DataIngestor(db_manager)
+        self.manifest = FileManifest(db_manager)
+        # Reconciliation and attribution run on the shards when there are any
+        self.reconciler = shards if shards is not None else PriceReconciler(db_manager)
+        self.calculator = shards if shards is not None else PerformanceCalculator(db_manager)
+        # file_path -> ((size, mtime), first seen, stable since) for files not yet settled
+        self._observed = {}
+        # file_path -> (size, mtime) of files already loaded, unchanged, or failed; looked at again once they change
+        self._settled = {}
+        # Files disappeared from the directory since the last process()
+        self._removed = False
+        if shards is None:
+            self.db_manager.execute_script(FUND_POSITION_FILE)
+        LOGGER.info(f"FundWatcher initialized (dir={watch_dir}, poll={poll_interval}s, settle={settle_seconds}s).")
+
+    def run(self, max_polls=None):
+        """Polls until interrupted (or for max_polls polls) and processes files as they become ready."""
+        polls = 0
+        LOGGER.info(f"Watching '{self.watch_dir}' for fund reports. Press Ctrl+C to stop.")
+        try:
+            while max_polls is None or polls < max_polls:
+                ready = self.poll()
+                if ready or self._removed:
+                    self.process(ready)
+                polls += 1
+                if max_polls is None or polls < max_polls:
+                    time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            LOGGER.info("Watch mode stopped.")
+
+    def poll(self):
+        """
+        Scans the directory once and returns the manifest entries of new or changed files whose size and
+        mtime have been stable for settle_seconds, each with its 'first_seen' time (time.monotonic()).
+        """
+        now = time.monotonic()
+        current = {}
+        with os.scandir(self.watch_dir) as it:
+            for item in it:
+                if item.is_file() and item.name.lower().endswith('.csv'):
+                    stat = item.stat()
+                    current[item.path] = (stat.st_size, stat.st_mtime)
+
+        candidates = {}
+        for path, file_stat in current.items():
+            previous = self._observed.get(path)
+            if previous is None or previous[0] != file_stat:
+                # A settled file that changes again is a new arrival
+                first_seen = previous[1] if previous and self._settled.get(path) != previous[0] else now
+                self._observed[path] = (file_stat, first_seen, now)
+                continue
+            if self._settled.get(path) != file_stat and now - previous[2] >= self.settle_seconds:
+                candidates[path] = previous
+        gone = set(self._observed) - set(current)
+        for path in gone:
+            del self._observed[path]
+        if gone:
+            # The next process() drops their partitions; files rejected as duplicates of them get another look
+            self._removed = True
+            self._settled.clear()
+        if not candidates:
+            return []
+
+        ready = []
+        for entry in self.manifest.pending_files(self.watch_dir):
+            observed = candidates.pop(entry['file_path'], None)
+            if observed and observed[0] == (entry['file_size'], entry['file_mtime']):
+                entry['first_seen'] = observed[1]
+                ready.append(entry)
+        # Stable files the manifest already holds with the same content need no work
+        for path, observed in candidates.items():
+            self._settled[path] = observed[0]
+        return ready
+
+    def process(self, entries):
+        """
+        Loads each ready file into its (fund_name, eom_date) partition and drops the partitions of files removed
+        since the last call, then reconciles the changed partitions and, with a writer, refreshes the
+        reconciliation and attribution reports once for the batch. Logs the latency from first sighting of each
+        file to its reconciliation rows being persisted. Returns the entries that were loaded.
+        """
+        if self.shards is not None:
+            loaded = self.shards.ingest_files(entries)
+            self.manifest.record(loaded)
+            for entry in entries:
+                self._settled[entry['file_path']] = (entry['file_size'], entry['file_mtime'])
+        else:
+            loaded = self._load(entries)
+        dropped = self._drop_removed() if self._removed else []
+        if not loaded and not dropped:
+            return loaded
+
+        self.reconciler.run_incremental()
+        reconciled_at = time.monotonic()
+        for entry in loaded:
+            LOGGER.info(f"Reconciled {entry['file_name']} ({entry['fund_name']} {entry['eom_date']}, "
+                        f"{entry['row_count']} rows) {reconciled_at - entry['first_seen']:.2f}s after arrival.")
+
+        if self.publisher is not None:
+            self.publisher.publish_reconciliation(self.reconciler)
+            self.publisher.publish_attribution(self.calculator)
+        return loaded
+
+    def _drop_removed(self):
+        """Drops the partitions only held by files removed from watch_dir and forgets those files. Returns them."""
+        self._removed = False
+        removed, stale = self.manifest.removed_files(self.watch_dir)
+        if stale:
+            (self.shards if self.shards is not None else self.ingestor).drop_partitions(stale)
+        self.manifest.forget(removed)
+        return stale
+
+    def _load(self, entries):
+        """Replaces the partition of each file in db_manager and records it in the manifest. Returns the loaded entries."""
+        loaded = []
+        for entry in entries:
+            try:
+                fund_name, eom_date, df = self.validator.preprocess_file(entry['file_path'])
+                self.ingestor.replace_partitions(df, FUND_POSITIONS, [(fund_name, eom_date)])
+            except Exception as e:
+                LOGGER.error(f"Fatal error processing file {entry['file_name']}: {e}")
+                self._settled[entry['file_path']] = (entry['file_size'], entry['file_mtime'])
+                continue
+            entry.update(fund_name=fund_name, eom_date=eom_date, row_count=len(df))
+            self.manifest.record([entry])
+            self._settled[entry['file_path']] = (entry['file_size'], entry['file_mtime'])
+            loaded.append(entry)
+        return loaded
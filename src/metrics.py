@@ -0,0 +1,170 @@
+# metrics.py
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from config import LOGGER
+
+
+class PipelineMetrics:
+    """
+    Collects per-stage and per-function performance metrics for a pipeline run: call count, wall time,
+    CPU time of the calling thread, rows in/out, throughput and peak traced memory (tracemalloc).
+
+    Measurements are aggregated by name, so a function called once per file reports one entry. Nothing is
+    recorded until start_run() is called, which keeps instrumented code free of overhead in tests and
+    library use. Work done in preprocessing worker processes is only visible through its caller.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = False
+        self.trace_memory = False
+        self.profile = False
+        self._profiles = []
+        self._open = 0
+        self._run_peak = 0
+        self.metrics = {}
+
+    def start_run(self, trace_memory=True, profile=False):
+        """Starts recording. trace_memory enables tracemalloc; profile collects cProfile stats per thread."""
+        self.metrics = {}
+        self._profiles = []
+        self._run_peak = 0
+        self._started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self.trace_memory = trace_memory
+        self.profile = profile
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.active = True
+
+    @contextmanager
+    def measure(self, name, rows_in=None):
+        """
+        Measures the enclosed block under name. Yields a dict in which the block can set 'rows_in' and
+        'rows_out'; throughput is rows_out (or rows_in) per wall-clock second.
+        """
+        counts = {'rows_in': rows_in, 'rows_out': None}
+        if not self.active:
+            yield counts
+            return
+        with self._lock:
+            # The tracemalloc peak is process wide: reset it only when no other measurement is open
+            if self.trace_memory and self._open == 0:
+                self._run_peak = max(self._run_peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            self._open += 1
+        start_memory = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        start, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield counts
+        finally:
+            wall, cpu = time.perf_counter() - start, time.thread_time() - start_cpu
+            peak = tracemalloc.get_traced_memory()[1] - start_memory if self.trace_memory else None
+            with self._lock:
+                self._open -= 1
+                self._record(name, wall, cpu, counts, peak)
+
+    def _record(self, name, wall, cpu, counts, peak):
+        entry = self.metrics.setdefault(name, {
+            'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows_in': None, 'rows_out': None, 'peak_memory_mb': None,
+        })
+        entry['calls'] += 1
+        entry['wall_s'] += wall
+        entry['cpu_s'] += cpu
+        for key in ('rows_in', 'rows_out'):
+            if counts.get(key) is not None:
+                entry[key] = (entry[key] or 0) + int(counts[key])
+        if peak is not None:
+            entry['peak_memory_mb'] = max(entry['peak_memory_mb'] or 0.0, max(peak, 0) / 1e6)
+
+    @contextmanager
+    def profiled(self):
+        """Profiles the enclosed block with cProfile when profiling is on; stats from all threads are merged."""
+        if not (self.active and self.profile):
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._profiles.append(profiler)
+
+    def summary(self):
+        """Returns the run's metrics as a JSON-serializable dict."""
+        run_peak = max(self._run_peak, tracemalloc.get_traced_memory()[1]) if self.trace_memory else None
+        metrics = {}
+        for name, entry in sorted(self.metrics.items()):
+            rows = entry['rows_out'] if entry['rows_out'] is not None else entry['rows_in']
+            metrics[name] = {
+                **{key: round(value, 6) if isinstance(value, float) else value for key, value in entry.items()},
+                'rows_per_s': round(rows / entry['wall_s'], 1) if rows is not None and entry['wall_s'] > 0 else None,
+            }
+        return {
+            'started_at': self._started_at.isoformat(timespec='seconds'),
+            'wall_s': round(time.perf_counter() - self._start, 6),
+            'cpu_s': round(time.process_time() - self._start_cpu, 6),
+            'peak_memory_mb': round(run_peak / 1e6, 3) if run_peak is not None else None,
+            'metrics': metrics,
+        }
+
+    def finish_run(self, metrics_dir):
+        """
+        Stops recording and writes metrics-<timestamp>.json (and profile-<timestamp>.prof when profiling) to
+        metrics_dir. Returns the path of the metrics file.
+        """
+        summary = self.summary()
+        self.active = False
+        if self.trace_memory:
+            tracemalloc.stop()
+        os.makedirs(metrics_dir, exist_ok=True)
+        stamp = self._started_at.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(metrics_dir, f"metrics-{stamp}.json")
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        LOGGER.info(f"Run metrics written to {path} (wall {summary['wall_s']:.2f}s, "
+                    f"peak traced memory {summary['peak_memory_mb']} MB).")
+
+        if self._profiles:
+            stats = pstats.Stats(self._profiles[0])
+            for profiler in self._profiles[1:]:
+                stats.add(profiler)
+            profile_path = os.path.join(metrics_dir, f"profile-{stamp}.prof")
+            stats.dump_stats(profile_path)
+            LOGGER.info(f"cProfile stats written to {profile_path} (inspect with python -m pstats).")
+        return path
+
+
+# Metrics of the current process
+METRICS = PipelineMetrics()
+
+
+def instrument(name=None, rows_in=None, rows_out=None):
+    """
+    Decorator measuring every call of a function with METRICS. rows_in(*args, **kwargs) and rows_out(result)
+    derive row counts from the call; they are only evaluated while a run is being recorded.
+    """
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.active:
+                return func(*args, **kwargs)
+            with METRICS.measure(label, rows_in(*args, **kwargs) if rows_in else None) as counts:
+                result = func(*args, **kwargs)
+                if rows_out:
+                    counts['rows_out'] = rows_out(result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,134 @@
+# output_writer.py
+import os
+import shutil
+from urllib.parse import quote
+import pandas as pd
+from config import LOGGER
+
+# Parquet output is optional and needs pyarrow
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class OutputWriter:
+    """
+    Writes pipeline results under output_dir as CSV (optionally gzip-compressed) or Parquet.
+
+    Partitioned results use a Hive-style layout, <name>/fund_name=<fund>/eom_date=<date>/part.<ext>, so a
+    consumer can read a single fund-month without parsing the rest of the history. Files are written to a
+    temporary name and moved into place, so readers never see a half-written partition.
+    """
+
+    FORMATS = ('csv', 'parquet')
+
+    def __init__(self, output_dir, fmt='csv', compression=None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown output format '{fmt}'. Expected one of {self.FORMATS}.")
+        if fmt == 'parquet' and pyarrow is None:
+            raise ImportError("Parquet output requires pyarrow; install it or use fmt='csv'.")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.compression = compression
+        LOGGER.info(f"OutputWriter initialized (dir={output_dir}, format={fmt}, compression={compression}).")
+
+    @property
+    def extension(self):
+        if self.fmt == 'parquet':
+            return 'parquet'
+        return 'csv.gz' if self.compression == 'gzip' else 'csv'
+
+    def partition_dir(self, name, fund_name, eom_date):
+        """Returns the directory holding the (fund_name, eom_date) partition of the named output."""
+        return os.path.join(
+            self.output_dir, name,
+            f"fund_name={quote(str(fund_name), safe=' ')}",
+            f"eom_date={quote(str(eom_date), safe='')}",
+        )
+
+    def partition_path(self, name, fund_name, eom_date):
+        return os.path.join(self.partition_dir(name, fund_name, eom_date), f"part.{self.extension}")
+
+    def write_partitions(self, name, partitions, clear=()):
+        """
+        Writes one file per partition from partitions, an iterable of ((fund_name, eom_date), df) as produced
+        by PriceReconciler.iter_results; only one partition is held in memory at a time. Partitions listed in
+        clear that were not written are removed, so partitions emptied since the last run do not linger.
+        Returns the number of partitions written.
+        """
+        written = set()
+        rows = 0
+        for (fund_name, eom_date), df in partitions:
+            self._write(df, self.partition_path(name, fund_name, eom_date))
+            written.add((fund_name, eom_date))
+            rows += len(df)
+
+        removed = 0
+        for fund_name, eom_date in set(clear) - written:
+            partition_dir = self.partition_dir(name, fund_name, eom_date)
+            if os.path.isdir(partition_dir):
+                shutil.rmtree(partition_dir)
+                removed += 1
+
+        LOGGER.info(f"Wrote {rows} rows in {len(written)} partitions of '{name}' under {self.output_dir}"
+                    + (f"; removed {removed} emptied partitions." if removed else "."))
+        return len(written)
+
+    def write_table(self, df, name):
+        """Writes df as a single file <name>.<ext> and returns its path."""
+        path = os.path.join(self.output_dir, f"{name}.{self.extension}")
+        self._write(df, path)
+        LOGGER.info(f"Wrote {len(df)} rows to {path}")
+        return path
+
+    def write_frames(self, frames, name, columns=()):
+        """
+        Writes frames, an iterable of DataFrames with the same columns and dtypes (e.g. the partitions of
+        PriceReconciler.iter_results), as a single file <name>.<ext>, holding one frame in memory at a time.
+        columns are written as the header when frames is empty. Returns its path.
+        """
+        path = os.path.join(self.output_dir, f"{name}.{self.extension}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        parquet_writer = None
+        written = rows = 0
+        try:
+            for df in frames:
+                if self.fmt == 'parquet':
+                    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+                    if parquet_writer is None:
+                        parquet_writer = pyarrow.parquet.ParquetWriter(tmp_path, table.schema,
+                                                                      compression=self.compression or 'snappy')
+                    parquet_writer.write_table(table.cast(parquet_writer.schema))
+                else:
+                    df.to_csv(tmp_path, index=False, compression=self.compression, mode='a' if written else 'w',
+                              header=not written)
+                written += 1
+                rows += len(df)
+        finally:
+            if parquet_writer is not None:
+                parquet_writer.close()
+        if not written:
+            self._write(pd.DataFrame(columns=list(columns)), path)
+        else:
+            os.replace(tmp_path, path)
+        LOGGER.info(f"Wrote {rows} rows to {path}")
+        return path
+
+    def read_partition(self, name, fund_name, eom_date):
+        """Reads back a single partition written by write_partitions."""
+        path = self.partition_path(name, fund_name, eom_date)
+        if self.fmt == 'parquet':
+            return pd.read_parquet(path)
+        return pd.read_csv(path, compression=self.compression)
+
+    def _write(self, df, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        if self.fmt == 'parquet':
+            df.to_parquet(tmp_path, index=False, compression=self.compression or 'snappy')
+        else:
+            df.to_csv(tmp_path, index=False, compression=self.compression)
+        os.replace(tmp_path, path)
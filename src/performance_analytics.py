@@ -0,0 +1,162 @@
+# performance_analytics.py
+import time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from src.performance_report import PerformanceCalculator
+from src.metrics import instrument
+from config import LOGGER, ANALYTICS_WINDOWS, ANALYTICS_TOP_K, ANALYTICS_RISK_FREE_RATE
+
+MONTHS_PER_YEAR = 12
+
+
+class PerformanceAnalytics:
+    """
+    Multi-period performance metrics for all funds, computed on a funds x months matrix of monthly rates of return
+    with array operations over the whole matrix rather than a groupby/shift per metric.
+
+    The matrix is built once from fund_month_summary rows (PerformanceCalculator.load_summary, or
+    ShardManager.load_summary for a sharded layout). The months axis is every calendar month from the first to the
+    last EOM date, so trailing windows span calendar months even when no fund reported in some month. The return
+    of a month is (MV end - MV start + realized P/L) / MV start, as in PerformanceCalculator, where MV start is
+    the fund's MV at its previous reported EOM date; a fund missing a month has no return for that month, and
+    the return of its next reported month spans the gap. spans holds the number of months each return covers,
+    so fund_metrics counts a return across a gap as that many months. A fund reporting more than once in a
+    calendar month is represented by its latest EOM date of that month.
+    """
+    def __init__(self, summary_df, risk_free_rate=ANALYTICS_RISK_FREE_RATE):
+        start = time.perf_counter()
+        self.risk_free_rate = risk_free_rate
+        fund_codes, self.funds = pd.factorize(summary_df['fund_name'].astype(str), sort=True)
+        eom_dates = pd.to_datetime(summary_df['eom_date'])
+        month_numbers = (eom_dates.dt.year * MONTHS_PER_YEAR + eom_dates.dt.month).to_numpy()
+        # Keep the latest EOM date per fund and calendar month, so the scatter below has one row per cell
+        latest = (pd.DataFrame({'fund': fund_codes, 'month': month_numbers, 'eom_date': eom_dates.to_numpy()})
+                  .sort_values('eom_date', kind='stable')
+                  .drop_duplicates(['fund', 'month'], keep='last').index.sort_values())
+        if len(latest) < len(summary_df):
+            LOGGER.warning(f"Dropped {len(summary_df) - len(latest)} fund-month summaries superseded by a later "
+                           f"EOM date in the same calendar month.")
+            summary_df = summary_df.iloc[latest]
+            fund_codes, month_numbers, eom_dates = fund_codes[latest], month_numbers[latest], eom_dates.iloc[latest]
+        first_month = month_numbers.min() if len(month_numbers) else 0
+        month_codes = month_numbers - first_month
+        # Each month is labelled with its latest reported EOM date, or the calendar month end when nobody reported
+        n_months = month_codes.max() + 1 if len(month_codes) else 0
+        labels = pd.Series(pd.period_range(eom_dates.min(), periods=n_months, freq='M').to_timestamp(how='end')
+                           .normalize() if n_months else pd.DatetimeIndex([]))
+        reported = eom_dates.groupby(month_codes).max()
+        labels[reported.index] = reported.to_numpy()
+        self.months = pd.DatetimeIndex(labels)
+
+        shape = (len(self.funds), len(self.months))
+        mv_end = np.full(shape, np.nan)
+        realized = np.full(shape, np.nan)
+        mv_end[fund_codes, month_codes] = summary_df['fund_mv_end'].to_numpy(dtype=float)
+        realized[fund_codes, month_codes] = summary_df['realized_p_l'].to_numpy(dtype=float)
+
+        # Returns of the first month are undefined; MV start carries the last reported MV forward over missing
+        # months. A zero MV start gives no return rather than inf
+        self.returns = np.full(shape, np.nan)
+        mv_start = pd.DataFrame(mv_end[:, :-1]).ffill(axis=1).to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.returns[:, 1:] = np.where(mv_start != 0, (mv_end[:, 1:] - mv_start + realized[:, 1:]) / mv_start,
+                                           np.nan)
+        # Months since the previous report of the fund, i.e. the months each return covers (1 without a gap)
+        reported_at = pd.DataFrame(np.where(np.isnan(mv_end), np.nan, np.arange(shape[1]))).ffill(axis=1).to_numpy()
+        self.spans = np.full(shape, np.nan)
+        self.spans[:, 1:] = np.arange(1, shape[1]) - reported_at[:, :-1]
+        self.spans[np.isnan(self.returns)] = np.nan
+        LOGGER.info(f"PerformanceAnalytics initialized with {shape[0]} funds x {shape[1]} months "
+                    f"in {(time.perf_counter() - start) * 1000:.1f} ms.")
+
+    @classmethod
+    def from_db(cls, db_manager, **kwargs):
+        """Builds the matrix from the fund_month_summary table of db_manager."""
+        return cls(PerformanceCalculator(db_manager).load_summary(), **kwargs)
+
+    @instrument(rows_out=len)
+    def fund_metrics(self):
+        """
+        One row per fund: number of months covered by its returns, cumulative and annualized return, annualized
+        volatility, Sharpe ratio against risk_free_rate (annual) and maximum drawdown of the compounded value.
+
+        A return spanning a gap of k months counts as k months of its per-month equivalent, (1 + r) ** (1 / k) - 1,
+        in the months, the annualization, and the mean and volatility behind the Sharpe ratio.
+        """
+        returns = self.returns
+        valid = ~np.isnan(returns)
+        spans = np.where(valid, self.spans, 0)
+        periods = spans.sum(axis=1).astype(int)
+        growth = np.where(valid, 1 + returns, 1.0)
+        wealth = np.cumprod(growth, axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cumulative = wealth[:, -1] - 1 if wealth.size else np.full(len(self.funds), np.nan)
+            annualized = np.where(periods > 0, np.power(1 + cumulative, MONTHS_PER_YEAR / np.maximum(periods, 1)) - 1,
+                                  np.nan)
+            monthly = np.where(valid, np.power(growth, 1 / np.maximum(spans, 1)) - 1, 0)
+            mean = (spans * monthly).sum(axis=1) / np.maximum(periods, 1)
+            variance = (spans * (monthly - mean[:, None]) ** 2).sum(axis=1) / np.maximum(periods - 1, 1)
+            monthly_std = np.where(periods > 1, np.sqrt(variance), np.nan)
+            excess = mean - self.risk_free_rate / MONTHS_PER_YEAR
+            sharpe = np.where(monthly_std > 0, excess / monthly_std * np.sqrt(MONTHS_PER_YEAR), np.nan)
+            # Drawdown from the running peak of the compounded value, starting at 1 before the first return
+            peaks = np.maximum(np.maximum.accumulate(wealth, axis=1), 1.0)
+            max_drawdown = (wealth / peaks - 1).min(axis=1, initial=0.0)
+
+        return pd.DataFrame({
+            'fund_name': self.funds,
+            'months': periods,
+            'cumulative_return': np.where(periods > 0, cumulative, np.nan),
+            'annualized_return': annualized,
+            'annualized_volatility': monthly_std * np.sqrt(MONTHS_PER_YEAR),
+            'sharpe_ratio': sharpe,
+            'max_drawdown': np.where(periods > 0, max_drawdown, np.nan),
+        })
+
+    def rolling_returns(self, windows=ANALYTICS_WINDOWS):
+        """
+        Compounded returns over the trailing windows (in months) ending at each month, as a
+        {window: funds x months array}; a window that is not fully covered by monthly returns is NaN.
+        """
+        rolling = {}
+        growth = 1 + self.returns
+        for window in windows:
+            values = np.full(growth.shape, np.nan)
+            if window <= growth.shape[1]:
+                values[:, window - 1:] = sliding_window_view(growth, window, axis=1).prod(axis=-1) - 1
+            rolling[window] = values
+        return rolling
+
+    @instrument(rows_out=len)
+    def monthly_returns(self, windows=ANALYTICS_WINDOWS):
+        """Long table of the 1-month and trailing window returns per fund and month, for months with a return."""
+        columns = {'return_1m': self.returns}
+        columns.update({f'return_{window}m': values for window, values in self.rolling_returns(windows).items()})
+        fund_idx, month_idx = np.nonzero(~np.isnan(self.returns))
+        return pd.DataFrame({
+            'eom_date': self.months[month_idx].strftime('%Y-%m-%d'),
+            'fund_name': self.funds[fund_idx],
+            **{name: values[fund_idx, month_idx] for name, values in columns.items()},
+        }).sort_values(['eom_date', 'fund_name'], ignore_index=True)
+
+    @instrument(rows_out=len)
+    def rankings(self, top_k=ANALYTICS_TOP_K):
+        """
+        The top_k funds by monthly rate of return for every month, ranked from 1. Ties keep fund name order, as
+        in PerformanceCalculator's best performer.
+        """
+        if not self.returns.size:
+            return pd.DataFrame(columns=['eom_date', 'rank', 'fund_name', 'rate_of_return'])
+        top_k = min(top_k, len(self.funds))
+        scores = np.where(np.isnan(self.returns), -np.inf, self.returns)
+        order = np.argsort(-scores, axis=0, kind='stable')[:top_k]
+        ranked = np.take_along_axis(self.returns, order, axis=0)
+        rank_idx, month_idx = np.nonzero(~np.isnan(ranked))
+        return pd.DataFrame({
+            'eom_date': self.months[month_idx].strftime('%Y-%m-%d'),
+            'rank': rank_idx + 1,
+            'fund_name': self.funds[order[rank_idx, month_idx]],
+            'rate_of_return': ranked[rank_idx, month_idx],
+        }).sort_values(['eom_date', 'rank'], ignore_index=True)
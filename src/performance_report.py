@@ -1,34 +1,49 @@
 # performance_calculator.py
+import numpy as np
 import pandas as pd
 from src.db_manager import DBManager
-from config import LOGGER, FUND_POSITIONS
+from src.dimensions import compact_frame
+from src.metrics import instrument
+from config import LOGGER, FUND_MONTH_SUMMARY, FUND_POSITIONS
+
+# Instrument identifier of a position, as used by the price reconciliation and dim_instrument
+IDENTIFIER = "TRIM(COALESCE(symbol, isin, ''))"
 
 class PerformanceCalculator:
-    """Calculates monthly Rate of Return (RoR) for all funds."""
+    """Calculates monthly Rate of Return (RoR) for all funds, and the contribution of each position to it."""
     def __init__(self, db_manager: DBManager):
         self.db_manager = db_manager
         LOGGER.info("PerformanceCalculator initialized.")
 
+    @instrument(rows_out=len)
     def run_attribution(self):
         """Calculates RoR for all funds and identifies the best performer each month."""
-        
-        # 1. Aggregate Fund Market Value (MV) and Total Realized P/L
+        return self.attribute(self.load_summary())
+
+    def load_summary(self):
+        """Fund Market Value (MV) and Total Realized P/L per fund and month, maintained by the ingestor."""
         aggregation_query = f"""
         SELECT
             eom_date,
             fund_name,
-            SUM(market_value) AS fund_mv_end,
-            SUM(realised_p_l) AS realized_p_l
-        FROM {FUND_POSITIONS}
-        GROUP BY 1, 2
+            fund_mv_end,
+            realized_p_l
+        FROM {FUND_MONTH_SUMMARY}
         ORDER BY eom_date, fund_name;
         """
         
-        fund_performance_df = pd.read_sql(aggregation_query, self.db_manager.conn)
-        
+        return pd.read_sql(aggregation_query, self.db_manager.conn)
+
+    @instrument(rows_out=len)
+    def attribute(self, fund_performance_df):
+        """
+        Identifies the best performer each month from fund_month_summary rows (eom_date, fund_name, fund_mv_end,
+        realized_p_l), e.g. merged from several shards. Works on a copy, so the caller's frame is left unchanged.
+        """
         if fund_performance_df.empty:
             LOGGER.warning("No fund performance data found for attribution.")
             return pd.DataFrame()
+        fund_performance_df = compact_frame(fund_performance_df.copy(), ['fund_name', 'eom_date'], 'Attribution')
 
         # 2. Calculate Fund MV Start (Fund_MV_end from M-1)
         
@@ -37,7 +52,7 @@ class PerformanceCalculator:
         fund_performance_df = fund_performance_df.sort_values(by=['fund_name', 'eom_date_dt'])
 
         # Create the lagged column (MV_end of previous month)
-        fund_performance_df['fund_mv_start'] = fund_performance_df.groupby('fund_name')['fund_mv_end'].shift(1)
+        fund_performance_df['fund_mv_start'] = fund_performance_df.groupby('fund_name', observed=True)['fund_mv_end'].shift(1)
         
         # The very first month for each fund will have a NaN start MV and thus RoR cannot be calculated.
         # This is expected for the first report date (Dec 2022).
@@ -54,7 +69,7 @@ class PerformanceCalculator:
         # 4. Identify the Best Performing Fund for each Month
         
         # Group by month and find the index of the max RoR within each group
-        best_performer_indices = ror_df.groupby('eom_date_dt')['rate_of_return'].idxmax()
+        best_performer_indices = ror_df.groupby('eom_date_dt', observed=True)['rate_of_return'].idxmax()
         best_performers = ror_df.loc[best_performer_indices]
         
         # Select and rename final columns
@@ -70,6 +85,96 @@ class PerformanceCalculator:
         LOGGER.info("Performance attribution completed.")
         return output_df
 
+    @instrument(rows_out=len)
+    def run_contribution(self):
+        """Position-level contributions to every fund's monthly RoR; see contribute."""
+        return self.contribute(self.load_positions(), self.load_summary())
+
+    def load_positions(self):
+        """MV and realized P/L per fund, month and instrument (COALESCE(symbol, isin)), aggregated inside SQLite."""
+        return pd.read_sql(f"""
+        SELECT
+            fund_name,
+            eom_date,
+            {IDENTIFIER} AS identifier,
+            MAX(financial_type) AS financial_type,
+            SUM(market_value) AS market_value,
+            SUM(realised_p_l) AS realised_p_l
+        FROM {FUND_POSITIONS}
+        GROUP BY fund_name, eom_date, {IDENTIFIER};
+        """, self.db_manager.conn)
+
+    @instrument(rows_in=lambda self, positions_df, *args, **kwargs: len(positions_df), rows_out=len)
+    def contribute(self, positions_df, summary_df):
+        """
+        Aligns every position with the same instrument's position at the fund's previous EOM date and returns its
+        contribution to the fund's RoR: (MV end - MV start + realized P/L) / fund MV start. An instrument bought in
+        the month starts from 0 MV, one sold ends at 0 MV and appears with only its previous position, so the
+        contributions of a fund-month add up to its RoR. The first month of each fund has no starting MV and is
+        left out.
+
+        All fund-months are aligned at once: positions get an integer (fund-month, instrument) key and a single
+        outer merge joins them with the positions shifted to the next fund-month of their fund.
+        """
+        if positions_df.empty or summary_df.empty:
+            LOGGER.warning("No fund positions found for contribution analysis.")
+            return pd.DataFrame(columns=['eom_date', 'fund_name', 'identifier', 'financial_type', 'mv_start',
+                                         'mv_end', 'realized_p_l', 'fund_mv_start', 'contribution'])
+
+        # Fund-months in (fund_name, eom_date) order with their neighbours in the same fund
+        periods = summary_df[['fund_name', 'eom_date', 'fund_mv_end']].astype({'fund_name': str, 'eom_date': str})
+        periods = periods.sort_values(['fund_name', 'eom_date'], ignore_index=True)
+        fund = periods['fund_name'].to_numpy()
+        position = np.arange(len(periods))
+        next_period = np.where(np.append(fund[1:] == fund[:-1], False), position + 1, -1)
+        has_start = np.insert(fund[1:] == fund[:-1], 0, False)
+        fund_mv_start = np.where(has_start, periods['fund_mv_end'].shift(1), np.nan)
+
+        # Integer key (fund-month, instrument) of every position, and of the same position one fund-month later
+        period = pd.MultiIndex.from_frame(periods[['fund_name', 'eom_date']]).get_indexer(
+            pd.MultiIndex.from_arrays([positions_df['fund_name'].astype(str), positions_df['eom_date'].astype(str)]))
+        ident_codes, identifiers = pd.factorize(positions_df['identifier'], sort=True)
+        stride = max(len(identifiers), 1)
+        known = period >= 0
+        current = pd.DataFrame({
+            'key': period[known] * stride + ident_codes[known],
+            'financial_type': positions_df['financial_type'].to_numpy()[known],
+            'mv_end': positions_df['market_value'].to_numpy(dtype=float)[known],
+            'realized_p_l': positions_df['realised_p_l'].to_numpy(dtype=float)[known],
+        })
+        rolled = known & (next_period[period] >= 0)
+        previous = pd.DataFrame({
+            'key': next_period[period[rolled]] * stride + ident_codes[rolled],
+            'previous_financial_type': positions_df['financial_type'].to_numpy()[rolled],
+            'mv_start': positions_df['market_value'].to_numpy(dtype=float)[rolled],
+        })
+        aligned = current.merge(previous, on='key', how='outer')
+        aligned_period, aligned_ident = np.divmod(aligned['key'].to_numpy(), stride)
+        keep = has_start[aligned_period]
+        aligned, aligned_period, aligned_ident = aligned[keep], aligned_period[keep], aligned_ident[keep]
+
+        eom_codes, _ = pd.factorize(periods['eom_date'], sort=True)
+        order = np.lexsort((aligned_ident, aligned_period, eom_codes[aligned_period]))
+        aligned_period, aligned_ident = aligned_period[order], aligned_ident[order]
+        aligned = aligned.iloc[order]
+        mv_start = aligned['mv_start'].fillna(0.0).to_numpy()
+        mv_end = aligned['mv_end'].fillna(0.0).to_numpy()
+        realized = aligned['realized_p_l'].fillna(0.0).to_numpy()
+        result = pd.DataFrame({
+            'eom_date': periods['eom_date'].to_numpy()[aligned_period],
+            'fund_name': fund[aligned_period],
+            'identifier': np.asarray(identifiers)[aligned_ident],
+            'financial_type': aligned['financial_type'].fillna(aligned['previous_financial_type']).to_numpy(),
+            'mv_start': mv_start,
+            'mv_end': mv_end,
+            'realized_p_l': realized,
+            'fund_mv_start': fund_mv_start[aligned_period],
+        })
+        result['contribution'] = (mv_end - mv_start + realized) / result['fund_mv_start']
+        LOGGER.info(f"Position contribution analysis completed: {len(result)} positions in "
+                    f"{len(np.unique(aligned_period))} fund-months.")
+        return result
+
     def save_output(self, df, filename):
         """Saves the best-performing funds DataFrame to a CSV file."""
         df.to_csv(filename, index=False)
@@ -0,0 +1,169 @@
+# pipeline_dag.py
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from src.db_manager import DBManager
+from src.metrics import METRICS
+from config import LOGGER, DB_NAME, PIPELINE_CHECKPOINT, PIPELINE_MAX_WORKERS
+
+
+def fingerprint_path(path):
+    """Cheap fingerprint of a file (size, mtime) or directory (its files' names, sizes and mtimes)."""
+    if not os.path.exists(path):
+        return 'missing'
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    listing = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            listing.append(f"{os.path.relpath(os.path.join(root, name), path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256('\n'.join(sorted(listing)).encode()).hexdigest()
+
+
+class Stage:
+    """
+    A pipeline step. func(db_manager) does the work on its own database connection; inputs are file or
+    directory paths whose fingerprints (plus params and the fingerprints of the stages it depends on)
+    decide whether the stage must run again; outputs are paths that must exist for the stage to be skipped.
+    A readonly stage gets a read-only connection.
+    """
+    def __init__(self, name, func, inputs=(), outputs=(), depends_on=(), params=None, readonly=False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.depends_on = list(depends_on)
+        self.params = params or {}
+        self.readonly = readonly
+
+
+class StageRunner:
+    """
+    Runs a DAG of stages, concurrently where their dependencies allow, each on its own pooled connection to
+    db_path (WAL mode, so read-only stages do not block a writing one).
+
+    A stage is skipped when its fingerprint matches the one recorded in the checkpoint file by its last
+    successful run and its outputs exist. Completed stages are checkpointed as they finish, so a failed run
+    resumes from the stages that did not complete. The checkpoint is discarded when the database file is
+    replaced.
+    """
+    def __init__(self, stages, db_path=DB_NAME, checkpoint_path=PIPELINE_CHECKPOINT, max_workers=PIPELINE_MAX_WORKERS):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            unknown = [dep for dep in stage.depends_on if dep not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}.")
+        self.db_path = db_path
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        LOGGER.info(f"StageRunner initialized with stages {list(self.stages)}.")
+
+    def run(self, force=False):
+        """
+        Runs every stage whose inputs changed (all of them with force=True). Returns {stage: status} with status
+        'ran', 'skipped', 'failed' or 'blocked' (an upstream stage failed). Raises RuntimeError if a stage failed,
+        after the independent stages have finished.
+        """
+        checkpoint = self._load_checkpoint()
+        fingerprints = {}
+        status = {}
+        running = {}
+        self.db = DBManager(db_path=self.db_path, pool_size=self.max_workers)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while len(status) < len(self.stages):
+                    progressed = len(status)
+                    for name, stage in self.stages.items():
+                        if name in status or name in running.values():
+                            continue
+                        deps = [status.get(dep) for dep in stage.depends_on]
+                        if any(dep in ('failed', 'blocked') for dep in deps):
+                            status[name] = 'blocked'
+                            LOGGER.error(f"Stage '{name}' blocked by a failed upstream stage.")
+                            continue
+                        if not all(dep in ('ran', 'skipped') for dep in deps):
+                            continue
+
+                        fingerprints[name] = self._fingerprint(stage, fingerprints)
+                        recorded = checkpoint['stages'].get(name, {})
+                        if (not force and recorded.get('fingerprint') == fingerprints[name]
+                                and all(os.path.exists(path) for path in stage.outputs)):
+                            status[name] = 'skipped'
+                            LOGGER.info(f"Stage '{name}' skipped; inputs unchanged since {recorded.get('completed_at')}.")
+                            continue
+                        running[pool.submit(self._run_stage, stage)] = name
+
+                    if not running:
+                        if len(status) == progressed:
+                            raise ValueError(f"Stage dependencies form a cycle: {sorted(set(self.stages) - set(status))}.")
+                        continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            status[name] = 'failed'
+                            LOGGER.error(f"Stage '{name}' failed: {e}")
+                            continue
+                        status[name] = 'ran'
+                        checkpoint['stages'][name] = {
+                            'fingerprint': fingerprints[name],
+                            'completed_at': datetime.now().isoformat(timespec='seconds'),
+                        }
+                        self._save_checkpoint(checkpoint)
+        finally:
+            self.db.close_pool()
+
+        failed = [name for name, result in status.items() if result == 'failed']
+        if failed:
+            raise RuntimeError(f"Pipeline stages failed: {failed}. Rerun to resume from the incomplete stages.")
+        return status
+
+    def _run_stage(self, stage):
+        start = time.perf_counter()
+        LOGGER.info(f"Stage '{stage.name}' started.")
+        with self.db.session(readonly=stage.readonly) as db:
+            with METRICS.measure(f"stage.{stage.name}"), METRICS.profiled():
+                stage.func(db)
+        LOGGER.info(f"Stage '{stage.name}' completed in {time.perf_counter() - start:.2f}s.")
+
+    def _fingerprint(self, stage, fingerprints):
+        material = {
+            'stage': stage.name,
+            'inputs': {path: fingerprint_path(path) for path in stage.inputs},
+            'params': stage.params,
+            'upstream': {dep: fingerprints[dep] for dep in stage.depends_on},
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _database_identity(self):
+        if not os.path.exists(self.db_path):
+            return None
+        stat = os.stat(self.db_path)
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def _load_checkpoint(self):
+        checkpoint = {'database': self._database_identity(), 'stages': {}}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                recorded = json.load(f)
+            if checkpoint['database'] is not None and recorded.get('database') == checkpoint['database']:
+                checkpoint['stages'] = recorded.get('stages', {})
+            else:
+                LOGGER.info("Database changed since the last checkpoint; running every stage.")
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint):
+        checkpoint['database'] = self._database_identity()
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
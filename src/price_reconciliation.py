@@ -1,101 +1,537 @@
 # price_reconciler.py
+import time
+import numpy as np
 import pandas as pd
 from src.db_manager import DBManager
-from config import LOGGER, FUND_POSITIONS, EQUITY_PRICES, BOND_PRICES
+from src.dimensions import compact_frame
+from src.break_tracker import BreakTracker
+from src.metrics import instrument
+from config import (LOGGER, FUND_POSITIONS, EQUITY_PRICES, BOND_PRICES, DIM_INSTRUMENT, RECON_ENGINE,
+                    MASTER_PRICE_TABLES, PRICE_RECONCILIATION, RECON_DIRTY_PARTITIONS, MASTER_PRICE_DIGEST,
+                    RECON_BREAKS, RECON_STATE, REFERENCE_STATE, RECONCILIATION_TABLES_FILE, RECON_STATE_FILE,
+                    RESULTS_CHUNKSIZE)
 import os
 
 
+# Partitions being reconciled by an incremental run
+RECON_BATCH = 'temp.recon_batch'
+PARTITION_JOIN = f"JOIN {RECON_BATCH} r ON r.fund_name = t1.fund_name AND r.eom_date = t1.eom_date"
+
+# Query fund_positions table for relevant fields. The identifier comes trimmed from dim_instrument;
+# positions are matched to master prices on the integer instrument_id.
+INSTRUMENTS_QUERY_TEMPLATE = f"""
+SELECT DISTINCT
+    t1.eom_date,
+    t1.financial_type,
+    COALESCE(d.identifier, TRIM(COALESCE(t1.symbol, t1.isin, ''))) as identifier,
+    t1.fund_name,
+    t1.price AS reported_price,
+    t1.instrument_id
+FROM {FUND_POSITIONS} t1
+{{partition_join}}
+LEFT JOIN {DIM_INSTRUMENT} d ON d.instrument_id = t1.instrument_id
+ORDER BY t1.fund_name, t1.eom_date, identifier, t1.financial_type, reported_price
+"""
+INSTRUMENTS_QUERY = INSTRUMENTS_QUERY_TEMPLATE.format(partition_join='')
+PARTITION_INSTRUMENTS_QUERY = INSTRUMENTS_QUERY_TEMPLATE.format(partition_join=PARTITION_JOIN)
+
+# Output columns of a reconciliation, as persisted in price_reconciliation
+OUTPUT_COLUMNS = [
+    'fund_name', 'eom_date', 'financial_type', 'identifier',
+    'reported_price', 'master_price_filled', 'master_price_date', 'price_difference'
+]
+
+# Repeated string columns held as categoricals in the reconciliation frames
+CATEGORICAL_COLUMNS = ['fund_name', 'financial_type', 'identifier']
 
 
 class PriceReconciler:
     """Calculates the difference between reported prices and master reference prices."""
-    def __init__(self, db_manager: DBManager):
+
+    # 'pandas' forward-fills over the concatenated history; 'asof' binary-searches the sorted history
+    # once per distinct position key; 'sql' resolves the last available price inside SQLite and
+    # only returns the reconciled rows. All engines produce identical output.
+    ENGINES = ('pandas', 'asof', 'sql')
+
+    def __init__(self, db_manager: DBManager, engine=RECON_ENGINE):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown reconciliation engine '{engine}'. Expected one of {self.ENGINES}.")
         self.db_manager = db_manager
-        LOGGER.info("PriceReconciler initialized.")
+        self.engine = engine
+        self.breaks = BreakTracker()
+        # (fund_name, eom_date) partitions reconciled by the last run_incremental call
+        self.refreshed_partitions = []
+        LOGGER.info(f"PriceReconciler initialized (engine={engine}).")
+
+    @instrument(rows_out=len)
+    def run_reconciliation(self, partitioned=False):
+        """
+        Executes the price reconciliation logic against the master reference data.
+
+        With partitioned=True only the (fund_name, eom_date) partitions staged in temp.recon_batch are
+        reconciled, against the master history of the instruments they hold.
+        """
+        if self.engine == 'sql':
+            final_df = self._reconcile_sql(partitioned)
+        elif self.engine == 'asof':
+            final_df = self._asof_lookup(*self._load_frames(partitioned))
+        else:
+            final_df = self._lap_ffill(*self._load_frames(partitioned))
+        return self._summarize(final_df)
+
+    @instrument(rows_out=len)
+    def run_incremental(self, master_changes=None, reclassify=False):
+        """
+        Reconciles only the partitions that changed since the last run and persists them in price_reconciliation.
+
+        A partition is reconciled again when the ingestor rewrote it (recon_dirty_partitions), when it holds an
+        instrument whose master prices changed in or before its month (master_price_digest, checked when the
+        loaded master reference dump changed), or when it has no
+        persisted results yet. Their break classification and ages are stored in recon_breaks (BreakTracker);
+        every partition is reconciled again when the break tolerances changed since the last run.
+        master_changes and reclassify take these signals from a caller that checked recon_state itself (see
+        master_changes and tolerances_changed); recon_state is then neither read nor updated here.
+        Returns the reconciled rows of those partitions.
+        """
+        start = time.perf_counter()
+        self.db_manager.execute_script(RECONCILIATION_TABLES_FILE)
+        if master_changes is None:
+            self.db_manager.execute_script(RECON_STATE_FILE)
+        conn = self.db_manager.conn
+        with conn:
+            if master_changes is None:
+                master_changes = self.master_changes(conn)
+                reclassify = self.tolerances_changed(conn)
+                self.store_state(conn)
+            self._queue_master_changes(conn, master_changes)
+            # Everything is reconciled when there are no results yet, no break classification of them, or one
+            # made with other tolerances
+            if reclassify or any(conn.execute(f"SELECT 1 FROM {table} LIMIT 1;").fetchone() is None
+                                 for table in (PRICE_RECONCILIATION, RECON_BREAKS)):
+                conn.execute(f"""
+                INSERT OR IGNORE INTO {RECON_DIRTY_PARTITIONS} (fund_name, eom_date)
+                SELECT DISTINCT fund_name, eom_date FROM {FUND_POSITIONS};
+                """)
+            conn.execute(f"DROP TABLE IF EXISTS {RECON_BATCH};")
+            conn.execute(f"CREATE TEMP TABLE recon_batch AS SELECT fund_name, eom_date FROM {RECON_DIRTY_PARTITIONS};")
+
+        self.refreshed_partitions = conn.execute(f"SELECT fund_name, eom_date FROM {RECON_BATCH};").fetchall()
+        partitions = len(self.refreshed_partitions)
+        if not partitions:
+            conn.execute(f"DROP TABLE {RECON_BATCH};")
+            LOGGER.info("Price reconciliation is up to date; no partitions to reconcile.")
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+        LOGGER.info(f"Reconciling {partitions} changed (fund_name, eom_date) partitions.")
+        result_df = self.run_reconciliation(partitioned=True)
+        with conn:
+            self.breaks.store(conn, result_df, RECON_BATCH)
+            self._store_results(conn, result_df)
+        conn.execute(f"DROP TABLE {RECON_BATCH};")
+        LOGGER.info(f"Persisted {len(result_df)} reconciliation rows for {partitions} partitions "
+                    f"in {time.perf_counter() - start:.2f}s.")
+        return result_df
+
+    def restore_breaks(self, partitions, history=None):
+        """
+        Classifies the persisted results of the given (fund_name, eom_date) partitions again and re-ages the later
+        months of their funds, without reconciling them. history is passed to BreakTracker.store: an attached
+        schema whose earlier months seed the ages (ShardManager continues runs across year shards this way).
+        """
+        conn = self.db_manager.conn
+        frames = [df for _, df in self.iter_results(partitions)]
+        result_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=OUTPUT_COLUMNS)
+        with conn:
+            conn.execute(f"DROP TABLE IF EXISTS {RECON_BATCH};")
+            conn.execute("CREATE TEMP TABLE recon_batch (fund_name TEXT, eom_date TEXT);")
+            conn.executemany(f"INSERT INTO {RECON_BATCH} VALUES (?, ?);", partitions)
+            self.breaks.store(conn, result_df, RECON_BATCH, history=history)
+        conn.execute(f"DROP TABLE {RECON_BATCH};")
+
+    def load_results(self):
+        """Returns every persisted reconciliation row, typed and ordered as run_reconciliation returns them."""
+        result_df = pd.read_sql(f"""
+        SELECT {', '.join(OUTPUT_COLUMNS)} FROM {PRICE_RECONCILIATION}
+        ORDER BY fund_name, eom_date, identifier, financial_type, reported_price;
+        """, self.db_manager.conn)
+        return self._typed(result_df)
+
+    def iter_results(self, partitions=None, chunksize=RESULTS_CHUNKSIZE):
+        """
+        Streams persisted reconciliation rows as ((fund_name, eom_date), df) per partition, reading chunksize
+        rows at a time, so the full history is never materialized. partitions restricts the output to the
+        given (fund_name, eom_date) pairs. Every df is typed as load_results types its rows.
+        """
+        conn = self.db_manager.conn
+        partition_join = ""
+        if partitions is not None:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS result_partitions (fund_name TEXT, eom_date TEXT, PRIMARY KEY (fund_name, eom_date));")
+            with self.db_manager.transaction():
+                conn.execute("DELETE FROM temp.result_partitions;")
+                self.db_manager.executemany("INSERT OR IGNORE INTO temp.result_partitions VALUES (?, ?);", partitions)
+            partition_join = (f"JOIN temp.result_partitions r "
+                              f"ON r.fund_name = t1.fund_name AND r.eom_date = t1.eom_date")
+        query = f"""
+        SELECT {', '.join(f't1.{col}' for col in OUTPUT_COLUMNS)} FROM {PRICE_RECONCILIATION} t1 {partition_join}
+        ORDER BY t1.fund_name, t1.eom_date, t1.identifier, t1.financial_type, t1.reported_price;
+        """
+        pending = None
+        for chunk in self.db_manager.iter_batches(query, batch_size=chunksize, fmt='dataframe'):
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
+            # The last partition of a chunk may continue in the next one
+            last_fund, last_eom = chunk['fund_name'].iloc[-1], chunk['eom_date'].iloc[-1]
+            is_last = (chunk['fund_name'] == last_fund) & (chunk['eom_date'] == last_eom)
+            for key, df in chunk[~is_last].groupby(['fund_name', 'eom_date'], sort=False):
+                yield key, self._typed(df.reset_index(drop=True))
+            pending = chunk[is_last]
+        if pending is not None and not pending.empty:
+            key = (pending['fund_name'].iloc[0], pending['eom_date'].iloc[0])
+            yield key, self._typed(pending.reset_index(drop=True))
+
+    def master_changes(self, conn):
+        """
+        Compares a checksum of the master prices per (table, instrument, month) with the one stored by the last
+        run and returns the changed instruments with their first changed month, as [(instrument_id, price_month)].
+        The checksums are aggregated inside SQLite over the covering (instrument_id, price_date, PRICE) indexes and
+        kept in temp.master_digest until store_state.
+
+        The aggregation reads the whole master history, so it only runs when the loaded reference dump changed
+        since the last run (its content hash in reference_state), or when no dump is recorded (master tables
+        loaded without the reference cache); otherwise returns [].
+        """
+        conn.execute("DROP TABLE IF EXISTS temp.master_digest;")
+        signal = self._master_signal(conn)
+        if signal is not None and signal == self._state(conn, 'master_prices'):
+            LOGGER.info("Master reference data unchanged since the last reconciliation; skipping the price digest.")
+            return []
+
+        numeric = "typeof(PRICE) IN ('integer', 'real')"
+        conn.execute(f"CREATE TEMP TABLE master_digest AS SELECT * FROM {MASTER_PRICE_DIGEST} WHERE 0;")
+        for table, _ in MASTER_PRICE_TABLES:
+            conn.execute(f"""
+            INSERT INTO temp.master_digest (source_table, instrument_id, price_month, digest)
+            SELECT '{table}', instrument_id, substr(price_date, 1, 7),
+                   COUNT(*) || ':' || SUM({numeric}) || ':' ||
+                   printf('%.17g', TOTAL(CASE WHEN {numeric} THEN PRICE END)) || ':' ||
+                   printf('%.17g', TOTAL(CASE WHEN {numeric} THEN PRICE * CAST(substr(price_date, 9, 2) AS INTEGER) END))
+            FROM {table}
+            WHERE instrument_id IS NOT NULL AND price_date IS NOT NULL
+            GROUP BY instrument_id, substr(price_date, 1, 7);
+            """)
+
+        digest_columns = "source_table, instrument_id, price_month, digest"
+        return conn.execute(f"""
+        SELECT instrument_id, MIN(price_month) FROM (
+            SELECT instrument_id, price_month FROM (
+                SELECT {digest_columns} FROM temp.master_digest
+                EXCEPT SELECT {digest_columns} FROM {MASTER_PRICE_DIGEST})
+            UNION ALL
+            SELECT instrument_id, price_month FROM (
+                SELECT {digest_columns} FROM {MASTER_PRICE_DIGEST}
+                EXCEPT SELECT {digest_columns} FROM temp.master_digest)
+        ) GROUP BY instrument_id;
+        """).fetchall()
+
+    def tolerances_changed(self, conn):
+        """True when the break tolerances differ from those of the last run (their fingerprint in recon_state)."""
+        changed = self._state(conn, 'tolerances') != self.breaks.fingerprint
+        if changed:
+            LOGGER.info("Break tolerances changed since the last reconciliation; reclassifying every partition.")
+        return changed
+
+    def store_state(self, conn):
+        """
+        Records the reconciliation inputs in recon_state once the partitions they invalidate are queued: the
+        tolerances fingerprint, and the master_price_digest computed by the last master_changes call on conn
+        with the reference dump it describes (unless master_changes skipped the digest).
+        """
+        conn.execute(f"INSERT OR REPLACE INTO {RECON_STATE} (name, value) VALUES ('tolerances', ?);",
+                     (self.breaks.fingerprint,))
+        if not conn.execute("SELECT 1 FROM temp.sqlite_master WHERE name = 'master_digest';").fetchone():
+            return
+        conn.execute(f"DELETE FROM {MASTER_PRICE_DIGEST};")
+        conn.execute(f"INSERT INTO {MASTER_PRICE_DIGEST} SELECT * FROM temp.master_digest;")
+        conn.execute("DROP TABLE temp.master_digest;")
+        signal = self._master_signal(conn)
+        if signal is None:
+            conn.execute(f"DELETE FROM {RECON_STATE} WHERE name = 'master_prices';")
+        else:
+            conn.execute(f"INSERT OR REPLACE INTO {RECON_STATE} (name, value) VALUES ('master_prices', ?);", (signal,))
+
+    @staticmethod
+    def _queue_master_changes(conn, master_changes):
+        """Queues every partition holding a changed instrument from its first changed month on. Runs on the caller's transaction."""
+        if not master_changes:
+            return
+        conn.execute("DROP TABLE IF EXISTS temp.master_changes;")
+        conn.execute("CREATE TEMP TABLE master_changes (instrument_id INTEGER PRIMARY KEY, price_month TEXT NOT NULL);")
+        conn.executemany("INSERT INTO temp.master_changes VALUES (?, ?);", master_changes)
+        changed = conn.execute(f"""
+        INSERT OR IGNORE INTO {RECON_DIRTY_PARTITIONS} (fund_name, eom_date)
+        SELECT DISTINCT p.fund_name, p.eom_date
+        FROM temp.master_changes c
+        JOIN {FUND_POSITIONS} p ON p.instrument_id = c.instrument_id AND p.eom_date >= c.price_month || '-01';
+        """).rowcount
+        conn.execute("DROP TABLE temp.master_changes;")
+        if changed > 0:
+            LOGGER.info(f"Master price changes queued {changed} partitions for reconciliation.")
+
+    @staticmethod
+    def _master_signal(conn):
+        """Content hash of the loaded master reference dump, or None when no dump is recorded."""
+        if not conn.execute(f"PRAGMA table_info({REFERENCE_STATE})").fetchall():
+            return None
+        hashes = [row[0] for row in conn.execute(f"SELECT content_hash FROM {REFERENCE_STATE} ORDER BY source_path;")]
+        return ','.join(hashes) or None
+
+    @staticmethod
+    def _state(conn, name):
+        row = conn.execute(f"SELECT value FROM {RECON_STATE} WHERE name = ?;", (name,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _typed(result_df):
+        """Persisted reconciliation rows with datetime dates and float prices, also for partitions without any price."""
+        for col in ['eom_date', 'master_price_date']:
+            result_df[col] = pd.to_datetime(result_df[col], format='ISO8601').astype('datetime64[ns]')
+        for col in ['reported_price', 'master_price_filled', 'price_difference']:
+            result_df[col] = result_df[col].astype(float)
+        return result_df
+
+    @staticmethod
+    def _store_results(conn, result_df):
+        """Replaces the persisted rows of the partitions in temp.recon_batch and clears them from the dirty queue."""
+        partition_filter = f"WHERE (fund_name, eom_date) IN (SELECT fund_name, eom_date FROM {RECON_BATCH})"
+        conn.execute(f"DELETE FROM {PRICE_RECONCILIATION} {partition_filter};")
+        rows = result_df[OUTPUT_COLUMNS].astype(object)
+        for col in ['eom_date', 'master_price_date']:
+            rows[col] = result_df[col].dt.strftime('%Y-%m-%d').astype(object)
+        rows = rows.where(rows.notna(), None)
+        conn.executemany(
+            f"INSERT INTO {PRICE_RECONCILIATION} ({', '.join(OUTPUT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in OUTPUT_COLUMNS)});",
+            rows.itertuples(index=False, name=None)
+        )
+        conn.execute(f"DELETE FROM {RECON_DIRTY_PARTITIONS} {partition_filter};")
+
+    @instrument(rows_out=lambda frames: len(frames[0]) + len(frames[1]))
+    def _load_frames(self, partitioned=False):
+        """Loads fund positions and the master price history with standardized types."""
 
-    def run_reconciliation(self):
-        """Executes the price reconciliation logic against the master reference data."""
-        
         # Step 1. Query Data And Standardize the Identifier and Dates
 
-        # Query fund_positions table for relevant fields
-        instruments_query = f"""
-        SELECT DISTINCT
-            t1.eom_date,
-            t1.financial_type,
-            COALESCE(t1.symbol, t1.isin) as identifier,
-            t1.fund_name,
-            t1.price AS reported_price
-        FROM {FUND_POSITIONS} t1;
-        """
-        # Query Equity Prices and Bond Prices for available master prices
+        # Query Equity Prices and Bond Prices for available master prices.
+        # price_date is the ISO date normalized once at load time (DataIngestor.prepare_master_prices).
+        # NOT INDEXED keeps rowid (source) order, which decides ties between same-day prices.
+        # A partitioned run only needs the history of the instruments held in its partitions.
+        instrument_filter = (
+            f"AND instrument_id IN (SELECT t1.instrument_id FROM {FUND_POSITIONS} t1 {PARTITION_JOIN})"
+            if partitioned else ""
+        )
         master_prices_query = f"""
         SELECT
-            DATETIME AS eom_date,
-            SYMBOL AS identifier,
-            PRICE AS master_price,
-            'EQUITY' as financial_type_ref
-        FROM {EQUITY_PRICES}
+            price_date AS eom_date,
+            instrument_id,
+            PRICE AS master_price
+        FROM {EQUITY_PRICES} NOT INDEXED
+        WHERE instrument_id IS NOT NULL {instrument_filter}
         UNION ALL
         SELECT
-            DATETIME AS eom_date,
-            ISIN AS identifier,
-            PRICE AS master_price,
-            'BOND' as financial_type_ref
-        FROM {BOND_PRICES};
+            price_date AS eom_date,
+            instrument_id,
+            PRICE AS master_price
+        FROM {BOND_PRICES} NOT INDEXED
+        WHERE instrument_id IS NOT NULL {instrument_filter};
         """
 
         # Query and initial data preparation
+        instruments_query = PARTITION_INSTRUMENTS_QUERY if partitioned else INSTRUMENTS_QUERY
         fund_instruments = pd.read_sql(instruments_query, self.db_manager.conn)
         master_prices_df = pd.read_sql(master_prices_query, self.db_manager.conn)
-        
+
         # Convert prices to float64 for accurate comparison
         for df in [fund_instruments, master_prices_df]:
             for col in ['reported_price', 'master_price']:
                 if col in df.columns:
                     df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Standardize dates and identifiers 
+
+        # Both sides carry ISO dates, so conversion is a fixed-format vectorized cast rather than a mixed-format parse.
         for df in [fund_instruments, master_prices_df]:
-            df['eom_date'] = pd.to_datetime(df['eom_date'], format='mixed')
-            df['identifier'] = df['identifier'].fillna('').astype(str).str.strip()
+            df['eom_date'] = pd.to_datetime(df['eom_date'], format='ISO8601').astype('datetime64[ns]')
+        fund_instruments, master_prices_df = self._with_instrument_ids(fund_instruments, master_prices_df)
+        compact_frame(fund_instruments, CATEGORICAL_COLUMNS, 'Reconciliation positions')
+        return fund_instruments, master_prices_df
+
+    @staticmethod
+    def _with_instrument_ids(fund_instruments, master_prices_df):
+        """
+        Ensures both frames carry an int64 instrument_id join key.
+
+        Frames read from the database already have the dim_instrument key (positions without one get -1,
+        which matches nothing). Frames that only carry string identifiers get codes factorized over both sides.
+        """
+        if 'instrument_id' in fund_instruments.columns and 'instrument_id' in master_prices_df.columns:
+            fund_instruments['instrument_id'] = fund_instruments['instrument_id'].fillna(-1).astype('int64')
+            master_prices_df['instrument_id'] = master_prices_df['instrument_id'].astype('int64')
+            return fund_instruments, master_prices_df
+
+        fund_instruments = fund_instruments.copy()
+        master_prices_df = master_prices_df.copy()
+        fund_instruments['identifier'] = fund_instruments['identifier'].fillna('').astype(str).str.strip()
+        codes, _ = pd.factorize(pd.concat(
+            [master_prices_df['identifier'].fillna('').astype(str).str.strip(), fund_instruments['identifier']],
+            ignore_index=True
+        ))
+        master_prices_df['instrument_id'] = codes[:len(master_prices_df)].astype('int64')
+        fund_instruments['instrument_id'] = codes[len(master_prices_df):].astype('int64')
+        return fund_instruments, master_prices_df
+
+    @staticmethod
+    @instrument(rows_in=lambda positions, prices: len(positions) + len(prices), rows_out=len)
+    def _lap_ffill(fund_instruments, master_prices_df):
+        """Last available price via concat + sort + grouped forward fill."""
+        fund_instruments, master_prices_df = PriceReconciler._with_instrument_ids(fund_instruments, master_prices_df)
 
-            
     # 2. Prepare for Last Available Price (LAP) logic
-        # Create a temporary DF with fund positions' dates, but no master price
-        fund_lap_points = fund_instruments[['identifier', 'eom_date']].copy()
+        # Create a temporary DF with fund positions' dates, but no master price.
+        # One lookup point per (instrument, date): several funds holding the same instrument share it.
+        fund_lap_points = fund_instruments[['instrument_id', 'eom_date']].drop_duplicates().copy()
         fund_lap_points['is_fund_report'] = True
-        
-        # Prepare master prices for LAP
+
+        # Prepare master prices for LAP; the price date is carried forward alongside the price
+        master_prices_df = master_prices_df[['instrument_id', 'eom_date', 'master_price']].copy()
+        master_prices_df['master_price_date'] = master_prices_df['eom_date'].where(master_prices_df['master_price'].notna())
         master_prices_df['is_fund_report'] = False
-        
-        # Combine all time points and sort chronologically
-        lap_df = pd.concat([
-            master_prices_df[['identifier', 'eom_date', 'master_price', 'is_fund_report']],
-            fund_lap_points
-        ]).sort_values(['identifier', 'eom_date'])
-        
-        # Apply forward fill within each identifier group
-        lap_df['master_price_filled'] = lap_df.groupby('identifier')['master_price'].ffill()
-        
+
+        # Combine all time points and sort chronologically. The sort is stable, so a master price
+        # on the EOM date itself always precedes the fund point and is the one carried forward.
+        lap_df = pd.concat([master_prices_df, fund_lap_points]).sort_values(['instrument_id', 'eom_date'], kind='mergesort')
+
+        # Apply forward fill within each instrument group
+        lap_df[['master_price_filled', 'master_price_date']] = (
+            lap_df.groupby('instrument_id')[['master_price', 'master_price_date']].ffill()
+        )
+
         # Extract only the fund report dates with their filled prices
         reconciliation_df = lap_df[lap_df['is_fund_report']].copy()
-        
+
         # 3. Final merge and price comparison
-        final_df = fund_instruments.merge(
-            reconciliation_df[['identifier', 'eom_date', 'master_price_filled']],
-            on=['identifier', 'eom_date'],
+        return fund_instruments.merge(
+            reconciliation_df[['instrument_id', 'eom_date', 'master_price_filled', 'master_price_date']],
+            on=['instrument_id', 'eom_date'],
             how='left'
         )
 
-        print(f"!!!!!!!LENGTH OF FINAL DF: {len(final_df)}")
-        
+    @staticmethod
+    @instrument(rows_in=lambda positions, prices: len(positions) + len(prices), rows_out=len)
+    def _asof_lookup(fund_instruments, master_prices_df):
+        """
+        Last available price via one binary search over sorted (instrument, date) keys.
+
+        The integer instrument_id is combined with the day number into a single int64
+        key. The reference prices are sorted once on that key (stably, so the last price in source order
+        wins among same-day prices, as with the ffill) and each distinct position key finds its match with
+        np.searchsorted. The positions themselves are never sorted, copied per lookup or merged.
+        """
+        fund_instruments, master_prices_df = PriceReconciler._with_instrument_ids(fund_instruments, master_prices_df)
+        final_df = fund_instruments.copy()
+        final_df['master_price_filled'] = np.nan
+        final_df['master_price_date'] = pd.Series(pd.NaT, index=final_df.index, dtype='datetime64[ns]')
+
+        master = master_prices_df.loc[master_prices_df['master_price'].notna() & master_prices_df['eom_date'].notna()]
+        has_date = fund_instruments['eom_date'].notna().to_numpy()
+        if master.empty or not has_date.any():
+            return final_df
+
+        master_codes = master['instrument_id'].to_numpy(dtype=np.int64)
+        position_codes = fund_instruments['instrument_id'].to_numpy(dtype=np.int64)[has_date]
+
+        master_days = master['eom_date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        position_days = fund_instruments['eom_date'].to_numpy()[has_date].astype('datetime64[D]').astype(np.int64)
+        first_day = min(master_days.min(), position_days.min())
+        span = max(master_days.max(), position_days.max()) - first_day + 1
+
+        master_keys = master_codes * span + (master_days - first_day)
+        order = np.argsort(master_keys, kind='stable')
+
+        # Many positions share an (instrument, date) key: search once per distinct key
+        position_keys, inverse = np.unique(position_codes * span + (position_days - first_day), return_inverse=True)
+        match = np.searchsorted(master_keys[order], position_keys, side='right') - 1
+        source_row = order[np.clip(match, 0, None)]
+        found = (match >= 0) & (master_codes[source_row] == position_keys // span)
+
+        prices = np.where(found, master['master_price'].to_numpy()[source_row], np.nan)
+        dates = np.where(found, master['eom_date'].to_numpy()[source_row], np.datetime64('NaT'))
+        final_df.loc[has_date, 'master_price_filled'] = prices[inverse]
+        final_df.loc[has_date, 'master_price_date'] = dates[inverse].astype('datetime64[ns]')
+        return final_df
+
+    @instrument(rows_out=len)
+    def _reconcile_sql(self, partitioned=False):
+        """
+        Last-available-price lookup inside SQLite.
+
+        Each distinct (instrument_id, eom_date) point seeks the latest numeric price on or before its date with
+        an indexed correlated subquery against the covering (instrument_id, price_date, PRICE) indexes built at
+        load time. Only the reconciled rows come back to Python. As in the pandas engines, a bond price
+        wins over an equity price on the same day, and the last row in source order wins within a table.
+        """
+        numeric = "typeof(PRICE) IN ('integer', 'real')"
+        reconciliation_query = f"""
+        WITH positions AS ({PARTITION_INSTRUMENTS_QUERY if partitioned else INSTRUMENTS_QUERY}),
+        points AS (
+            SELECT instrument_id, eom_date, NULLIF(MAX(
+                COALESCE((SELECT price_date FROM {EQUITY_PRICES}
+                          WHERE instrument_id = p.instrument_id AND price_date <= p.eom_date AND {numeric}
+                          ORDER BY price_date DESC LIMIT 1), ''),
+                COALESCE((SELECT price_date FROM {BOND_PRICES}
+                          WHERE instrument_id = p.instrument_id AND price_date <= p.eom_date AND {numeric}
+                          ORDER BY price_date DESC LIMIT 1), '')
+            ), '') AS match_date
+            FROM (SELECT DISTINCT instrument_id, eom_date FROM positions) p
+        ),
+        matches AS (
+            SELECT instrument_id, eom_date, match_date, COALESCE(
+                (SELECT PRICE FROM {BOND_PRICES}
+                 WHERE instrument_id = m.instrument_id AND price_date = m.match_date AND {numeric}
+                 ORDER BY rowid DESC LIMIT 1),
+                (SELECT PRICE FROM {EQUITY_PRICES}
+                 WHERE instrument_id = m.instrument_id AND price_date = m.match_date AND {numeric}
+                 ORDER BY rowid DESC LIMIT 1)
+            ) AS master_price_filled
+            FROM points m
+        )
+        SELECT
+            p.eom_date,
+            p.financial_type,
+            p.identifier,
+            p.fund_name,
+            p.reported_price,
+            p.instrument_id,
+            m.master_price_filled,
+            m.match_date AS master_price_date
+        FROM positions p
+        LEFT JOIN matches m ON m.instrument_id = p.instrument_id AND m.eom_date = p.eom_date
+        ORDER BY p.fund_name, p.eom_date, p.identifier, p.financial_type, p.reported_price;
+        """
+        final_df = pd.read_sql(reconciliation_query, self.db_manager.conn)
+
+        for col in ['reported_price', 'master_price_filled']:
+            final_df[col] = pd.to_numeric(final_df[col], errors='coerce')
+        for col in ['eom_date', 'master_price_date']:
+            final_df[col] = pd.to_datetime(final_df[col], format='ISO8601').astype('datetime64[ns]')
+        return compact_frame(final_df, CATEGORICAL_COLUMNS, 'Reconciliation')
+
+    def _summarize(self, final_df):
+        """Calculates price differences, logs break statistics per category and selects the output columns."""
+
         # Calculate price differences
         final_df['price_difference'] = (
-            final_df['reported_price'].astype(float) - 
+            final_df['reported_price'].astype(float) -
             final_df['master_price_filled'].astype(float)
         )
-        
+
         # Debug logging
         no_master_price = final_df['master_price_filled'].isna().sum()
         if no_master_price:
@@ -104,28 +540,22 @@ class PriceReconciler:
             LOGGER.debug(final_df[final_df['master_price_filled'].isna()][
                 ['identifier', 'eom_date', 'reported_price']
             ].head())
-        
+
         # Calculate statistics
+        categories = self.breaks.classify(final_df).value_counts(sort=False)
         diff_stats = {
             'total_positions': len(final_df),
-            'positions_with_diffs': (final_df['price_difference'].abs() > 0.0001).sum(),
+            **{f'{category}_positions': count for category, count in categories.items()},
             'max_diff': final_df['price_difference'].abs().max(),
             'mean_diff': final_df['price_difference'].abs().mean()
         }
         LOGGER.info(f"\nPrice difference statistics:\n{pd.Series(diff_stats)}")
-        
+
         # Prepare output
-        output_cols = [
-            'fund_name', 'eom_date', 'financial_type', 'identifier',
-            'reported_price', 'master_price_filled', 'price_difference'
-        ]
-        
-        result_df = final_df[output_cols].copy()
-        
+        result_df = final_df[OUTPUT_COLUMNS].copy()
+
         # Log results
         LOGGER.info(f"Total positions processed: {len(result_df)}")
-        LOGGER.info(f"Positions with price differences: {(result_df['price_difference'].abs() > 0.0001).sum()}")
-        
-        return result_df
+        LOGGER.info(f"Positions with price differences: {categories['tolerance_break']}")
 
- 
\ No newline at end of file
+        return result_df
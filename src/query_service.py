@@ -0,0 +1,184 @@
+# query_service.py
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from src.db_manager import DBManager
+from src.performance_report import PerformanceCalculator
+from src.break_tracker import BREAK_COLUMNS, BROKEN_CATEGORIES
+from config import (LOGGER, DB_NAME, RECON_BREAKS, SERVICE_HOST, SERVICE_PORT, SERVICE_POOL_SIZE,
+                    SERVICE_CACHE_SIZE, SERVICE_MAX_ROWS)
+
+# Breaks are the classified instruments of recon_breaks: by default those BreakTracker found broken against the
+# financial_type tolerances (the partial index covers exactly these rows), or, with a threshold override, those
+# whose price differs from the reference by more than the threshold or that have no master price (NULL difference)
+BROKEN_CONDITION = f"break_category IN ({', '.join(repr(category) for category in BROKEN_CATEGORIES)})"
+THRESHOLD_CONDITION = "(price_difference IS NULL OR ABS(price_difference) > ?)"
+BREAKS_QUERY = f"""
+SELECT {', '.join(BREAK_COLUMNS)} FROM {RECON_BREAKS}
+WHERE {{condition}} {{filters}}
+ORDER BY fund_name, eom_date, identifier
+LIMIT ?;
+"""
+BREAK_FILTERS = {'fund': 'fund_name', 'date': 'eom_date', 'identifier': 'identifier'}
+
+
+class QueryService:
+    """
+    Local HTTP service answering JSON queries on the persisted pipeline results:
+
+        GET /breaks?fund=&date=&identifier=&threshold=&limit=   classified reconciliation breaks with their category,
+                                                                tolerance and age: tolerance breaks and missing
+                                                                references, or with threshold, |difference| >
+                                                                threshold or no master price;
+                                                                1 <= limit <= SERVICE_MAX_ROWS
+        GET /attribution?date=                                  best performing fund per month
+        GET /health                                             data version and cache statistics
+
+    Requests run on pooled read-only connections. Responses are kept in an LRU cache that is dropped whenever
+    another connection commits to the database (PRAGMA data_version changes), e.g. when new partitions are
+    ingested or reconciled.
+    """
+    def __init__(self, db_path=DB_NAME, host=SERVICE_HOST, port=SERVICE_PORT, pool_size=SERVICE_POOL_SIZE,
+                 cache_size=SERVICE_CACHE_SIZE):
+        self.db_manager = DBManager(db_path=db_path, pool_size=pool_size)
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._version_conn = None
+        self._data_version = None
+        # serve_forever is (or was) running; shutdown() would otherwise wait for it forever
+        self._serving = False
+        self.server = ThreadingHTTPServer((host, port), _RequestHandler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        LOGGER.info(f"QueryService initialized on http://{self.address[0]}:{self.address[1]} (cache_size={cache_size}).")
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def serve_forever(self):
+        """Serves until interrupted."""
+        LOGGER.info(f"Serving {self.db_manager.db_path} on http://{self.address[0]}:{self.address[1]}. Press Ctrl+C to stop.")
+        self._serving = True
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            LOGGER.info("Query service stopped.")
+        finally:
+            self.close()
+
+    def start(self):
+        """Serves from a background thread (tests, load tests); stop with close()."""
+        thread = threading.Thread(target=self.server.serve_forever, name='query-service', daemon=True)
+        self._serving = True
+        thread.start()
+        return thread
+
+    def close(self):
+        if self._serving:
+            self.server.shutdown()
+            self._serving = False
+        self.server.server_close()
+        if self._version_conn is not None:
+            self._version_conn.close()
+            self._version_conn = None
+        self.db_manager.disconnect()
+
+    def handle(self, path, params):
+        """Answers a GET request. Returns (status, JSON body bytes); successful query responses are cached."""
+        try:
+            version = self._check_version()
+            if path == '/health':
+                return 200, self._encode({
+                    'status': 'ok', 'data_version': version,
+                    'cache': {'size': len(self._cache), 'hits': self.hits, 'misses': self.misses},
+                })
+            handler = {'/breaks': self._breaks, '/attribution': self._attribution}.get(path)
+            if handler is None:
+                return 404, self._encode({'error': f"Unknown path '{path}'."})
+
+            key = (path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return 200, self._cache[key]
+                self.misses += 1
+            body = self._encode(handler({name: values[-1] for name, values in params.items()}))
+            with self._lock:
+                # A response computed across a data change is not cached; the next request clears the cache
+                if self.cache_size and self._data_version == version:
+                    self._cache[key] = body
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            return 200, body
+        except ValueError as e:
+            return 400, self._encode({'error': str(e)})
+        except sqlite3.Error as e:
+            LOGGER.error(f"Query service request {path} failed: {e}")
+            return 503, self._encode({'error': f"Database unavailable: {e}"})
+
+    def _check_version(self):
+        """Drops the cache when another connection committed since the last request; returns the data version."""
+        with self._lock:
+            if self._version_conn is None:
+                # Open the pool first: its switch to WAL would otherwise count as a change
+                with self.db_manager.connection(readonly=True):
+                    pass
+                self._version_conn = self.db_manager.open_connection(readonly=True)
+            version = self._version_conn.execute("PRAGMA data_version;").fetchone()[0]
+            if version != self._data_version:
+                if self._cache:
+                    LOGGER.info(f"Database changed; dropped {len(self._cache)} cached responses.")
+                self._cache.clear()
+                self._data_version = version
+            return version
+
+    def _breaks(self, params):
+        unknown = set(params) - set(BREAK_FILTERS) - {'threshold', 'limit'}
+        if unknown:
+            raise ValueError(f"Unknown parameters {sorted(unknown)} for /breaks.")
+        threshold = [float(params['threshold'])] if 'threshold' in params else []
+        limit = min(int(params.get('limit', SERVICE_MAX_ROWS)), SERVICE_MAX_ROWS)
+        if limit < 1:
+            raise ValueError("limit must be at least 1.")
+        filters = [name for name in BREAK_FILTERS if name in params]
+        query = BREAKS_QUERY.format(condition=THRESHOLD_CONDITION if threshold else BROKEN_CONDITION,
+                                    filters=''.join(f"AND {BREAK_FILTERS[name]} = ? " for name in filters))
+        with self.db_manager.connection(readonly=True) as conn:
+            cursor = conn.execute(query, [*threshold, *(params[name] for name in filters), limit])
+            rows = [dict(zip(BREAK_COLUMNS, row)) for row in cursor]
+        return {'count': len(rows), 'truncated': len(rows) == limit, 'breaks': rows}
+
+    def _attribution(self, params):
+        with self.db_manager.session(readonly=True) as session:
+            best_df = PerformanceCalculator(session).run_attribution()
+        if 'date' in params and not best_df.empty:
+            best_df = best_df[best_df['eom_date'].astype(str) == params['date']]
+        records = best_df.astype(object).where(best_df.notna(), None).to_dict('records')
+        return {'count': len(records), 'best_performing_funds': records}
+
+    @staticmethod
+    def _encode(payload):
+        return json.dumps(payload, default=str).encode()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        status, body = self.server.service.handle(url.path, parse_qs(url.query))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOGGER.debug(f"{self.address_string()} {format % args}")
@@ -0,0 +1,109 @@
+# reference_cache.py
+import glob
+import os
+import sqlite3
+from datetime import datetime
+from src.db_manager import DBManager
+from config import LOGGER, REFERENCE_STATE, REFERENCE_STATE_FILE, REFERENCE_CACHE_DIR, MASTER_PRICE_TABLES
+
+
+class ReferenceCache:
+    """
+    Caches the loaded and normalized master reference tables as SQLite snapshots keyed by the dump's
+    content hash, so the dump is only executed when it changes.
+    """
+    def __init__(self, db_manager: DBManager, cache_dir=REFERENCE_CACHE_DIR):
+        self.db_manager = db_manager
+        self.cache_dir = cache_dir
+        LOGGER.info("ReferenceCache initialized.")
+
+    def snapshot_path(self, content_hash):
+        return os.path.join(self.cache_dir, f"reference-{content_hash[:16]}.sqlite")
+
+    def is_current(self, content_hash):
+        """True when this database already holds the master price tables loaded from a dump with content_hash."""
+        conn = self.db_manager.conn
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+        if REFERENCE_STATE not in tables or not all(table in tables for table, _ in MASTER_PRICE_TABLES):
+            return False
+        loaded = conn.execute(f"SELECT 1 FROM {REFERENCE_STATE} WHERE content_hash = ?;", (content_hash,)).fetchone()
+        return loaded is not None
+
+    def build_snapshot(self, sql_script_path, snapshot_path, prepare):
+        """
+        Executes the dump into a new snapshot database and applies prepare(conn) to it (e.g. date normalization
+        and indexing). The snapshot is built under a temporary name and moved into place; snapshots of
+        previous dumps are removed.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{snapshot_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        snapshot = DBManager(db_path=tmp_path)
+        snapshot.connect(connector="sqlite3")
+        try:
+            snapshot.execute_script(sql_script_path)
+            prepare(snapshot.conn)
+            snapshot.conn.commit()
+        finally:
+            snapshot.disconnect()
+        os.replace(tmp_path, snapshot_path)
+
+        for stale in glob.glob(os.path.join(self.cache_dir, 'reference-*.sqlite')):
+            if stale != snapshot_path:
+                os.remove(stale)
+        LOGGER.info(f"Built reference snapshot {snapshot_path} from {sql_script_path}.")
+
+    def restore(self, snapshot_path):
+        """
+        Loads the snapshot's tables into this database. An empty database receives the whole snapshot through
+        the SQLite backup API; otherwise the snapshot is attached and its tables replace the ones of the same
+        name, indexes included. Returns 'backup' or 'attach'.
+        """
+        conn = self.db_manager.conn
+        if conn.execute("SELECT COUNT(*) FROM sqlite_master;").fetchone()[0] == 0:
+            source = sqlite3.connect(snapshot_path)
+            try:
+                source.backup(conn)
+            finally:
+                source.close()
+            LOGGER.info(f"Restored reference snapshot {snapshot_path} with the backup API.")
+            return 'backup'
+
+        conn.execute("ATTACH DATABASE ? AS snapshot;", (snapshot_path,))
+        try:
+            objects = conn.execute("""
+            SELECT type, name, sql FROM snapshot.sqlite_master
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+            ORDER BY type = 'index', rowid;
+            """).fetchall()
+            with conn:
+                for obj_type, name, sql in objects:
+                    if obj_type == 'table':
+                        conn.execute(f'DROP TABLE IF EXISTS main."{name}";')
+                        conn.execute(sql)
+                        conn.execute(f'INSERT INTO main."{name}" SELECT * FROM snapshot."{name}";')
+                    elif obj_type == 'index':
+                        conn.execute(sql)
+        finally:
+            conn.execute("DETACH DATABASE snapshot;")
+        LOGGER.info(f"Restored {sum(t == 'table' for t, _, _ in objects)} reference tables from {snapshot_path}.")
+        return 'attach'
+
+    def clear(self):
+        """Forgets the recorded dump, e.g. after the master tables were loaded without the cache."""
+        conn = self.db_manager.conn
+        if conn.execute(f"PRAGMA table_info({REFERENCE_STATE})").fetchall():
+            with conn:
+                conn.execute(f"DELETE FROM {REFERENCE_STATE};")
+
+    def record(self, content_hash, sql_script_path):
+        """Marks the dump with content_hash as the one loaded in this database."""
+        self.db_manager.execute_script(REFERENCE_STATE_FILE)
+        conn = self.db_manager.conn
+        with conn:
+            conn.execute(f"DELETE FROM {REFERENCE_STATE};")
+            conn.execute(
+                f"INSERT INTO {REFERENCE_STATE} (source_path, content_hash, loaded_at) VALUES (?, ?, ?);",
+                (sql_script_path, content_hash, datetime.now().isoformat(timespec='seconds'))
+            )
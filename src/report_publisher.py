@@ -0,0 +1,59 @@
+# report_publisher.py
+import os
+from src.output_writer import OutputWriter
+from src.price_reconciliation import OUTPUT_COLUMNS
+from src.performance_report import PerformanceCalculator
+from src.performance_analytics import PerformanceAnalytics
+from config import (LOGGER, RECON_OUTPUT_LAYOUT, PRICE_RECON_OUTPUT_NAME, BEST_PERFORMING_OUTPUT_NAME,
+                    FUND_METRICS_OUTPUT_NAME, FUND_RETURNS_OUTPUT_NAME, FUND_RANKINGS_OUTPUT_NAME,
+                    POSITION_CONTRIBUTION_OUTPUT_NAME)
+
+
+class ReportPublisher:
+    """
+    Writes the pipeline's reports through an OutputWriter: the reconciliation results, and the attribution
+    reports (best performers, fund metrics, monthly returns, rankings and position contributions).
+
+    The batch pipeline and watch mode both publish through it, so a watched file refreshes the same outputs as a
+    pipeline run. Sources are a PriceReconciler / PerformanceCalculator, or a ShardManager for sharded storage.
+    """
+    def __init__(self, writer: OutputWriter, layout=RECON_OUTPUT_LAYOUT):
+        self.writer = writer
+        self.layout = layout
+
+    def publish_reconciliation(self, reconciler):
+        """
+        Writes the persisted reconciliation results after reconciler.run_incremental. The 'partitioned' layout
+        rewrites the refreshed partitions only (all of them when the output directory is new); the 'single'
+        layout streams every partition into one file.
+        """
+        if self.layout == 'partitioned':
+            refreshed = reconciler.refreshed_partitions
+            if not os.path.isdir(os.path.join(self.writer.output_dir, PRICE_RECON_OUTPUT_NAME)):
+                refreshed = None
+            self.writer.write_partitions(PRICE_RECON_OUTPUT_NAME, reconciler.iter_results(refreshed),
+                                         clear=refreshed or ())
+        else:
+            # Streamed partition by partition into one file, so the history is never held in memory at once
+            self.writer.write_frames((df for _, df in reconciler.iter_results()), PRICE_RECON_OUTPUT_NAME,
+                                     columns=OUTPUT_COLUMNS)
+
+    def publish_attribution(self, source):
+        """
+        Writes the best performer per month, the multi-period fund analytics and the position contributions.
+        The fund-month summaries are read from source once and feed every report.
+        """
+        summary_df = source.load_summary()
+        best_performer_df = PerformanceCalculator(db_manager=None).attribute(summary_df)
+        if not best_performer_df.empty:
+            self.writer.write_table(best_performer_df, BEST_PERFORMING_OUTPUT_NAME)
+        else:
+            LOGGER.warning("No best performer data to save.")
+        analytics = PerformanceAnalytics(summary_df)
+        if len(analytics.funds):
+            self.writer.write_table(analytics.fund_metrics(), FUND_METRICS_OUTPUT_NAME)
+            self.writer.write_table(analytics.monthly_returns(), FUND_RETURNS_OUTPUT_NAME)
+            self.writer.write_table(analytics.rankings(), FUND_RANKINGS_OUTPUT_NAME)
+        contribution_df = source.run_contribution()
+        if not contribution_df.empty:
+            self.writer.write_table(contribution_df, POSITION_CONTRIBUTION_OUTPUT_NAME)
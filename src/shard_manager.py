@@ -0,0 +1,304 @@
+# shard_manager.py
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+import pandas as pd
+from src.db_manager import DBManager
+from src.data_validation import DataValidator
+from src.data_ingestion import DataIngestor
+from src.dimensions import DimensionManager
+from src.price_reconciliation import PriceReconciler
+from src.performance_report import PerformanceCalculator
+from src.metrics import instrument
+from config import (LOGGER, DB_NAME, FUND_POSITIONS, FUND_MONTH_SUMMARY, FUND_POSITION_FILE, DIMENSION_TABLES_FILE,
+                    RECONCILIATION_TABLES_FILE, RECON_STATE_FILE, RECON_ENGINE, SHARD_BY, SHARD_DIR,
+                    SHARD_WORKERS)
+
+SHARD_LAYOUTS = ('fund', 'year')
+# Schema name of the reference database on shard connections
+REFERENCE_ALIAS = 'ref'
+# Schema name of the previous year's shard, attached to carry break ages into a year shard
+PREVIOUS_ALIAS = 'prev'
+
+
+@contextmanager
+def open_shard(shard_path, reference_db_path, readonly=False):
+    """
+    Yields a DBManager connected to the shard file shard_path (created with its tables if new), with the
+    reference database attached. readonly=True opens an existing shard with a mode=ro connection instead and
+    leaves its schema alone, so a read never creates or writes a shard. The connection is closed on exit.
+    """
+    db = DBManager(db_path=shard_path)
+    db.conn = db.open_connection(readonly=readonly)
+    try:
+        db.attach(reference_db_path, REFERENCE_ALIAS)
+        if not readonly:
+            db.execute_script(FUND_POSITION_FILE)
+            db.execute_script(RECONCILIATION_TABLES_FILE)
+        yield db
+    finally:
+        db.conn.close()
+
+
+class ShardManager:
+    """
+    Sharded layout of the fund data: fund_positions and the tables derived from it (fund_month_summary,
+    price_reconciliation and their bookkeeping) live in one SQLite file per fund or per EOM year (shard_by) under
+    shard_dir, while the master prices, the dimension tables and the file manifest stay in the reference database.
+
+    Every shard connection attaches the reference database, so DataIngestor, PriceReconciler and
+    PerformanceCalculator run unchanged on a shard: reference tables resolve to the attached database. Ingestion
+    routes each file to its shard and reconciliation runs per shard, on up to workers processes where every shard
+    is written by a single process. Results are merged across shards.
+    """
+    def __init__(self, reference_db_path=DB_NAME, shard_dir=SHARD_DIR, shard_by=SHARD_BY, workers=SHARD_WORKERS):
+        if shard_by not in SHARD_LAYOUTS:
+            raise ValueError(f"Unknown shard layout '{shard_by}'. Expected one of {SHARD_LAYOUTS}.")
+        self.reference_db_path = reference_db_path
+        self.shard_dir = shard_dir
+        self.shard_by = shard_by
+        self.workers = workers
+        # (fund_name, eom_date) partitions reconciled by the last run_incremental call, across all shards
+        self.refreshed_partitions = []
+        os.makedirs(shard_dir, exist_ok=True)
+        LOGGER.info(f"ShardManager initialized (shard_by={shard_by}, shard_dir={shard_dir}, workers={workers}).")
+
+    def shard_key(self, fund_name, eom_date):
+        """Key of the shard holding the (fund_name, eom_date) partition."""
+        if self.shard_by == 'year':
+            return str(eom_date)[:4]
+        return re.sub(r'[^A-Za-z0-9_.-]+', '_', fund_name).strip('._') or '_'
+
+    def shard_path(self, key):
+        return os.path.join(self.shard_dir, f"{FUND_POSITIONS}-{self.shard_by}={key}.db")
+
+    def shard_keys(self):
+        """Keys of the existing shards of this layout, sorted."""
+        prefix = f"{FUND_POSITIONS}-{self.shard_by}="
+        return sorted(name[len(prefix):-len('.db')] for name in os.listdir(self.shard_dir)
+                      if name.startswith(prefix) and name.endswith('.db'))
+
+    @contextmanager
+    def shard(self, key, readonly=False):
+        """Yields a DBManager on the shard key with the reference database attached; see open_shard."""
+        with open_shard(self.shard_path(key), self.reference_db_path, readonly=readonly) as db:
+            yield db
+
+    @instrument(rows_out=len)
+    def ingest_files(self, entries):
+        """
+        Preprocesses the fund files of the manifest entries (see FileManifest.pending_files) and replaces their
+        (fund_name, eom_date) partitions in their shards. Files are grouped by shard and each shard is loaded by
+        one worker process, so loads into different shards run in parallel; surrogate keys are assigned against
+        the shared dimension tables in short transactions of their own. Returns the loaded entries annotated with
+        fund_name, eom_date and row_count, for FileManifest.record.
+        """
+        reference = DBManager(db_path=self.reference_db_path)
+        reference.connect()
+        reference.execute_script(DIMENSION_TABLES_FILE)
+        reference.disconnect()
+
+        validator = DataValidator(db_manager=None)
+        by_shard = defaultdict(list)
+        for entry in entries:
+            try:
+                fund_name, eom_date = validator._extract_fund_info(entry['file_name'])
+            except Exception as e:
+                LOGGER.error(f"Fatal error processing file {entry['file_name']}: {e}")
+                continue
+            entry.update(fund_name=fund_name, eom_date=eom_date)
+            by_shard[self.shard_key(fund_name, eom_date)].append(entry)
+
+        # Largest shards first, so they do not end up last on a busy pool
+        tasks = sorted(((self.shard_path(key), self.reference_db_path, files) for key, files in by_shard.items()),
+                       key=lambda task: -len(task[2]))
+        processed = []
+        for loaded, errors in self._map_processes(_ingest_shard_task, tasks):
+            processed.extend(loaded)
+            for file_name, error in errors:
+                LOGGER.error(f"Fatal error processing file {file_name}: {error}")
+        LOGGER.info(f"Loaded {len(processed)} fund files into {len(tasks)} '{self.shard_by}' shards.")
+        return processed
+
+    def drop_partitions(self, partitions):
+        """
+        Removes the (fund_name, eom_date) partitions from their shards (DataIngestor.drop_partitions). Shards that
+        do not exist hold nothing to drop and are not created.
+        """
+        by_shard = defaultdict(list)
+        for fund_name, eom_date in partitions:
+            by_shard[self.shard_key(fund_name, eom_date)].append((fund_name, eom_date))
+        for key in set(by_shard) & set(self.shard_keys()):
+            with self.shard(key) as db:
+                DataIngestor(db_manager=db).drop_partitions(by_shard[key])
+
+    @instrument()
+    def run_incremental(self, engine=RECON_ENGINE):
+        """
+        Runs PriceReconciler.run_incremental on every shard, in parallel processes. The master price digest and
+        the break tolerances are checked once against the reference database here, and each shard queues its
+        partitions holding the changed instruments, or all of them when the tolerances changed; the new state is
+        stored once every shard has reconciled. Results are persisted in the
+        shards; returns the refreshed (fund_name, eom_date) partitions of all shards, also kept in
+        self.refreshed_partitions.
+        """
+        reference = DBManager(db_path=self.reference_db_path)
+        reference.connect()
+        try:
+            reference.execute_script(RECON_STATE_FILE)
+            reconciler = PriceReconciler(db_manager=reference)
+            with reference.conn as conn:
+                master_changes = reconciler.master_changes(conn)
+                reclassify = reconciler.tolerances_changed(conn)
+            tasks = [(self.shard_path(key), self.reference_db_path, engine, master_changes, reclassify)
+                     for key in self.shard_keys()]
+            self.refreshed_partitions = sorted(
+                partition for partitions in self._map_processes(_reconcile_shard_task, tasks)
+                for partition in partitions
+            )
+            with reference.conn as conn:
+                reconciler.store_state(conn)
+        finally:
+            reference.disconnect()
+        if self.shard_by == 'year':
+            self._carry_break_ages(self.refreshed_partitions)
+        LOGGER.info(f"Reconciled {len(self.refreshed_partitions)} partitions across {len(tasks)} shards.")
+        return self.refreshed_partitions
+
+    def _carry_break_ages(self, refreshed):
+        """
+        Year shards age breaks within their year, so a run broken in December would restart in January. For every
+        fund with refreshed partitions in a year shard or an earlier one, its first month in the shard is classified
+        again with the previous year's shard attached as history, which continues the runs and re-ages the rest of
+        that year. Shards are visited in year order so the carried ages reach every later year.
+        """
+        keys = self.shard_keys()
+        funds = set()
+        for previous, key in zip(keys, keys[1:]):
+            funds.update(fund_name for fund_name, eom_date in refreshed if self.shard_key(fund_name, eom_date) <= key)
+            if not funds:
+                continue
+            with self.shard(key) as db:
+                db.attach(self.shard_path(previous), PREVIOUS_ALIAS)
+                first_months = db.conn.execute(
+                    f"SELECT fund_name, MIN(eom_date) FROM {FUND_MONTH_SUMMARY} GROUP BY fund_name;").fetchall()
+                first_months = [(fund_name, eom_date) for fund_name, eom_date in first_months if fund_name in funds]
+                if first_months:
+                    PriceReconciler(db_manager=db).restore_breaks(first_months, history=PREVIOUS_ALIAS)
+                    LOGGER.info(f"Carried break ages of {len(first_months)} funds from shard {previous} into {key}.")
+
+    def iter_results(self, partitions=None):
+        """
+        Streams the persisted reconciliation results shard by shard as ((fund_name, eom_date), df), like
+        PriceReconciler.iter_results; partitions restricts them to the given (fund_name, eom_date) pairs.
+        """
+        by_shard = None
+        if partitions is not None:
+            by_shard = defaultdict(list)
+            for fund_name, eom_date in partitions:
+                by_shard[self.shard_key(fund_name, eom_date)].append((fund_name, eom_date))
+        for key in self.shard_keys():
+            if by_shard is not None and key not in by_shard:
+                continue
+            with self.shard(key, readonly=True) as db:
+                yield from PriceReconciler(db).iter_results(None if by_shard is None else by_shard[key])
+
+    def load_results(self):
+        """Returns the persisted reconciliation rows of all shards, read in parallel and ordered as one table."""
+        frames = self._map_shards(lambda db: PriceReconciler(db).load_results())
+        if not frames:
+            return pd.DataFrame()
+        return (pd.concat(frames, ignore_index=True)
+                .sort_values(['fund_name', 'eom_date', 'identifier', 'financial_type', 'reported_price'],
+                             ignore_index=True))
+
+    @instrument(rows_out=len)
+    def run_attribution(self):
+        """
+        Best performing fund per month across all shards. The fund-month summaries are read from the shards in
+        parallel and merged before the rates of return are computed, so a fund whose months are spread over
+        several year shards still gets its month-on-month return.
+        """
+        return PerformanceCalculator(db_manager=None).attribute(self.load_summary())
+
+    @instrument(rows_out=len)
+    def run_contribution(self):
+        """
+        Position-level contributions to the funds' RoR across all shards (PerformanceCalculator.contribute). The
+        positions and summaries are merged first, so positions are aligned with their previous month also when
+        it lives in another year shard.
+        """
+        frames = [df for df in self._map_shards(lambda db: PerformanceCalculator(db).load_positions()) if not df.empty]
+        positions_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return PerformanceCalculator(db_manager=None).contribute(positions_df, self.load_summary())
+
+    def load_summary(self):
+        """The fund_month_summary rows of all shards, read in parallel and ordered as PerformanceCalculator.load_summary."""
+        frames = [df for df in self._map_shards(lambda db: PerformanceCalculator(db).load_summary()) if not df.empty]
+        if not frames:
+            return pd.DataFrame(columns=['eom_date', 'fund_name', 'fund_mv_end', 'realized_p_l'])
+        return pd.concat(frames, ignore_index=True).sort_values(['eom_date', 'fund_name'], ignore_index=True)
+
+    def _map_shards(self, func):
+        """Returns [func(db) for each shard], run on a thread pool with one read-only connection per shard."""
+        def work(key):
+            with self.shard(key, readonly=True) as db:
+                return func(db)
+
+        keys = self.shard_keys()
+        if self.workers <= 1 or len(keys) <= 1:
+            return [work(key) for key in keys]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(keys)), thread_name_prefix='shard') as pool:
+            return list(pool.map(work, keys))
+
+    def _map_processes(self, task, args):
+        """Returns [task(arg) for arg in args], over a process pool when workers > 1."""
+        if self.workers <= 1 or len(args) <= 1:
+            return [task(arg) for arg in args]
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(args))) as pool:
+            return list(pool.map(task, args))
+
+
+def _ingest_shard_task(task):
+    """
+    Process-pool task of ShardManager.ingest_files: loads the files of one shard.
+    Returns (loaded entries, [(file_name, error)]).
+    """
+    shard_path, reference_db_path, entries = task
+    validator = DataValidator(db_manager=None)
+    reference = DBManager(db_path=reference_db_path)
+    reference.conn = reference.open_connection()
+    dimensions = DimensionManager(reference)
+    loaded, errors = [], []
+    try:
+        with open_shard(shard_path, reference_db_path) as db:
+            ingestor = DataIngestor(db_manager=db)
+            for entry in entries:
+                try:
+                    fund_name, eom_date, df = validator.preprocess_file(entry['file_path'])
+                    # The shard load below then never writes to the reference database, so shards load concurrently
+                    with reference.transaction(immediate=True) as conn:
+                        df = dimensions.annotate_positions(df, conn)
+                    ingestor.replace_partitions(df, FUND_POSITIONS, [(fund_name, eom_date)])
+                except Exception as e:
+                    errors.append((entry['file_name'], str(e)))
+                    continue
+                entry['row_count'] = len(df)
+                loaded.append(entry)
+    finally:
+        reference.conn.close()
+    return loaded, errors
+
+
+def _reconcile_shard_task(task):
+    """
+    Process-pool task of ShardManager.run_incremental: reconciles one shard with the master_changes and
+    reclassify signals computed by the parent. Returns the partitions reconciled in the shard.
+    """
+    shard_path, reference_db_path, engine, master_changes, reclassify = task
+    with open_shard(shard_path, reference_db_path) as db:
+        reconciler = PriceReconciler(db_manager=db, engine=engine)
+        reconciler.run_incremental(master_changes=master_changes, reclassify=reclassify)
+        return reconciler.refreshed_partitions
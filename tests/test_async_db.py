@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+from src.async_db import AsyncDBManager
+from src.db_manager import DBManager
+
+# A read that keeps SQLite busy for a while without holding the GIL
+SLOW_COUNT = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < ?) SELECT COUNT(*) FROM c;"
+
+
+class CountingDBManager(DBManager):
+    """Records how many pooled connections are borrowed at the same time."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = 0
+        self.max_active = 0
+        self._count_lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, readonly=False):
+        with super().connection(readonly) as conn:
+            with self._count_lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            try:
+                yield conn
+            finally:
+                with self._count_lock:
+                    self.active -= 1
+
+
+@pytest.fixture
+def pooled_db(tmp_path):
+    db = CountingDBManager(db_path=str(tmp_path / 'async.db'), pool_size=4)
+    with db.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER);")
+        conn.executemany("INSERT INTO t VALUES (?);", [(i,) for i in range(2500)])
+    yield db
+    db.disconnect()
+
+
+def test_concurrent_reads_do_not_block_the_event_loop(pooled_db):
+    async def scenario():
+        ticks = 0
+        stop = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not stop.is_set():
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        async with AsyncDBManager(pooled_db, max_workers=4) as adb:
+            tick_task = asyncio.create_task(ticker())
+            counts = await asyncio.gather(*(adb.execute(SLOW_COUNT, (1_500_000,), readonly=True) for _ in range(4)))
+            df = await adb.fetch_df("SELECT x FROM t WHERE x < ?;", params=(10,))
+            streamed = [row async for row in adb.stream("SELECT x FROM t ORDER BY x;", batch_size=100)]
+            assert await adb.execute("DELETE FROM t WHERE x >= ?;", (2000,)) == 500
+            stop.set()
+            await tick_task
+        return ticks, counts, df, streamed
+
+    ticks, counts, df, streamed = asyncio.run(scenario())
+    assert counts == [[(1_500_000,)]] * 4
+    assert pooled_db.max_active > 1
+    assert ticks > 5
+    assert df['x'].tolist() == list(range(10))
+    assert [x for (x,) in streamed] == list(range(2500))
+
+
+def test_cancelling_a_query_interrupts_it_and_frees_the_connection(tmp_path):
+    db = DBManager(db_path=str(tmp_path / 'cancel.db'), pool_size=1)
+
+    async def scenario():
+        async with AsyncDBManager(db, max_workers=2) as adb:
+            task = asyncio.create_task(adb.execute(SLOW_COUNT, (10 ** 12,), readonly=True))
+            await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # The only read-only connection is back in the pool and usable
+            rows = await asyncio.wait_for(adb.execute("SELECT 1;", readonly=True), timeout=5)
+            return rows, time.perf_counter() - start
+
+    rows, elapsed = asyncio.run(scenario())
+    assert rows == [(1,)]
+    assert elapsed < 5
+    db.disconnect()
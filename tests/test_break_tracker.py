@@ -0,0 +1,104 @@
+import pytest
+import pandas as pd
+from src.break_tracker import BreakTracker
+from src.price_reconciliation import PriceReconciler
+from src.data_ingestion import DataIngestor
+
+
+def load_month(db_manager, eom_date, prices):
+    """Replaces Fund A's eom_date partition with positions {symbol: (financial_type, price)}."""
+    df = pd.DataFrame({
+        'fund_name': 'Fund A',
+        'eom_date': eom_date,
+        'financial_type': [financial_type for financial_type, _ in prices.values()],
+        'symbol': list(prices),
+        'price': [price for _, price in prices.values()],
+        'market_value': 1000.0,
+        'realised_p_l': 0.0,
+    })
+    DataIngestor(db_manager).replace_partitions(df, 'fund_positions', [('Fund A', eom_date)])
+
+
+def load_breaks(db_manager):
+    breaks = pd.read_sql("SELECT * FROM recon_breaks ORDER BY identifier, eom_date", db_manager.conn)
+    return breaks.set_index(['identifier', 'eom_date'])
+
+
+@pytest.fixture
+def breaks_db(db_manager):
+    """Fund A holding AAPL (priced at month end), GOOGL (priced mid-month), BOND1 and an unpriced XYZ."""
+    db_manager.execute_script('sql/create_fund_position_table.sql')
+    db_manager.conn.executescript("""
+    CREATE TABLE equity_prices (DATETIME TEXT, SYMBOL TEXT, PRICE REAL);
+    CREATE TABLE bond_prices (DATETIME TEXT, ISIN TEXT, PRICE REAL);
+    INSERT INTO equity_prices VALUES
+        ('2023-01-31', 'AAPL', 100.0), ('2023-02-28', 'AAPL', 100.0), ('2023-03-31', 'AAPL', 100.0),
+        ('2023-04-30', 'AAPL', 100.0), ('2023-05-31', 'AAPL', 100.0), ('2023-01-15', 'GOOGL', 50.0);
+    INSERT INTO bond_prices VALUES ('2023-01-31', 'BOND1', 100.0);
+    """)
+    DataIngestor(db_manager).prepare_master_prices()
+    for eom_date, aapl in [('2023-01-31', 100.0), ('2023-02-28', 101.0), ('2023-03-31', 102.0), ('2023-04-30', 103.0)]:
+        load_month(db_manager, eom_date, {'AAPL': ('Equities', aapl), 'GOOGL': ('Equities', 50.0),
+                                          'BOND1': ('Government Bond', 100.5), 'XYZ': ('Equities', 10.0)})
+    return db_manager
+
+
+def test_classify_with_tolerances_per_financial_type():
+    tracker = BreakTracker({'default': {'abs': 0.0001}, 'Government Bond': {'abs': 0.0, 'rel': 0.01}})
+    df = pd.DataFrame({
+        'eom_date': pd.to_datetime(['2023-01-31'] * 5),
+        'financial_type': ['Equities', 'Equities', 'Equities', 'Government Bond', 'Equities'],
+        'reported_price': [100.0, 50.0, 100.5, 100.5, 10.0],
+        'master_price_filled': [100.0, 50.0, 100.0, 100.0, float('nan')],
+        'master_price_date': pd.to_datetime(['2023-01-31', '2023-01-15', '2023-01-31', '2023-01-31', None]),
+    })
+    assert tracker.tolerance(df).tolist() == [0.0001, 0.0001, 0.0001, 1.0, 0.0001]
+    assert tracker.classify(df).tolist() == ['exact', 'lap_used', 'tolerance_break', 'exact', 'missing_reference']
+
+
+def test_break_aging_is_incremental(breaks_db):
+    """Ages continue from the stored previous month; reconciling an earlier month again re-ages the later ones."""
+    reconciler = PriceReconciler(breaks_db)
+    reconciler.breaks = BreakTracker({'default': {'abs': 0.0001}, 'Government Bond': {'rel': 0.01}})
+    reconciler.run_incremental()
+    breaks = load_breaks(breaks_db)
+    assert len(breaks) == 16
+    assert breaks.loc[('GOOGL', '2023-03-31'), 'break_category'] == 'lap_used'
+    assert breaks.loc[('BOND1', '2023-03-31'), 'break_category'] == 'lap_used'
+    assert breaks.xs('AAPL')['break_age'].tolist() == [0, 1, 2, 3]
+    assert breaks.xs('XYZ')['break_category'].unique().tolist() == ['missing_reference']
+    assert breaks.xs('XYZ')['break_age'].tolist() == [1, 2, 3, 4]
+    assert (breaks.xs('GOOGL')['break_age'] == 0).all()
+
+    # A new month only reconciles its own partition and continues from April's ages
+    load_month(breaks_db, '2023-05-31', {'AAPL': ('Equities', 104.0), 'XYZ': ('Equities', 10.0)})
+    reconciler.run_incremental()
+    assert reconciler.refreshed_partitions == [('Fund A', '2023-05-31')]
+    breaks = load_breaks(breaks_db)
+    assert breaks.loc[('AAPL', '2023-05-31'), 'break_age'] == 4
+    assert breaks.loc[('XYZ', '2023-05-31'), 'break_age'] == 5
+
+    # A corrected February closes the AAPL break there and restarts the later months' count
+    load_month(breaks_db, '2023-02-28', {'AAPL': ('Equities', 100.0), 'GOOGL': ('Equities', 50.0),
+                                         'BOND1': ('Government Bond', 100.5), 'XYZ': ('Equities', 10.0)})
+    reconciler.run_incremental()
+    breaks = load_breaks(breaks_db)
+    assert breaks.xs('AAPL')['break_age'].tolist() == [0, 0, 1, 2, 3]
+    assert breaks.xs('XYZ')['break_age'].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_changed_tolerances_reclassify_stored_breaks(breaks_db):
+    """Stored classifications made with other tolerances are recomputed for every partition."""
+    reconciler = PriceReconciler(breaks_db)
+    reconciler.run_incremental()
+    assert reconciler.run_incremental().empty
+    assert load_breaks(breaks_db).xs('AAPL')['break_category'].tolist() == ['exact'] + ['tolerance_break'] * 3
+
+    reconciler.breaks = BreakTracker({'default': {'abs': 5.0}})
+    reconciler.run_incremental()
+    assert len(reconciler.refreshed_partitions) == 4
+    breaks = load_breaks(breaks_db)
+    assert breaks.xs('AAPL')['break_category'].tolist() == ['exact'] * 4
+    assert breaks.xs('AAPL')['break_age'].tolist() == [0, 0, 0, 0]
+    assert breaks.xs('XYZ')['break_age'].tolist() == [1, 2, 3, 4]
+    assert reconciler.run_incremental().empty
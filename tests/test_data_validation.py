@@ -56,4 +56,18 @@ def test_preprocess_dataframe(sample_unprocessed_fund_data):
     
     # Verify numeric columns
     assert pd.api.types.is_numeric_dtype(processed_df['market_value'])
-    assert pd.api.types.is_numeric_dtype(processed_df['price'])
\ No newline at end of file
+    assert pd.api.types.is_numeric_dtype(processed_df['price'])
+
+def test_batch_preprocessing_parallel_matches_serial(tmp_path, mock_db_manager):
+    """Process-pool preprocessing returns the same rows, in the same order, as the serial path; bad files are skipped."""
+    header = "FINANCIAL TYPE,SYMBOL,SECURITY NAME,PRICE,QUANTITY,REALISED P/L,MARKET VALUE\n"
+    for i, name in enumerate(['FundB.2023-01-31.csv', 'rpt-FundA.2023-02-28.csv', 'TT_monthly_FundC.20230331.csv']):
+        (tmp_path / name).write_text(header + f"Equities,X_AAPL,APPLE INC,{150 + i},10,5,{1500 + i}\n")
+    (tmp_path / 'no-date-here.csv').write_text(header)
+
+    validator = DataValidator(db_manager=mock_db_manager)
+    serial_df = validator.batch_preprocessing_csv(str(tmp_path), 'unused.sql', workers=1)
+    parallel_df = validator.batch_preprocessing_csv(str(tmp_path), 'unused.sql', workers=2)
+
+    pd.testing.assert_frame_equal(serial_df, parallel_df)
+    assert list(serial_df['fund_name']) == ['FundB', 'FundC', 'FundA']  # sorted filename order
@@ -29,3 +29,175 @@ def test_master_data_ingestion(db_manager):
     sql_fp= os.path.join('sql','master-reference-sql.sql')
     assert ingestor.ingest_master_data(sql_fp) == True
 
+
+
+def test_replace_partitions(db_manager, sample_fund_data):
+    """Replacing a partition removes its old rows and leaves other partitions untouched."""
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    ingestor = DataIngestor(db_manager)
+    ingestor.replace_partitions(sample_fund_data, 'fund_positions', [('A', '2023-01-31'), ('B', '2023-01-31')])
+
+    resubmitted = sample_fund_data[sample_fund_data['fund_name'] == 'A'].assign(market_value=1500.0)
+    ingestor.replace_partitions(resubmitted, 'fund_positions', [('A', '2023-01-31')])
+
+    rows = db_manager.execute_sql_string("SELECT fund_name, market_value FROM fund_positions ORDER BY fund_name")
+    assert rows == [{'fund_name': 'A', 'market_value': 1500.0}, {'fund_name': 'B', 'market_value': 2000.0}]
+
+
+def test_ingest_stream_rolls_back_failed_file(db_manager, tmp_path):
+    """Streamed files are written chunk by chunk; a file that fails midway leaves its partition untouched."""
+    from src.data_validation import DataValidator
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    header = "SYMBOL,PRICE,QUANTITY,REALISED P/L,MARKET VALUE\n"
+    (tmp_path / 'FundA.2023-01-31.csv').write_text(header + ''.join(f"S{i},1,1,0,{i}\n" for i in range(5)))
+    ingestor = DataIngestor(db_manager)
+    ingestor.replace_partitions(pd.DataFrame({'fund_name': ['FundB'], 'eom_date': ['2023-01-31'], 'symbol': ['OLD'],
+                                              'market_value': [1.0], 'realised_p_l': [0.0]}),
+                                'fund_positions', [('FundB', '2023-01-31')])
+    # A truncated upload: the third row opens a quote that never closes, so the second chunk fails to parse
+    # after the first was written
+    (tmp_path / 'FundB.2023-01-31.csv').write_text(header + 'S1,1,1,0,1\nS2,1,1,0,2\n"S3,1,1,0,3\n')
+    entries = [{'file_name': p.name, 'file_path': str(p)} for p in sorted(tmp_path.iterdir())]
+
+    validator = DataValidator(db_manager)
+    ingested = ingestor.ingest_stream(validator.stream_preprocessing_csv(entries, chunksize=2), 'fund_positions')
+
+    assert [(e['fund_name'], e['row_count']) for e in ingested] == [('FundA', 5)]
+    rows = db_manager.execute_sql_string("SELECT fund_name, symbol FROM fund_positions WHERE fund_name = 'FundB'")
+    assert rows == [{'fund_name': 'FundB', 'symbol': 'OLD'}]
+
+
+def test_ingest_stream_matches_batch_on_blank_chunk(db_manager, tmp_path):
+    """A chunk whose market values or symbols are all blank is preprocessed like the rest of its file."""
+    from src.data_validation import DataValidator
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    path = tmp_path / 'FundB.2023-01-31.csv'
+    path.write_text("SYMBOL,ISIN,PRICE,QUANTITY,REALISED P/L,MARKET VALUE\n"
+                    "S1,,1,1,0,1\nS2,,1,1,0,2\nS3,,1,1,0,\nS4,,1,1,0,\n,B5,1,1,0,5\n")
+    validator = DataValidator(db_manager)
+    ingestor = DataIngestor(db_manager)
+    query = "SELECT symbol, isin, market_value FROM fund_positions ORDER BY symbol, isin"
+
+    ingested = ingestor.ingest_stream(
+        validator.stream_preprocessing_csv([{'file_name': path.name, 'file_path': str(path)}], chunksize=2),
+        'fund_positions'
+    )
+    assert [(e['fund_name'], e['row_count']) for e in ingested] == [('FundB', 3)]
+    streamed = db_manager.execute_sql_string(query)
+
+    fund_name, eom_date, df = validator.preprocess_file(str(path))
+    ingestor.replace_partitions(df, 'fund_positions', [(fund_name, eom_date)])
+    assert db_manager.execute_sql_string(query) == streamed == [
+        {'symbol': None, 'isin': 'B5', 'market_value': 5.0},
+        {'symbol': 'S1', 'isin': None, 'market_value': 1.0}, {'symbol': 'S2', 'isin': None, 'market_value': 2.0}]
+
+
+def test_ingest_stream_matches_batch_on_repeated_keys(db_manager, tmp_path):
+    """A file repeating a (fund, eom_date, symbol) key keeps its last row in both the streaming and batch loaders."""
+    from src.data_validation import DataValidator
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    path = tmp_path / 'FundB.2023-01-31.csv'
+    path.write_text("SYMBOL,PRICE,QUANTITY,REALISED P/L,MARKET VALUE\nS1,1,1,0,1\nS2,1,1,0,2\nS1,1,1,0,3\n")
+    validator = DataValidator(db_manager)
+    ingestor = DataIngestor(db_manager)
+    query = "SELECT symbol, market_value FROM fund_positions ORDER BY symbol"
+
+    ingested = ingestor.ingest_stream(
+        validator.stream_preprocessing_csv([{'file_name': path.name, 'file_path': str(path)}], chunksize=2),
+        'fund_positions'
+    )
+    assert [e['fund_name'] for e in ingested] == ['FundB']
+    streamed = db_manager.execute_sql_string(query)
+
+    fund_name, eom_date, df = validator.preprocess_file(str(path))
+    ingestor.replace_partitions(df, 'fund_positions', [(fund_name, eom_date)])
+    assert db_manager.execute_sql_string(query) == streamed == [
+        {'symbol': 'S1', 'market_value': 3.0}, {'symbol': 'S2', 'market_value': 2.0}]
+
+
+def test_bulk_upsert_resubmitted_rows(db_manager, sample_fund_data):
+    """Upserting rows that already exist updates them instead of violating the primary key."""
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    ingestor = DataIngestor(db_manager)
+    assert ingestor.ingest_dataframe(sample_fund_data, 'fund_positions', mode='upsert') == True
+
+    resubmitted = sample_fund_data.assign(price=[101.0, 201.0])
+    assert ingestor.bulk_upsert_dataframe(resubmitted, 'fund_positions', batch_size=1) == True
+
+    rows = db_manager.execute_sql_string("SELECT fund_name, price FROM fund_positions ORDER BY fund_name")
+    assert rows == [{'fund_name': 'A', 'price': 101.0}, {'fund_name': 'B', 'price': 201.0}]
+    # Load PRAGMAs are restored afterwards
+    assert db_manager.conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+
+def test_prepare_master_prices(db_manager):
+    """Master prices get a normalized ISO price_date, trimmed identifiers and a covering index."""
+    db_manager.conn.executescript("""
+    CREATE TABLE equity_prices (DATETIME TEXT, SYMBOL TEXT, PRICE REAL);
+    CREATE TABLE bond_prices (DATETIME TEXT, ISIN TEXT, PRICE REAL);
+    INSERT INTO equity_prices VALUES ('01/31/2023', ' AAPL ', 150.0), ('2023-02-28 00:00:00', 'AAPL', 155.0);
+    INSERT INTO bond_prices VALUES ('2023-01-31', 'BOND1', 96.0);
+    """)
+    DataIngestor(db_manager).prepare_master_prices()
+
+    rows = db_manager.execute_sql_string("SELECT SYMBOL, price_date FROM equity_prices ORDER BY price_date")
+    assert rows == [{'SYMBOL': 'AAPL', 'price_date': '2023-01-31'}, {'SYMBOL': 'AAPL', 'price_date': '2023-02-28'}]
+    plan = db_manager.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT PRICE FROM equity_prices WHERE SYMBOL = 'AAPL' AND price_date <= '2023-02-01'"
+    ).fetchall()
+    assert 'COVERING INDEX idx_equity_prices_symbol_date' in plan[0][-1]
+
+
+def test_positions_get_surrogate_keys(db_manager, sample_fund_data):
+    """Loaded positions carry fund_id/instrument_id from the dimension tables, stable across reloads."""
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    ingestor = DataIngestor(db_manager)
+    ingestor.replace_partitions(sample_fund_data, 'fund_positions', [('A', '2023-01-31'), ('B', '2023-01-31')])
+    ingestor.replace_partitions(sample_fund_data.assign(eom_date='2023-02-28'), 'fund_positions',
+                                [('A', '2023-02-28'), ('B', '2023-02-28')])
+
+    rows = db_manager.execute_sql_string("""
+    SELECT p.eom_date, f.fund_name, i.identifier
+    FROM fund_positions p
+    JOIN dim_fund f ON f.fund_id = p.fund_id
+    JOIN dim_instrument i ON i.instrument_id = p.instrument_id
+    ORDER BY p.eom_date, f.fund_name
+    """)
+    assert [(r['fund_name'], r['identifier']) for r in rows] == [('A', 'AAPL'), ('B', 'GOOGL')] * 2
+    assert db_manager.execute_sql_string("SELECT COUNT(*) AS n FROM dim_instrument") == [{'n': 2}]
+
+
+def test_ingest_master_data_uses_reference_snapshot(tmp_path, caplog):
+    """The dump is executed once per content hash; later loads restore the cached snapshot or skip entirely."""
+    from src.db_manager import DBManager
+    dump = tmp_path / 'master.sql'
+    dump.write_text("""
+    DROP TABLE IF EXISTS equity_prices; DROP TABLE IF EXISTS bond_prices;
+    CREATE TABLE equity_prices (DATETIME TEXT, SYMBOL TEXT, PRICE REAL);
+    CREATE TABLE bond_prices (DATETIME TEXT, ISIN TEXT, PRICE REAL);
+    INSERT INTO equity_prices VALUES ('01/31/2023', ' AAPL ', 150.0);
+    INSERT INTO bond_prices VALUES ('2023-01-31', 'BOND1', 96.0);
+    """)
+
+    def load(db_path):
+        db = DBManager(db_path=str(db_path))
+        db.connect(connector="sqlite3")
+        caplog.clear()
+        DataIngestor(db).ingest_master_data(str(dump), cache_dir=str(tmp_path / 'cache'))
+        rows = db.execute_sql_string("SELECT SYMBOL, price_date, instrument_id FROM equity_prices")
+        db.disconnect()
+        return rows
+
+    assert load(tmp_path / 'first.db') == [{'SYMBOL': 'AAPL', 'price_date': '2023-01-31', 'instrument_id': 1}]
+    assert 'Built reference snapshot' in caplog.text
+    # Same dump, same database: nothing to load
+    load(tmp_path / 'first.db')
+    assert 'skipping load' in caplog.text
+    # Same dump, new database: restored from the snapshot without executing the dump
+    assert load(tmp_path / 'second.db') == [{'SYMBOL': 'AAPL', 'price_date': '2023-01-31', 'instrument_id': 1}]
+    assert 'backup API' in caplog.text and 'Built reference snapshot' not in caplog.text
+    # Changed dump: rebuilt and swapped into the existing database
+    dump.write_text(dump.read_text().replace('150.0', '151.0'))
+    load(tmp_path / 'first.db')
+    assert 'Built reference snapshot' in caplog.text and 'Restored 2 reference tables' in caplog.text
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
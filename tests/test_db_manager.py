@@ -8,4 +8,80 @@ def test_database_connection(db_manager):
 def test_database_disconnect(db_manager):
     """Test database disconnect functionality"""
     db_manager.disconnect()
-    assert db_manager.conn is None
\ No newline at end of file
+    assert db_manager.conn is None
+
+def test_pooled_connections_per_thread_and_read_only(tmp_path):
+    import sqlite3
+    import threading
+    db = DBManager(db_path=str(tmp_path / 'pool.db'), pool_size=2)
+    with db.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER);")
+        conn.execute("INSERT INTO t VALUES (1);")
+        assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == 'wal'
+
+    # Two threads inside the pool at the same time hold different connections
+    barrier = threading.Barrier(2, timeout=5)
+    borrowed = []
+
+    def reader():
+        with db.connection(readonly=True) as conn:
+            barrier.wait()
+            borrowed.append((conn, conn.execute("SELECT x FROM t;").fetchone()[0]))
+            barrier.wait()
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert borrowed[0][0] is not borrowed[1][0] and [x for _, x in borrowed] == [1, 1]
+
+    # Read-only connections reject writes, and returned connections are reused
+    with db.session(readonly=True) as session:
+        with pytest.raises(sqlite3.OperationalError):
+            session.conn.execute("INSERT INTO t VALUES (2);")
+        assert session.conn in [conn for conn, _ in borrowed]
+    db.disconnect()
+
+
+def test_pool_requires_a_database_file():
+    with pytest.raises(ValueError):
+        DBManager(db_path=':memory:', pool_size=2)
+
+
+def test_iter_batches_streams_tuples_columns_and_frames(db_manager):
+    db_manager.conn.execute("CREATE TABLE t (x INTEGER, name TEXT);")
+    db_manager.conn.executemany("INSERT INTO t VALUES (?, ?);", [(i, None if i == 3 else f"n{i}") for i in range(5)])
+    query = "SELECT x, name FROM t WHERE x >= ? ORDER BY x;"
+
+    batches = list(db_manager.iter_batches(query, (0,), batch_size=2))
+    assert batches == [[(0, 'n0'), (1, 'n1')], [(2, 'n2'), (3, None)], [(4, 'n4')]]
+
+    columns = list(db_manager.iter_batches(query, (2,), batch_size=2, fmt='numpy'))
+    assert columns[0]['x'].tolist() == [2, 3] and columns[0]['x'].dtype.kind == 'i'
+    assert columns[0]['name'].tolist() == ['n2', None]
+
+    frames = list(db_manager.iter_batches(query, (1,), batch_size=3, fmt='dataframe'))
+    assert [len(df) for df in frames] == [3, 1]
+    assert list(frames[0].columns) == ['x', 'name']
+    with pytest.raises(ValueError):
+        next(db_manager.iter_batches(query, (0,), fmt='dicts'))
+
+
+def test_transactions_nest_and_executemany_batches(db_manager):
+    db_manager.execute("CREATE TABLE t (x INTEGER PRIMARY KEY);")
+    assert db_manager.executemany("INSERT INTO t VALUES (?);", ((i,) for i in range(25)), batch_size=10) == 25
+
+    with db_manager.transaction():
+        db_manager.execute("DELETE FROM t WHERE x < ?;", (5,))
+        # A failing nested helper only rolls back its own savepoint
+        with pytest.raises(Exception):
+            with db_manager.transaction():
+                db_manager.execute("DELETE FROM t;")
+                raise RuntimeError("abort nested")
+    assert db_manager.execute("SELECT COUNT(*) FROM t;").fetchone()[0] == 20
+    assert not db_manager.conn.in_transaction
+
+    with pytest.raises(Exception):
+        db_manager.executemany("INSERT INTO t VALUES (?);", [(100,), (5,), (5,)])
+    assert db_manager.execute_sql_string("SELECT COUNT(*) AS n FROM t WHERE x >= ?;", (5,)) == [{'n': 20}]
@@ -0,0 +1,81 @@
+import os
+import pytest
+from src.file_manifest import FileManifest
+
+
+@pytest.fixture
+def manifest(db_manager):
+    return FileManifest(db_manager)
+
+
+@pytest.fixture
+def funds_dir(tmp_path):
+    (tmp_path / "FundA.2023-01-31.csv").write_text("SYMBOL,PRICE,MARKET VALUE,REALISED P/L\nAAPL,1,10,0\n")
+    (tmp_path / "notes.txt").write_text("not a fund file")
+    return tmp_path
+
+
+def _record(manifest, entries):
+    for e in entries:
+        e.update(fund_name='FundA', eom_date='2023-01-31', row_count=1)
+    manifest.record(entries)
+
+
+def test_pending_files_skips_recorded_files(manifest, funds_dir):
+    """New files are pending once; after recording they are skipped until their content changes."""
+    pending = manifest.pending_files(str(funds_dir))
+    assert [e['file_name'] for e in pending] == ['FundA.2023-01-31.csv']
+    assert pending[0]['status'] == 'new'
+
+    _record(manifest, pending)
+    assert manifest.pending_files(str(funds_dir)) == []
+
+    # Touching the file without changing its content is not a change
+    fp = funds_dir / "FundA.2023-01-31.csv"
+    os.utime(fp, (1, 1))
+    assert manifest.pending_files(str(funds_dir)) == []
+
+    fp.write_text("SYMBOL,PRICE,MARKET VALUE,REALISED P/L\nAAPL,2,20,0\n")
+    pending = manifest.pending_files(str(funds_dir))
+    assert len(pending) == 1
+    assert pending[0]['status'] == 'changed'
+
+
+def test_removed_files_report_partitions_left_without_a_file(manifest, funds_dir):
+    """Deleted files leave their partition stale; a file renamed to another partition leaves the old one stale."""
+    _record(manifest, manifest.pending_files(str(funds_dir)))
+    assert manifest.removed_files(str(funds_dir)) == ([], [])
+
+    # Renamed to another fund-month: the new name is a new file, the old partition has no file left
+    os.rename(funds_dir / "FundA.2023-01-31.csv", funds_dir / "FundA.2023-02-28.csv")
+    assert [e['file_name'] for e in manifest.pending_files(str(funds_dir))] == ['FundA.2023-02-28.csv']
+    removed, stale = manifest.removed_files(str(funds_dir))
+    assert [e['file_path'] for e in removed] == [str(funds_dir / "FundA.2023-01-31.csv")]
+    assert stale == [('FundA', '2023-01-31')]
+
+    # Renamed within its fund-month (another date format): the partition is still held
+    os.rename(funds_dir / "FundA.2023-02-28.csv", funds_dir / "FundA.01-31-2023 - details.csv")
+    assert manifest.removed_files(str(funds_dir))[1] == []
+
+    # Deleted: the recorded file is forgotten once its partition is dropped
+    os.remove(funds_dir / "FundA.01-31-2023 - details.csv")
+    removed, stale = manifest.removed_files(str(funds_dir))
+    assert stale == [('FundA', '2023-01-31')]
+    assert manifest.forget(removed) == 1
+    assert manifest.load() == {}
+
+
+def test_second_file_for_a_partition_is_rejected(manifest, funds_dir):
+    """Only one file loads per partition: the recorded one keeps it, a newcomer waits until it is gone."""
+    (funds_dir / "rpt-FundA.2023-01-31.csv").write_text("SYMBOL,PRICE,MARKET VALUE,REALISED P/L\nMSFT,1,10,0\n")
+    # Neither is recorded yet: the first by name holds the partition
+    assert [e['file_name'] for e in manifest.pending_files(str(funds_dir))] == ['FundA.2023-01-31.csv']
+
+    _record(manifest, manifest.pending_files(str(funds_dir)))
+    # A changed duplicate is still rejected while the recorded file is there
+    (funds_dir / "rpt-FundA.2023-01-31.csv").write_text("SYMBOL,PRICE,MARKET VALUE,REALISED P/L\nMSFT,2,20,0\n")
+    assert manifest.pending_files(str(funds_dir)) == []
+
+    os.remove(funds_dir / "FundA.2023-01-31.csv")
+    assert [e['file_name'] for e in manifest.pending_files(str(funds_dir))] == ['rpt-FundA.2023-01-31.csv']
+    assert manifest.removed_files(str(funds_dir))[1] == []
@@ -0,0 +1,114 @@
+import os
+import pytest
+from src.db_manager import DBManager
+from src.data_ingestion import DataIngestor
+from src.file_manifest import FileManifest
+from src.fund_watcher import FundWatcher
+from src.output_writer import OutputWriter
+from src.shard_manager import ShardManager
+from config import (BEST_PERFORMING_OUTPUT_NAME, FUND_METRICS_OUTPUT_NAME, FUND_RETURNS_OUTPUT_NAME,
+                    FUND_RANKINGS_OUTPUT_NAME, POSITION_CONTRIBUTION_OUTPUT_NAME)
+
+HEADER = "FINANCIAL TYPE,SYMBOL,SECURITY NAME,ISIN,PRICE,QUANTITY,REALISED P/L,MARKET VALUE,SEDOL\n"
+
+
+@pytest.fixture
+def watch_db(db_manager):
+    db_manager.conn.executescript("""
+    CREATE TABLE equity_prices (DATETIME TEXT, SYMBOL TEXT, PRICE REAL);
+    CREATE TABLE bond_prices (DATETIME TEXT, ISIN TEXT, PRICE REAL);
+    INSERT INTO equity_prices VALUES ('2023-01-31', 'AAPL', 150.0), ('2023-02-28', 'AAPL', 155.0);
+    """)
+    DataIngestor(db_manager).prepare_master_prices()
+    return db_manager
+
+
+def test_watcher_debounces_and_reconciles_new_files(watch_db, tmp_path):
+    """A file is loaded once it is stable across polls, reconciled, and picked up again only when it changes."""
+    drop_dir = tmp_path / 'external-funds'
+    drop_dir.mkdir()
+    writer = OutputWriter(str(tmp_path / 'output'))
+    watcher = FundWatcher(watch_db, str(drop_dir), poll_interval=0, settle_seconds=0, writer=writer,
+                          layout='partitioned')
+
+    report = drop_dir / 'Whitestone.2023-01-31.csv'
+    report.write_text(HEADER + "Equities,AAPL,Apple,,151.0,10,5,1510,\n")
+    # First sighting: not yet known to be complete
+    assert watcher.poll() == []
+    ready = watcher.poll()
+    assert [e['file_name'] for e in ready] == ['Whitestone.2023-01-31.csv']
+
+    assert [e['eom_date'] for e in watcher.process(ready)] == ['2023-01-31']
+    rows = watch_db.execute_sql_string("SELECT fund_name, price_difference FROM price_reconciliation")
+    assert rows == [{'fund_name': 'Whitestone', 'price_difference': 1.0}]
+    assert writer.read_partition('price_reconciliation', 'Whitestone', '2023-01-31')['price_difference'].tolist() == [1.0]
+    assert watcher.poll() == []
+
+    # A resubmission is debounced again, then replaces the partition
+    report.write_text(HEADER + "Equities,AAPL,Apple,,150.0,10,5,1500,\n")
+    assert watcher.poll() == []
+    watcher.process(watcher.poll())
+    rows = watch_db.execute_sql_string("SELECT fund_name, price_difference FROM price_reconciliation")
+    assert rows == [{'fund_name': 'Whitestone', 'price_difference': 0.0}]
+
+    # A second month refreshes every attribution report of a pipeline run, not just the best performers
+    (drop_dir / 'Whitestone.2023-02-28.csv').write_text(HEADER + "Equities,AAPL,Apple,,160.0,10,5,1600,\n")
+    watcher.poll()
+    watcher.process(watcher.poll())
+    for name in (BEST_PERFORMING_OUTPUT_NAME, FUND_METRICS_OUTPUT_NAME, FUND_RETURNS_OUTPUT_NAME,
+                 FUND_RANKINGS_OUTPUT_NAME, POSITION_CONTRIBUTION_OUTPUT_NAME):
+        assert (tmp_path / 'output' / f'{name}.csv').exists(), name
+
+
+def test_watcher_drops_the_partitions_of_deleted_files(watch_db, tmp_path):
+    """A deleted report takes its positions, summary and reconciliation results (and output partition) with it."""
+    drop_dir = tmp_path / 'external-funds'
+    drop_dir.mkdir()
+    writer = OutputWriter(str(tmp_path / 'output'))
+    watcher = FundWatcher(watch_db, str(drop_dir), poll_interval=0, settle_seconds=0, writer=writer,
+                          layout='partitioned')
+    report = drop_dir / 'Whitestone.2023-01-31.csv'
+    report.write_text(HEADER + "Equities,AAPL,Apple,,151.0,10,5,1510,\n")
+    watcher.poll()
+    watcher.process(watcher.poll())
+    assert watch_db.execute_sql_string("SELECT COUNT(*) AS n FROM price_reconciliation") == [{'n': 1}]
+
+    report.unlink()
+    assert watcher.poll() == []
+    watcher.process([])
+    for table in ('fund_positions', 'fund_month_summary', 'price_reconciliation', 'recon_breaks', 'processed_files'):
+        assert watch_db.execute_sql_string(f"SELECT COUNT(*) AS n FROM {table}") == [{'n': 0}], table
+    assert not os.path.exists(writer.partition_dir('price_reconciliation', 'Whitestone', '2023-01-31'))
+
+
+def test_watcher_skips_bad_file_until_it_changes(watch_db, tmp_path):
+    (tmp_path / 'not-a-fund-report.csv').write_text(HEADER)
+    watcher = FundWatcher(watch_db, str(tmp_path), poll_interval=0, settle_seconds=0)
+    watcher.poll()
+    assert watcher.process(watcher.poll()) == []
+    assert watcher.poll() == []
+
+
+def test_watcher_loads_into_shards(tmp_path):
+    """With a ShardManager, watched files reach their shards and are recorded in the reference manifest."""
+    reference = DBManager(db_path=str(tmp_path / 'reference.db'))
+    reference.connect()
+    reference.conn.executescript("""
+    CREATE TABLE equity_prices (DATETIME TEXT, SYMBOL TEXT, PRICE REAL);
+    CREATE TABLE bond_prices (DATETIME TEXT, ISIN TEXT, PRICE REAL);
+    INSERT INTO equity_prices VALUES ('2023-01-31', 'AAPL', 150.0);
+    """)
+    DataIngestor(reference).prepare_master_prices()
+    shards = ShardManager(reference.db_path, str(tmp_path / 'shards'), 'fund', workers=1)
+    drop_dir = tmp_path / 'external-funds'
+    drop_dir.mkdir()
+    (drop_dir / 'Whitestone.2023-01-31.csv').write_text(HEADER + "Equities,AAPL,Apple,,151.0,10,5,1510,\n")
+    watcher = FundWatcher(reference, str(drop_dir), poll_interval=0, settle_seconds=0, shards=shards)
+
+    watcher.poll()
+    assert [e['fund_name'] for e in watcher.process(watcher.poll())] == ['Whitestone']
+    assert shards.shard_keys() == ['Whitestone']
+    assert shards.load_results()['price_difference'].tolist() == [1.0]
+    assert FileManifest(reference).pending_files(str(drop_dir)) == []
+    assert not reference.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'fund_positions'").fetchall()
+    reference.disconnect()
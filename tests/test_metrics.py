@@ -0,0 +1,46 @@
+import json
+import os
+import pstats
+from src.metrics import METRICS, instrument
+from src.pipeline_dag import Stage, StageRunner
+
+
+@instrument(rows_in=len, rows_out=len)
+def double(rows):
+    return rows * 2
+
+
+def test_run_metrics_cover_stages_and_instrumented_calls(tmp_path):
+    def stage(db):
+        db.execute_sql_string("SELECT 1 AS one UNION ALL SELECT 2;")
+        double([1, 2, 3])
+        double([4])
+
+    runner = StageRunner([Stage('work', stage)], db_path=str(tmp_path / 'pipeline.db'),
+                         checkpoint_path=str(tmp_path / 'checkpoint.json'))
+    METRICS.start_run(trace_memory=True, profile=True)
+    try:
+        runner.run()
+    finally:
+        path = METRICS.finish_run(str(tmp_path / 'metrics'))
+    assert not METRICS.active
+
+    with open(path) as f:
+        metrics = json.load(f)['metrics']
+    assert metrics['stage.work']['calls'] == 1
+    assert metrics['stage.work']['peak_memory_mb'] is not None
+    assert metrics['DBManager.execute_sql_string']['rows_out'] == 2
+    recorded = metrics['double']
+    assert (recorded['calls'], recorded['rows_in'], recorded['rows_out']) == (2, 4, 8)
+    assert recorded['wall_s'] >= 0 and recorded['cpu_s'] >= 0
+
+    # Stats of the stage thread are dumped alongside the metrics
+    profile_path = path.replace('metrics-', 'profile-').replace('.json', '.prof')
+    assert os.path.exists(profile_path)
+    assert any(func[2] == 'double' for func in pstats.Stats(profile_path).stats)
+
+
+def test_instrumented_calls_are_not_recorded_outside_a_run():
+    METRICS.metrics = {}
+    assert double([1]) == [1, 1]
+    assert METRICS.metrics == {}
@@ -0,0 +1,67 @@
+import pytest
+import pandas as pd
+from src.output_writer import OutputWriter
+from src.price_reconciliation import PriceReconciler
+
+
+@pytest.fixture
+def results():
+    return pd.DataFrame({
+        'fund_name': ['Fund A', 'Fund A', 'Fund A', 'Fund B'],
+        'eom_date': ['2023-01-31', '2023-01-31', '2023-02-28', '2023-01-31'],
+        'identifier': ['AAPL', 'MSFT', 'AAPL', 'AAPL'],
+        'price_difference': [0.0, 0.5, -1.0, 0.0],
+    })
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_write_partitions_round_trip(tmp_path, results, compression):
+    """Each fund-month lands in its own file and can be read back on its own."""
+    writer = OutputWriter(str(tmp_path), compression=compression)
+    partitions = ((key, df) for key, df in results.groupby(['fund_name', 'eom_date']))
+    assert writer.write_partitions('recon', partitions) == 3
+
+    path = writer.partition_path('recon', 'Fund A', '2023-01-31')
+    assert path == str(tmp_path / 'recon' / 'fund_name=Fund A' / 'eom_date=2023-01-31' / f'part.{writer.extension}')
+    pd.testing.assert_frame_equal(writer.read_partition('recon', 'Fund A', '2023-01-31'), results.iloc[:2])
+
+    # A partition emptied since the last write is removed
+    writer.write_partitions('recon', iter(()), clear=[('Fund B', '2023-01-31')])
+    assert not (tmp_path / 'recon' / 'fund_name=Fund B').joinpath('eom_date=2023-01-31').exists()
+
+
+def test_parquet_round_trip(tmp_path, results):
+    pytest.importorskip('pyarrow')
+    writer = OutputWriter(str(tmp_path), fmt='parquet')
+    writer.write_partitions('recon', ((key, df) for key, df in results.groupby(['fund_name', 'eom_date'])))
+    pd.testing.assert_frame_equal(writer.read_partition('recon', 'Fund A', '2023-02-28'),
+                                  results.iloc[[2]].reset_index(drop=True))
+
+
+def test_iter_results_streams_whole_partitions(db_manager, results):
+    """Partitions split across read chunks are reassembled before they are yielded."""
+    db_manager.execute_script('sql/create_reconciliation_tables.sql')
+    db_manager.conn.executemany(
+        "INSERT INTO price_reconciliation (fund_name, eom_date, identifier, price_difference) VALUES (?, ?, ?, ?)",
+        results.itertuples(index=False, name=None)
+    )
+    reconciler = PriceReconciler(db_manager)
+
+    streamed = list(reconciler.iter_results(chunksize=1))
+    assert [(key, len(df)) for key, df in streamed] == [
+        (('Fund A', '2023-01-31'), 2), (('Fund A', '2023-02-28'), 1), (('Fund B', '2023-01-31'), 1)
+    ]
+    selected = list(reconciler.iter_results([('Fund B', '2023-01-31')], chunksize=1))
+    assert [key for key, _ in selected] == [('Fund B', '2023-01-31')]
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_write_frames_streams_into_one_file(tmp_path, results, compression):
+    """Frames are appended to a single file one at a time; no frames still gives a file with the header."""
+    writer = OutputWriter(str(tmp_path), compression=compression)
+    path = writer.write_frames((df for _, df in results.groupby(['fund_name', 'eom_date'])), 'recon')
+    pd.testing.assert_frame_equal(pd.read_csv(path, compression=compression),
+                                  results.sort_values(['fund_name', 'eom_date'], kind='stable', ignore_index=True))
+
+    path = writer.write_frames(iter(()), 'recon', columns=list(results.columns))
+    assert list(pd.read_csv(path, compression=compression).columns) == list(results.columns)
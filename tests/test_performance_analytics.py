@@ -0,0 +1,103 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from src.performance_analytics import PerformanceAnalytics
+from src.performance_report import PerformanceCalculator
+
+
+@pytest.fixture
+def summary_df():
+    # FundC misses February: it has no return for February, and its March return starts from the January MV
+    mv = {
+        'FundA': [100.0, 110.0, 99.0, 108.9, 119.79],
+        'FundB': [200.0, 200.0, 220.0, 220.0, 209.0],
+        'FundC': [50.0, 55.0, None, 60.0, 66.0],
+    }
+    months = ['2022-12-31', '2023-01-31', '2023-02-28', '2023-03-31', '2023-04-30']
+    rows = [(date, fund, value, 0.0) for fund, values in mv.items() for date, value in zip(months, values)
+            if value is not None]
+    return pd.DataFrame(rows, columns=['eom_date', 'fund_name', 'fund_mv_end', 'realized_p_l'])
+
+
+def test_metrics_match_the_per_fund_definitions(summary_df):
+    analytics = PerformanceAnalytics(summary_df)
+    metrics = analytics.fund_metrics().set_index('fund_name')
+
+    fund_a = np.array([0.1, -0.1, 0.1, 0.1])
+    assert metrics.loc['FundA', 'months'] == 4
+    assert metrics.loc['FundA', 'cumulative_return'] == pytest.approx(np.prod(1 + fund_a) - 1)
+    assert metrics.loc['FundA', 'annualized_return'] == pytest.approx(np.prod(1 + fund_a) ** 3 - 1)
+    assert metrics.loc['FundA', 'annualized_volatility'] == pytest.approx(fund_a.std(ddof=1) * np.sqrt(12))
+    assert metrics.loc['FundA', 'sharpe_ratio'] == pytest.approx(fund_a.mean() / fund_a.std(ddof=1) * np.sqrt(12))
+    assert metrics.loc['FundA', 'max_drawdown'] == pytest.approx(-0.1)
+    assert metrics.loc['FundB', 'max_drawdown'] == pytest.approx(-0.05)
+    # FundC's March return spans February: it counts as two months of its per-month equivalent
+    fund_c_march = (60 / 55) ** 0.5 - 1
+    fund_c = np.array([0.1, fund_c_march, fund_c_march, 0.1])
+    assert metrics.loc['FundC', 'months'] == 4
+    assert metrics.loc['FundC', 'annualized_return'] == pytest.approx((66 / 50) ** 3 - 1)
+    assert metrics.loc['FundC', 'annualized_volatility'] == pytest.approx(fund_c.std(ddof=1) * np.sqrt(12))
+
+    returns = analytics.monthly_returns().set_index(['fund_name', 'eom_date'])
+    assert returns.loc[('FundA', '2023-03-31'), 'return_3m'] == pytest.approx(1.1 * 0.9 * 1.1 - 1)
+    assert np.isnan(returns.loc[('FundA', '2023-02-28'), 'return_3m'])
+    assert np.isnan(returns.loc[('FundC', '2023-04-30'), 'return_3m'])
+    assert returns.loc[('FundC', '2023-03-31'), 'return_1m'] == pytest.approx(60 / 55 - 1)
+    assert ('FundC', '2023-02-28') not in returns.index
+
+
+def test_rank_one_is_the_best_performer(summary_df):
+    rankings = PerformanceAnalytics(summary_df[summary_df['fund_name'] != 'FundC']).rankings(top_k=2)
+    best = PerformanceCalculator(db_manager=None).attribute(summary_df[summary_df['fund_name'] != 'FundC'].copy())
+    top = rankings[rankings['rank'] == 1].reset_index(drop=True)
+    assert list(top['fund_name']) == list(best['best_performing_fund_name'].astype(str))
+    assert np.allclose(top['rate_of_return'], best['highest_rate_of_return'])
+    assert len(rankings) == 8
+
+
+def test_gap_months_match_the_calculator(summary_df):
+    """Returns across a month no fund reported match PerformanceCalculator, and windows span calendar months."""
+    gap_df = summary_df[summary_df['eom_date'] != '2023-03-31'].reset_index(drop=True)
+    analytics = PerformanceAnalytics(gap_df)
+    assert len(analytics.months) == 5
+
+    best = PerformanceCalculator(db_manager=None).attribute(gap_df.copy())
+    top = analytics.rankings(top_k=1)
+    assert list(top['eom_date']) == list(best['eom_date']) == ['2023-01-31', '2023-02-28', '2023-04-30']
+    assert list(top['fund_name']) == list(best['best_performing_fund_name'].astype(str))
+    assert np.allclose(top['rate_of_return'], best['highest_rate_of_return'])
+
+    returns = analytics.monthly_returns().set_index(['fund_name', 'eom_date'])
+    assert returns.loc[('FundA', '2023-04-30'), 'return_1m'] == pytest.approx(119.79 / 99 - 1)
+    assert np.isnan(returns.loc[('FundA', '2023-04-30'), 'return_3m'])
+
+
+def test_latest_report_of_a_month_is_kept(summary_df):
+    """A fund reporting twice in a calendar month is represented by its later EOM date."""
+    early = pd.DataFrame([('2023-01-30', 'FundA', 1000.0, 0.0)], columns=summary_df.columns)
+    analytics = PerformanceAnalytics(pd.concat([summary_df, early], ignore_index=True))
+    expected = PerformanceAnalytics(summary_df)
+    assert list(analytics.months) == list(expected.months)
+    np.testing.assert_allclose(analytics.returns, expected.returns)
+    pd.testing.assert_frame_equal(analytics.fund_metrics(), expected.fund_metrics())
+
+
+def test_thousands_of_funds_in_one_pass():
+    rng = np.random.default_rng(0)
+    funds, months = 5000, 60
+    mv = 1000 * np.cumprod(1 + rng.normal(0.005, 0.04, (funds, months)), axis=1)
+    summary_df = pd.DataFrame({
+        'eom_date': np.tile(pd.date_range('2019-01-31', periods=months, freq='ME').strftime('%Y-%m-%d'), funds),
+        'fund_name': np.repeat([f'Fund{i:05d}' for i in range(funds)], months),
+        'fund_mv_end': mv.ravel(),
+        'realized_p_l': 0.0,
+    })
+    analytics = PerformanceAnalytics(summary_df)
+    start = time.perf_counter()
+    metrics = analytics.fund_metrics()
+    rolling = analytics.rolling_returns()
+    analytics.rankings()
+    elapsed = time.perf_counter() - start
+    assert len(metrics) == funds and rolling[12].shape == (funds, months)
+    assert elapsed < 2.0
@@ -50,4 +50,74 @@ def test_rate_of_return_calculation(performance_calculator, mock_db_data):
         # For 2023-02-28 best should be FundA based on fixture:
         feb_row = result_df[result_df['eom_date'] == '2023-02-28'].iloc[0]
         assert feb_row['best_performing_fund_name'] == 'FundA'
-        assert round(feb_row['highest_rate_of_return'], 3) == round(((1100.0 - 1000.0 + 30.0) / 1000.0), 3)
\ No newline at end of file
+        assert round(feb_row['highest_rate_of_return'], 3) == round(((1100.0 - 1000.0 + 30.0) / 1000.0), 3)
+
+
+def test_attribute_leaves_the_callers_frame_unchanged(performance_calculator, mock_db_data):
+    summary_df = mock_db_data.drop(columns='eom_date_dt')
+    before = summary_df.copy()
+    performance_calculator.attribute(summary_df)
+    pd.testing.assert_frame_equal(summary_df, before)
+
+
+def test_attribution_reads_maintained_summary(db_manager):
+    """fund_month_summary follows partition replacements, and attribution computed from it matches the positions."""
+    import os
+    from src.data_ingestion import DataIngestor
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    positions = pd.DataFrame({
+        'fund_name': ['FundA', 'FundA', 'FundB', 'FundA', 'FundB'],
+        'eom_date': ['2023-01-31', '2023-01-31', '2023-01-31', '2023-02-28', '2023-02-28'],
+        'symbol': ['S1', 'S2', 'S1', 'S1', 'S1'],
+        'market_value': [400.0, 600.0, 2000.0, 1100.0, 1900.0],
+        'realised_p_l': [20.0, 30.0, 20.0, 30.0, -10.0],
+    })
+    ingestor = DataIngestor(db_manager)
+    ingestor.replace_partitions(positions, 'fund_positions', set(zip(positions['fund_name'], positions['eom_date'])))
+    # FundB's February file is resubmitted with a higher market value
+    ingestor.replace_partitions(positions.iloc[[4]].assign(market_value=2300.0), 'fund_positions', [('FundB', '2023-02-28')])
+
+    summary = db_manager.execute_sql_string(
+        "SELECT fund_name, eom_date, fund_mv_end, realized_p_l, position_count FROM fund_month_summary ORDER BY 1, 2"
+    )
+    assert summary == [
+        {'fund_name': 'FundA', 'eom_date': '2023-01-31', 'fund_mv_end': 1000.0, 'realized_p_l': 50.0, 'position_count': 2},
+        {'fund_name': 'FundA', 'eom_date': '2023-02-28', 'fund_mv_end': 1100.0, 'realized_p_l': 30.0, 'position_count': 1},
+        {'fund_name': 'FundB', 'eom_date': '2023-01-31', 'fund_mv_end': 2000.0, 'realized_p_l': 20.0, 'position_count': 1},
+        {'fund_name': 'FundB', 'eom_date': '2023-02-28', 'fund_mv_end': 2300.0, 'realized_p_l': -10.0, 'position_count': 1},
+    ]
+
+    result_df = PerformanceCalculator(db_manager).run_attribution()
+    assert result_df['best_performing_fund_name'].astype(str).tolist() == ['FundB']
+    assert round(result_df['highest_rate_of_return'].iloc[0], 3) == round((2300.0 - 2000.0 - 10.0) / 2000.0, 3)
+
+
+def test_position_contributions_add_up_to_the_fund_return(db_manager):
+    """Positions are aligned with the previous month by symbol/isin, including instruments bought and sold."""
+    import os
+    from src.data_ingestion import DataIngestor
+    db_manager.execute_script(os.path.join('sql', 'create_fund_position_table.sql'))
+    positions = pd.DataFrame({
+        'fund_name': ['FundA', 'FundA', 'FundA', 'FundA', 'FundA', 'FundB'],
+        'eom_date': ['2023-01-31', '2023-01-31', '2023-02-28', '2023-02-28', '2023-03-31', '2023-02-28'],
+        'financial_type': ['Equities', 'Government Bond', 'Equities', 'Equities', 'Equities', 'Equities'],
+        'symbol': ['S1', None, 'S1', 'S3', 'S3', 'S1'],
+        'isin': [None, 'B2', None, None, None, None],
+        'market_value': [400.0, 600.0, 500.0, 300.0, 330.0, 100.0],
+        'realised_p_l': [0.0, 0.0, 10.0, 0.0, 5.0, 0.0],
+    })
+    DataIngestor(db_manager).replace_partitions(
+        positions, 'fund_positions', set(zip(positions['fund_name'], positions['eom_date']))
+    )
+
+    result = PerformanceCalculator(db_manager).run_contribution()
+    feb = result[(result['fund_name'] == 'FundA') & (result['eom_date'] == '2023-02-28')].set_index('identifier')
+    # S1 held, B2 sold (ends at 0 MV), S3 bought (starts at 0 MV)
+    assert feb['contribution'].to_dict() == pytest.approx({'B2': -0.6, 'S1': 0.11, 'S3': 0.3})
+    assert feb.loc['B2', 'financial_type'] == 'Government Bond'
+    # Contributions of a fund-month add up to its rate of return; first months (FundB) have no starting MV
+    totals = result.groupby(['fund_name', 'eom_date'])['contribution'].sum()
+    assert totals.to_dict() == pytest.approx({
+        ('FundA', '2023-02-28'): (800.0 - 1000.0 + 10.0) / 1000.0,
+        ('FundA', '2023-03-31'): (330.0 - 800.0 + 5.0) / 800.0,
+    })
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from src.pipeline_dag import Stage, StageRunner
+
+
+@pytest.fixture
+def runner_factory(tmp_path):
+    def make(stages):
+        return StageRunner(stages, db_path=str(tmp_path / 'pipeline.db'),
+                           checkpoint_path=str(tmp_path / 'checkpoint.json'), max_workers=2)
+    return make
+
+
+def test_independent_stages_run_concurrently_and_skip_when_unchanged(tmp_path, runner_factory):
+    source = tmp_path / 'input.csv'
+    source.write_text('a')
+    calls = []
+    # Both branches must be inside their stage at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(name):
+        def run(db):
+            assert db.conn is not None
+            barrier.wait()
+            calls.append(name)
+        return run
+
+    def make_stages():
+        return [
+            Stage('load', lambda db: calls.append('load'), inputs=[str(source)]),
+            Stage('recon', branch('recon'), depends_on=['load']),
+            Stage('attribution', branch('attribution'), depends_on=['load']),
+        ]
+
+    assert runner_factory(make_stages()).run() == {'load': 'ran', 'recon': 'ran', 'attribution': 'ran'}
+    assert calls[0] == 'load' and sorted(calls[1:]) == ['attribution', 'recon']
+
+    calls.clear()
+    assert set(runner_factory(make_stages()).run().values()) == {'skipped'}
+    assert calls == []
+
+    # A changed input reruns the stage and everything downstream of it
+    source.write_text('ab')
+    assert set(runner_factory(make_stages()).run().values()) == {'ran'}
+
+
+def test_failed_run_resumes_from_incomplete_stages(runner_factory):
+    calls = []
+    fail = {'attribution': True}
+
+    def attribution(db):
+        calls.append('attribution')
+        if fail['attribution']:
+            raise ValueError('boom')
+
+    def make_stages():
+        return [
+            Stage('load', lambda db: calls.append('load')),
+            Stage('attribution', attribution, depends_on=['load']),
+            Stage('report', lambda db: calls.append('report'), depends_on=['attribution']),
+        ]
+
+    with pytest.raises(RuntimeError):
+        runner_factory(make_stages()).run()
+    assert calls == ['load', 'attribution']
+
+    calls.clear()
+    fail['attribution'] = False
+    assert runner_factory(make_stages()).run() == {'load': 'skipped', 'attribution': 'ran', 'report': 'ran'}
+    assert calls == ['attribution', 'report']
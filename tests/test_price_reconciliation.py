@@ -3,6 +3,7 @@ import pandas as pd
 from datetime import datetime
 from unittest.mock import Mock, patch
 from src.price_reconciliation import PriceReconciler
+from src.data_ingestion import DataIngestor
 
 
 
@@ -111,6 +112,102 @@ def test_price_reconciliation_edge_cases(mock_db_manager):
     assert pd.isna(result_df.iloc[0]['price_difference'])
 
 
+@pytest.fixture
+def reconciliation_db(db_manager):
+    """In-memory database with fund positions and mixed-format master prices."""
+    db_manager.execute_script('sql/create_fund_position_table.sql')
+    db_manager.conn.executescript("""
+    CREATE TABLE equity_prices (DATETIME TEXT, SYMBOL TEXT, PRICE REAL);
+    CREATE TABLE bond_prices (DATETIME TEXT, ISIN TEXT, PRICE REAL);
+    INSERT INTO equity_prices VALUES
+        ('2023-01-31 00:00:00', 'AAPL', 150.0), ('01/15/2023', ' GOOGL', 2000.0),
+        ('2023-02-28', 'AAPL', 155.0), ('2023-02-10', 'GOOGL', 2050.0);
+    INSERT INTO bond_prices VALUES ('2023-01-31', 'BOND1', 96.0), ('2023-02-28', 'BOND1', 'n/a');
+    INSERT INTO fund_positions (fund_name, eom_date, financial_type, symbol, isin, price) VALUES
+        ('Fund A', '2023-01-31', 'Equities', 'AAPL', NULL, 150.0),
+        ('Fund B', '2023-01-31', 'Equities', 'AAPL', NULL, 150.5),
+        ('Fund A', '2023-01-31', 'Government Bond', 'BOND1', 'BOND1', 95.0),
+        ('Fund B', '2023-01-31', 'Equities', 'GOOGL', NULL, 2100.0),
+        ('Fund A', '2023-02-28', 'Equities', 'AAPL', NULL, 155.0),
+        ('Fund A', '2023-02-28', 'Government Bond', 'BOND1', 'BOND1', 97.0),
+        ('Fund B', '2023-02-28', 'Equities', 'GOOGL', NULL, 2050.0),
+        ('Fund B', '2023-02-28', 'CASH', 'USDCURR', NULL, NULL);
+    """)
+    DataIngestor(db_manager).prepare_master_prices()
+    return db_manager
+
+
+def test_reconciliation_engines_match(reconciliation_db):
+    """The asof and SQL engines return exactly what the pandas engine does, one row per position."""
+    pandas_df = PriceReconciler(reconciliation_db, engine='pandas').run_reconciliation()
+    asof_df = PriceReconciler(reconciliation_db, engine='asof').run_reconciliation()
+    sql_df = PriceReconciler(reconciliation_db, engine='sql').run_reconciliation()
+
+    pd.testing.assert_frame_equal(pandas_df, asof_df)
+    pd.testing.assert_frame_equal(pandas_df, sql_df)
+    assert len(sql_df) == 8
+
+    lookup = sql_df.set_index(['fund_name', 'identifier', sql_df['eom_date'].dt.strftime('%Y-%m-%d')])
+    assert lookup.loc[('Fund B', 'GOOGL', '2023-01-31'), 'master_price_filled'] == 2000.0
+    assert lookup.loc[('Fund B', 'GOOGL', '2023-01-31'), 'master_price_date'] == pd.Timestamp('2023-01-15')
+    # Non-numeric master price on the EOM date falls back to the last available price
+    assert lookup.loc[('Fund A', 'BOND1', '2023-02-28'), 'master_price_filled'] == 96.0
+    assert pd.isna(lookup.loc[('Fund B', 'USDCURR', '2023-02-28'), 'master_price_filled'])
+
+
+def test_unknown_engine_rejected(mock_db_manager):
+    with pytest.raises(ValueError):
+        PriceReconciler(mock_db_manager, engine='spark')
+
+
+@pytest.mark.parametrize('engine', ['pandas', 'sql'])
+def test_incremental_reconciliation(reconciliation_db, engine):
+    """Only partitions with changed positions or master prices are reconciled again; results persist."""
+    reconciler = PriceReconciler(reconciliation_db, engine=engine)
+    assert len(reconciler.run_incremental()) == 8
+    assert reconciler.run_incremental().empty
+    pd.testing.assert_frame_equal(reconciler.load_results(), reconciler.run_reconciliation(), check_dtype=False,
+                                  check_categorical=False)
+
+    # A revised February GOOGL price only affects the partition holding GOOGL from February on
+    reconciliation_db.conn.execute("UPDATE equity_prices SET PRICE = 2060.0 WHERE SYMBOL = 'GOOGL' AND price_date = '2023-02-10'")
+    refreshed = reconciler.run_incremental()
+    assert set(zip(refreshed['fund_name'], refreshed['eom_date'].dt.strftime('%Y-%m-%d'))) == {('Fund B', '2023-02-28')}
+
+    # A reloaded partition is queued by the ingestor
+    resubmitted = pd.DataFrame({'fund_name': ['Fund A'], 'eom_date': ['2023-01-31'], 'financial_type': ['Equities'],
+                                'symbol': ['AAPL'], 'price': [151.0]})
+    DataIngestor(reconciliation_db).replace_partitions(resubmitted, 'fund_positions', [('Fund A', '2023-01-31')])
+    refreshed = reconciler.run_incremental()
+    assert refreshed['price_difference'].tolist() == [1.0]
+
+    results = reconciler.load_results().set_index(['fund_name', 'identifier', 'eom_date'])
+    assert len(results) == 7
+    assert results.loc[('Fund B', 'GOOGL', pd.Timestamp('2023-02-28')), 'master_price_filled'] == 2060.0
+    assert results.loc[('Fund A', 'AAPL', pd.Timestamp('2023-01-31')), 'reported_price'] == 151.0
+
+
+def test_master_digest_only_after_reference_reload(reconciliation_db, caplog):
+    """With a recorded reference dump, the master price digest is only recomputed after a different dump is loaded."""
+    from src.reference_cache import ReferenceCache
+    cache = ReferenceCache(reconciliation_db)
+    cache.record('hash-1', 'master.sql')
+    reconciler = PriceReconciler(reconciliation_db)
+    reconciler.run_incremental()
+
+    reconciliation_db.conn.execute("UPDATE equity_prices SET PRICE = 2060.0 WHERE SYMBOL = 'GOOGL' AND price_date = '2023-02-10'")
+    reconciliation_db.conn.commit()
+    caplog.clear()
+    assert reconciler.run_incremental().empty
+    assert 'skipping the price digest' in caplog.text
+
+    # Reloading a dump records its hash, which triggers the comparison
+    cache.record('hash-2', 'master.sql')
+    reconciler.run_incremental()
+    assert reconciler.refreshed_partitions == [('Fund B', '2023-02-28')]
+
+
+
 
 
 
@@ -0,0 +1,101 @@
+import json
+import sqlite3
+import threading
+from urllib.request import urlopen
+from urllib.error import HTTPError
+import pytest
+from src.query_service import QueryService
+from config import RECONCILIATION_TABLES_FILE, FUND_POSITION_FILE
+
+
+@pytest.fixture
+def service(tmp_path):
+    db_path = str(tmp_path / 'service.db')
+    conn = sqlite3.connect(db_path)
+    for script in (RECONCILIATION_TABLES_FILE, FUND_POSITION_FILE):
+        with open(script) as f:
+            conn.executescript(f.read())
+    # Tolerance 0.1: MSFT in January and the bond are tolerance breaks, MSFT in February is within tolerance
+    conn.executemany("INSERT INTO recon_breaks VALUES (?, ?, ?, ?, ?, ?, ?, ?);", [
+        ('Gohen', '2023-01-31', 'MSFT', 'Equities', 'tolerance_break', 0.5, 0.1, 1),
+        ('Gohen', '2023-01-31', 'AAPL', 'Equities', 'exact', 0.0, 0.1, 0),
+        ('Gohen', '2023-02-28', 'MSFT', 'Equities', 'exact', -0.05, 0.1, 0),
+        ('Magnum', '2023-01-31', 'DE0001030567', 'Government Bond', 'tolerance_break', 1.0, 0.1, 2),
+        ('Magnum', '2023-01-31', 'USDCURR', 'CASH', 'missing_reference', None, 0.0, 1),
+    ])
+    conn.executemany("INSERT INTO fund_month_summary VALUES (?, ?, ?, ?, ?);", [
+        ('Gohen', '2022-12-31', 1000.0, 0.0, 1), ('Gohen', '2023-01-31', 1100.0, 0.0, 1),
+        ('Magnum', '2022-12-31', 1000.0, 0.0, 1), ('Magnum', '2023-01-31', 1000.0, 50.0, 1),
+    ])
+    conn.commit()
+    service = QueryService(db_path, port=0, pool_size=2, cache_size=8)
+    service.start()
+    yield service, conn
+    service.close()
+    conn.close()
+
+
+def get(service, path):
+    host, port = service.address
+    try:
+        with urlopen(f"http://{host}:{port}{path}", timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_breaks_are_filtered_and_cached_until_the_data_changes(service):
+    service, conn = service
+    status, body = get(service, '/breaks?fund=Gohen')
+    assert status == 200
+    # Classified breaks by default, with their category, tolerance and age
+    assert body['breaks'] == [{
+        'fund_name': 'Gohen', 'eom_date': '2023-01-31', 'identifier': 'MSFT', 'financial_type': 'Equities',
+        'break_category': 'tolerance_break', 'price_difference': 0.5, 'tolerance': 0.1, 'break_age': 1,
+    }]
+    assert [row['break_category'] for row in get(service, '/breaks?fund=Magnum')[1]['breaks']] == [
+        'tolerance_break', 'missing_reference']
+    # A threshold overrides the tolerances
+    body = get(service, '/breaks?fund=Gohen&threshold=0.01')[1]
+    assert [(row['eom_date'], row['identifier']) for row in body['breaks']] == [
+        ('2023-01-31', 'MSFT'), ('2023-02-28', 'MSFT')]
+    assert get(service, '/breaks?threshold=0.1&date=2023-01-31')[1]['count'] == 3
+    assert get(service, '/breaks?identifier=DE0001030567')[1]['breaks'][0]['break_age'] == 2
+    # Positions without a master price are breaks at any threshold
+    assert [row['identifier'] for row in get(service, '/breaks?fund=Magnum&threshold=5')[1]['breaks']] == ['USDCURR']
+
+    get(service, '/breaks?fund=Gohen')
+    assert (service.hits, service.misses) == (1, 6)
+
+    # A commit from another connection (new partitions reconciled) invalidates the cached responses
+    conn.execute("INSERT INTO recon_breaks VALUES ('Gohen', '2023-03-31', 'MSFT', 'Equities', 'tolerance_break', "
+                 "-1.0, 0.1, 1);")
+    conn.commit()
+    assert get(service, '/breaks?fund=Gohen')[1]['count'] == 2
+    assert service.misses == 7
+
+
+def test_attribution_and_errors(service):
+    service, _ = service
+    status, body = get(service, '/attribution?date=2023-01-31')
+    assert status == 200
+    assert body['best_performing_funds'] == [
+        {'eom_date': '2023-01-31', 'best_performing_fund_name': 'Gohen', 'highest_rate_of_return': pytest.approx(0.1)}
+    ]
+    assert get(service, '/breaks?threshold=abc')[0] == 400
+    assert get(service, '/breaks?fund_name=Gohen')[0] == 400
+    assert get(service, '/breaks?limit=-1')[0] == 400
+    assert get(service, '/breaks?limit=0')[0] == 400
+    body = get(service, '/breaks?limit=1')[1]
+    assert (body['count'], body['truncated']) == (1, True)
+    assert get(service, '/nothing')[0] == 404
+    assert get(service, '/health')[1]['status'] == 'ok'
+
+
+def test_close_without_start(tmp_path):
+    """A service that never served closes without waiting for a serve loop."""
+    service = QueryService(str(tmp_path / 'service.db'), port=0)
+    closer = threading.Thread(target=service.close, daemon=True)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import pandas as pd
+import pytest
+from benchmarks.synthetic_data import generate
+from src.db_manager import DBManager
+from src.data_validation import DataValidator
+from src.data_ingestion import DataIngestor
+from src.file_manifest import FileManifest
+from src.price_reconciliation import PriceReconciler
+from src.performance_report import PerformanceCalculator
+from src.shard_manager import ShardManager
+from config import FUND_POSITIONS, FUND_MONTH_SUMMARY, FUND_POSITION_FILE, EXTERNAL_FUNDS_DATA_DIR, MASTER_SQL_FILE
+
+
+def build_reference(tmp_path, name, positions=True):
+    db = DBManager(db_path=str(tmp_path / name))
+    db.connect()
+    DataIngestor(db).ingest_master_data(str(tmp_path / MASTER_SQL_FILE), use_cache=False)
+    if positions:
+        db.execute_script(FUND_POSITION_FILE)
+    return db
+
+
+def load_breaks(db):
+    return pd.read_sql("SELECT * FROM main.recon_breaks ORDER BY fund_name, identifier, eom_date", db.conn)
+
+
+def test_sharded_results_match_a_single_database(tmp_path):
+    generate(str(tmp_path), funds=3, months=3, instruments=30, holdings=12)
+    funds_dir = str(tmp_path / EXTERNAL_FUNDS_DATA_DIR)
+
+    single = build_reference(tmp_path, 'single.db')
+    entries = FileManifest(single).pending_files(funds_dir)
+    ingestor = DataIngestor(single)
+    validator = DataValidator(single)
+    for entry in entries:
+        fund_name, eom_date, df = validator.preprocess_file(entry['file_path'])
+        ingestor.replace_partitions(df, FUND_POSITIONS, [(fund_name, eom_date)])
+    reconciler = PriceReconciler(single)
+    reconciler.run_incremental()
+    expected_results = reconciler.load_results()
+    expected_best = PerformanceCalculator(single).run_attribution().reset_index(drop=True)
+    expected_contributions = PerformanceCalculator(single).run_contribution()
+    expected_breaks = load_breaks(single)
+    # Some breaks stay open from December into January
+    assert expected_breaks['break_age'].max() == 3
+
+    for shard_by, keys in (('fund', 3), ('year', 2)):
+        reference = build_reference(tmp_path, f'reference-{shard_by}.db', positions=False)
+        shards = ShardManager(reference.db_path, str(tmp_path / f'shards-{shard_by}'), shard_by, workers=2)
+        loaded = shards.ingest_files(FileManifest(reference).pending_files(funds_dir))
+        assert len(loaded) == len(entries)
+        assert len(shards.shard_keys()) == keys
+
+        assert sorted(shards.run_incremental()) == sorted(reconciler.refreshed_partitions)
+        pd.testing.assert_frame_equal(shards.load_results(), expected_results, check_dtype=False)
+        assert sum(len(df) for _, df in shards.iter_results()) == len(expected_results)
+        # Month-on-month returns span year shards
+        pd.testing.assert_frame_equal(shards.run_attribution().reset_index(drop=True), expected_best,
+                                      check_dtype=False, check_categorical=False)
+        pd.testing.assert_frame_equal(shards.run_contribution(), expected_contributions, check_dtype=False)
+        # Break ages continue across year shards
+        pd.testing.assert_frame_equal(pd.concat(shards._map_shards(load_breaks)).sort_values(
+            ['fund_name', 'identifier', 'eom_date'], ignore_index=True), expected_breaks)
+
+        # Positions and the tables derived from them live in the shards only; reference data, surrogate keys and
+        # the manifest are shared
+        assert not reference.conn.execute(f"""
+        SELECT name FROM sqlite_master WHERE name IN ('{FUND_POSITIONS}', 'fund_month_summary', 'recon_dirty_partitions')
+        """).fetchall()
+        with shards.shard(shards.shard_keys()[0]) as db:
+            assert db.conn.execute(f"""
+            SELECT COUNT(*) FROM {FUND_POSITIONS} p LEFT JOIN ref.dim_instrument d USING (instrument_id)
+            WHERE d.identifier IS NULL
+            """).fetchone()[0] == 0
+            assert db.conn.execute("SELECT COUNT(*) FROM main.sqlite_master WHERE name LIKE 'dim_%'").fetchone()[0] == 0
+        # Nothing changed: nothing to reconcile again
+        assert shards.run_incremental() == []
+
+        # The master price digest is kept once, in the reference database, and a master price change queues the
+        # partitions holding the instrument in every shard
+        assert reference.conn.execute("SELECT COUNT(*) FROM master_price_digest").fetchone()[0] > 0
+        with shards.shard(shards.shard_keys()[0]) as db:
+            assert not db.conn.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'master_price_digest'").fetchall()
+        instrument_id = reference.conn.execute(
+            "SELECT instrument_id FROM equity_prices WHERE instrument_id IS NOT NULL LIMIT 1").fetchone()[0]
+        with reference.conn:
+            reference.conn.execute("UPDATE equity_prices SET PRICE = PRICE + 1 WHERE instrument_id = ?", (instrument_id,))
+        holding = shards._map_shards(lambda db: db.conn.execute(
+            f"SELECT DISTINCT fund_name, eom_date FROM {FUND_POSITIONS} WHERE instrument_id = ?", (instrument_id,)
+        ).fetchall())
+        assert shards.run_incremental() == sorted(partition for rows in holding for partition in rows) != []
+        assert shards.run_incremental() == []
+        reference.disconnect()
+
+
+def test_reads_never_create_a_shard(tmp_path, monkeypatch):
+    """Read paths open shards read-only: a shard that vanished after listing is an error, not a new empty shard."""
+    reference = DBManager(db_path=str(tmp_path / 'reference.db'))
+    reference.connect()
+    reference.disconnect()
+    shards = ShardManager(reference.db_path, str(tmp_path / 'shards'), 'fund', workers=1)
+    with shards.shard('FundA') as db:
+        db.conn.execute(f"INSERT INTO {FUND_MONTH_SUMMARY} VALUES ('FundA', '2023-01-31', 100.0, 0.0, 1);")
+        db.conn.commit()
+    assert len(shards.load_summary()) == 1
+    with shards.shard('FundA', readonly=True) as db, pytest.raises(sqlite3.OperationalError):
+        db.conn.execute(f"DELETE FROM {FUND_MONTH_SUMMARY};")
+
+    monkeypatch.setattr(shards, 'shard_keys', lambda: ['FundA', 'FundB'])
+    with pytest.raises(sqlite3.OperationalError):
+        shards.load_summary()
+    with pytest.raises(sqlite3.OperationalError):
+        list(shards.iter_results())
+    assert not os.path.exists(shards.shard_path('FundB'))
@@ -0,0 +1,39 @@
+import os
+from benchmarks.synthetic_data import generate, fund_names, FILENAME_STYLES
+from benchmarks.bench_pipeline import check_regressions
+from src.data_validation import DataValidator
+from src.data_ingestion import DataIngestor
+from src.price_reconciliation import PriceReconciler
+from config import FUND_POSITIONS, FUND_POSITION_FILE, EXTERNAL_FUNDS_DATA_DIR, MASTER_SQL_FILE
+
+
+def test_generated_workspace_reconciles_to_the_expected_breaks(db_manager, tmp_path):
+    info = generate(str(tmp_path), funds=len(FILENAME_STYLES), months=2, instruments=40, holdings=15)
+    assert len(info['files']) == 8
+
+    # Every filename style parses back to its fund and month end
+    validator = DataValidator(db_manager)
+    parsed = {validator._extract_fund_info(name) for name in info['files']}
+    assert parsed == {(fund, date) for fund in fund_names(4) for date in ('2022-12-31', '2023-01-31')}
+
+    ingestor = DataIngestor(db_manager)
+    ingestor.ingest_master_data(str(tmp_path / MASTER_SQL_FILE), use_cache=False)
+    db_manager.execute_script(FUND_POSITION_FILE)
+    funds_dir = tmp_path / EXTERNAL_FUNDS_DATA_DIR
+    for name in info['files']:
+        fund_name, eom_date, df = validator.preprocess_file(os.path.join(funds_dir, name))
+        ingestor.replace_partitions(df, FUND_POSITIONS, [(fund_name, eom_date)])
+
+    result = PriceReconciler(db_manager).run_reconciliation()
+    securities = result[result['identifier'] != 'USDCURR']
+    assert len(securities) == info['positions']
+    assert securities['master_price_filled'].notna().all()
+    assert (securities['price_difference'].abs() > 1e-9).sum() == info['breaks']
+
+
+def test_check_regressions_needs_relative_and_absolute_slowdown():
+    baseline = {'ingest': 1.0, 'attribution': 0.01}
+    assert check_regressions({'ingest': 1.2, 'attribution': 0.03}, baseline, 0.25, 0.05) == []
+    assert check_regressions({'ingest': 1.5, 'attribution': 0.01}, baseline, 0.25, 0.05) == [
+        'ingest: 1.500s vs baseline 1.000s (+50%)'
+    ]